@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Load-test the Groot backend against stub Ollama and Puter servers
+
+Starts local stand-ins for Ollama and the Puter API with configurable
+latency, token rate and error rate, serves the Flask app in-process
+against them (or targets a running server with ``--url``), drives the hot
+endpoints at a fixed concurrency and reports throughput and latency
+percentiles. Results can be saved as a baseline and compared on later runs:
+
+    python benchmark.py --requests 200 --concurrency 16 --save baseline.json
+    python benchmark.py --requests 200 --concurrency 16 --baseline baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+SCENARIOS = ("tasks", "puter-fast", "puter-upload", "history")
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class StubConfig:
+    """Behaviour of a stub backend; shared by every request it serves"""
+
+    def __init__(self, latency: float = 0.05, token_rate: float = 200.0, tokens: int = 50,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def fail(self) -> bool:
+        return self.random.random() < self.error_rate
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _drain(self) -> int:
+        """Consume a request body, chunked or not, and return its size"""
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return len(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        size = 0
+        while True:
+            chunk_size = int(self.rfile.readline().split(b";")[0], 16)
+            self.rfile.read(chunk_size + 2)
+            size += chunk_size
+            if chunk_size == 0:
+                return size
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+        self._send(status, json.dumps(data).encode("utf-8"))
+
+
+class StubOllamaHandler(_StubHandler):
+    """``/api/generate`` (streaming and not), ``/api/ps`` and the root ping"""
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            self._send_json(200, {"models": [{"name": "mistral:latest"}]})
+        else:
+            self._send(200, b"Ollama is running", "text/plain")
+
+    def do_POST(self):
+        payload = self._read_json()
+        config = self.config
+        time.sleep(config.latency)
+        if config.fail():
+            self._send(500, b'{"error": "stub failure"}')
+            return
+        tokens = min(config.tokens, payload.get("num_predict") or config.tokens)
+        interval = 1.0 / config.token_rate if config.token_rate > 0 else 0.0
+        stats = {
+            "done": True,
+            "prompt_eval_duration": int(config.latency * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int(tokens * interval * 1e9) or 1,
+        }
+        if not payload.get("stream"):
+            time.sleep(tokens * interval)
+            self._send_json(200, dict(stats, response="tok " * tokens))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for _ in range(tokens):
+            self._write_chunk({"response": "tok ", "done": False})
+            time.sleep(interval)
+        self._write_chunk(dict(stats, response=""))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, message: Dict[str, Any]) -> None:
+        line = json.dumps(message).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+
+class StubPuterHandler(_StubHandler):
+    """``/v1/ai/analyze``, ``/v1/ai/process-file`` and ``/v1/health``"""
+
+    def do_GET(self):
+        self._send_json(200, {"status": "ok"})
+
+    def do_POST(self):
+        received = self._drain()
+        time.sleep(self.config.latency)
+        if self.config.fail():
+            self._send(500, b'{"error": "stub failure"}')
+            return
+        self._send_json(200, {
+            "analysis": f"Stub analysis of {received} bytes",
+            "confidence": 0.9,
+            "processing_time": self.config.latency,
+            "metadata": {"stub": True},
+        })
+
+
+def start_stub(handler: type, config: StubConfig) -> ThreadingHTTPServer:
+    """Serve ``handler`` with ``config`` on a free local port (in a daemon thread)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), type(handler.__name__, (handler,), {"config": config}))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=handler.__name__, daemon=True).start()
+    return server
+
+
+def server_url(server) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def start_app(ollama_url: str, puter_url: str):
+    """
+    Serve the Flask app in-process against the stubs
+
+    Backend URLs are read from the environment when the app's modules are
+    imported, so this must run before anything imports them. Caches stay
+    in memory so that runs do not leave state behind, and rate limits are
+    off (every simulated client shares one address) unless set.
+    """
+    os.environ["OLLAMA_HOSTS"] = ollama_url
+    os.environ["PUTER_BASE_URL"] = puter_url
+    os.environ.setdefault("PUTER_API_KEY", "benchmark")
+    os.environ["LLM_CACHE_DB"] = ""
+    os.environ["PUTER_CACHE_DB"] = ""
+    os.environ.setdefault("RATE_LIMIT_TASKS", "0")
+    os.environ.setdefault("RATE_LIMIT_PUTER", "0")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+    from werkzeug.serving import make_server
+    from main import create_app
+
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="app", daemon=True).start()
+    return server
+
+
+class Sample:
+    __slots__ = ("latency", "status", "ok")
+
+    def __init__(self, latency: float, status: int, ok: bool):
+        self.latency = latency
+        self.status = status
+        self.ok = ok
+
+
+def run_load(call: Callable[[requests.Session, int], Tuple[int, bool]], total: int,
+             concurrency: int) -> Tuple[List[Sample], float]:
+    """
+    Run ``call(session, n)`` ``total`` times from ``concurrency`` workers
+
+    Each worker keeps its own ``requests.Session`` so connections are
+    reused the way a real client would. Returns the samples and the wall
+    time of the whole run.
+    """
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+    samples: List[Sample] = []
+
+    def worker():
+        session = requests.Session()
+        local = []
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                break
+            started = time.perf_counter()
+            try:
+                status, ok = call(session, n)
+            except requests.RequestException:
+                status, ok = 0, False
+            local.append(Sample(time.perf_counter() - started, status, ok))
+        session.close()
+        return local
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for result in [pool.submit(worker) for _ in range(concurrency)]:
+            samples.extend(result.result())
+    return samples, time.perf_counter() - started
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    latencies = [sample.latency for sample in samples if sample.ok]
+    return {
+        "requests": len(samples),
+        "ok": len(latencies),
+        "rejected": sum(1 for sample in samples if sample.status == 429),
+        "errors": sum(1 for sample in samples if not sample.ok and sample.status != 429),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "max": round(max(latencies), 4) if latencies else 0.0,
+    }
+
+
+def task_call(base_url: str, poll_interval: float, timeout: float, unique: bool):
+    """Submit a task and wait for it to finish: the end-to-end latency a user sees"""
+
+    def call(session: requests.Session, n: int) -> Tuple[int, bool]:
+        task = f"Benchmark task {n if unique else 0}: summarize the benefits of caching"
+        response = session.post(f"{base_url}/api/tasks", json={"task": task}, timeout=timeout)
+        if response.status_code != 200:
+            return response.status_code, False
+        task_id = response.json()["task_id"]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            response = session.get(f"{base_url}/api/tasks/{task_id}", timeout=timeout)
+            status = response.json().get("task", {}).get("status")
+            if status in TERMINAL_STATUSES:
+                return response.status_code, status == "completed"
+            time.sleep(poll_interval)
+        return 0, False
+
+    return call
+
+
+def puter_fast_call(base_url: str, timeout: float, unique: bool):
+    def call(session: requests.Session, n: int) -> Tuple[int, bool]:
+        response = session.post(
+            f"{base_url}/api/puter/fast-mode",
+            json={"text": f"Benchmark text {n if unique else 0}", "context": "benchmark"},
+            timeout=timeout
+        )
+        return response.status_code, response.status_code == 200
+
+    return call
+
+
+def puter_upload_call(base_url: str, timeout: float, unique: bool, size: int):
+    filler = b"x" * size
+
+    def call(session: requests.Session, n: int) -> Tuple[int, bool]:
+        content = f"{n if unique else 0}\n".encode("ascii") + filler
+        response = session.post(
+            f"{base_url}/api/puter/upload",
+            files={"file": (f"bench-{n}.txt", content, "text/plain")},
+            data={"task": "Summarize this file"},
+            timeout=timeout
+        )
+        return response.status_code, response.status_code == 200
+
+    return call
+
+
+def history_call(base_url: str, timeout: float):
+    def call(session: requests.Session, n: int) -> Tuple[int, bool]:
+        response = session.get(f"{base_url}/api/history", params={"limit": 50}, timeout=timeout)
+        return response.status_code, response.status_code == 200
+
+    return call
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float) -> List[str]:
+    """Regressions of p95 latency or throughput beyond ``tolerance`` (a fraction)"""
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        if previous["p95"] and current["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {current['p95']}s vs baseline {previous['p95']}s")
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{scenario}: throughput {current['throughput']}/s vs baseline {previous['throughput']}/s"
+            )
+    return regressions
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    columns = ("requests", "ok", "rejected", "errors", "throughput", "p50", "p95", "p99", "max")
+    print(f"{'scenario':<14}" + "".join(f"{column:>11}" for column in columns))
+    for scenario, stats in results.items():
+        print(f"{scenario:<14}" + "".join(f"{stats[column]:>11}" for column in columns))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--url", help="Benchmark a running server instead of starting the app in-process")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Task status poll interval")
+    parser.add_argument("--repeat", action="store_true",
+                        help="Send identical inputs so the response caches are exercised")
+    parser.add_argument("--upload-kb", type=int, default=256, help="Size of uploaded files")
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="Stub Ollama time to first token")
+    parser.add_argument("--token-rate", type=float, default=200, help="Stub Ollama tokens per second")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens per stub Ollama response")
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0, help="Fraction of failing generations")
+    parser.add_argument("--puter-latency", type=float, default=0.05, help="Stub Puter response time")
+    parser.add_argument("--puter-error-rate", type=float, default=0.0, help="Fraction of failing Puter calls")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the stubs' error injection")
+    parser.add_argument("--save", help="Write results to this JSON file (a new baseline)")
+    parser.add_argument("--baseline", help="Compare against a saved baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed p95/throughput change relative to the baseline")
+    args = parser.parse_args(argv)
+    args.scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    stubs = []
+    base_url = args.url
+    if base_url is None:
+        ollama = start_stub(StubOllamaHandler, StubConfig(
+            args.ollama_latency, args.token_rate, args.tokens, args.ollama_error_rate, args.seed
+        ))
+        puter = start_stub(StubPuterHandler, StubConfig(
+            args.puter_latency, error_rate=args.puter_error_rate, seed=args.seed
+        ))
+        stubs = [ollama, puter]
+        app = start_app(server_url(ollama), server_url(puter))
+        stubs.append(app)
+        base_url = server_url(app)
+    base_url = base_url.rstrip("/")
+
+    calls = {
+        "tasks": lambda: task_call(base_url, args.poll_interval, args.timeout, not args.repeat),
+        "puter-fast": lambda: puter_fast_call(base_url, args.timeout, not args.repeat),
+        "puter-upload": lambda: puter_upload_call(base_url, args.timeout, not args.repeat, args.upload_kb * 1024),
+        "history": lambda: history_call(base_url, args.timeout),
+    }
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            samples, elapsed = run_load(calls[scenario](), args.requests, args.concurrency)
+            results[scenario] = summarize(samples, elapsed)
+    finally:
+        for server in stubs:
+            server.shutdown()
+
+    print_report(results)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("save", "baseline")},
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# gunicorn.conf.py
+"""
+Production server settings: gunicorn -c gunicorn.conf.py
+
+The app is loaded once in the master process (token encoder and model
+warmup included) and then forked into ``GROOT_WORKERS`` processes with
+``GROOT_THREADS`` threads each. On SIGTERM a worker stops taking new
+tasks and drains queued and running ones for up to the graceful timeout.
+"""
+import os
+import signal
+import threading
+
+workers = int(os.getenv("GROOT_WORKERS", "2"))
+threads = int(os.getenv("GROOT_THREADS", "16"))
+worker_class = "gthread"
+bind = os.getenv("GROOT_BIND", "0.0.0.0:5000")
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+wsgi_app = "wsgi:app"
+preload_app = True
+graceful_timeout = int(os.getenv("GROOT_GRACEFUL_TIMEOUT", "120"))
+# Leave a margin to fail leftover tasks before the master kills the worker
+drain_timeout = max(1, graceful_timeout - 5)
+timeout = int(os.getenv("GROOT_WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("GROOT_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GROOT_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# Read by the app's modules at import time, which happens after this file is loaded
+os.environ["GROOT_WORKERS"] = str(workers)
+
+
+def on_starting(server):
+    """Fail tasks the previous run left unfinished, once, before any worker takes new ones"""
+    from main import recover_tasks
+
+    recover_tasks()
+
+
+def post_worker_init(worker):
+    """Start draining tasks as soon as the worker is asked to stop"""
+    stop = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        stop(sig, frame)
+        threading.Thread(target=_drain, args=(worker,), name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_exit)
+
+
+def worker_exit(server, worker):
+    # Open event streams can hold the worker until the graceful timeout; draining started on SIGTERM
+    _drain(worker)
+
+
+_drain_lock = threading.Lock()
+_drained = []
+
+
+def _drain(worker):
+    with _drain_lock:
+        if _drained:
+            return
+        from routes.agents import drain_tasks
+
+        _drained.append(drain_tasks(drain_timeout))
+        worker.log.info(f"Worker {worker.pid} drained ({_drained[0]} jobs left)")
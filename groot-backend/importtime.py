@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Report where the backend's startup time goes, module by module
+
+Imports a module of the app (``main`` by default) in a fresh interpreter
+run with ``python -X importtime``, and prints the total import time, the
+slowest modules by cumulative time and the heaviest top-level packages by
+self time. A budget turns the report into a startup regression check:
+
+    python importtime.py
+    python importtime.py --module routes.agents --top 30
+    python importtime.py --budget-ms 400
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Optional
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(text: str) -> List[ImportRecord]:
+    """Parse the ``import time:`` lines that ``-X importtime`` writes to stderr"""
+    records = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        name = fields[2].rstrip()
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        records.append(ImportRecord(stripped, int(fields[0]), int(fields[1]), depth))
+    return records
+
+
+def profile_imports(module: str, python: str = sys.executable, cwd: str = SRC_DIR) -> List[ImportRecord]:
+    """Import ``module`` in a fresh interpreter and return its import timings"""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors[-20:]))
+    return parse_importtime(result.stderr)
+
+
+def total_us(records: List[ImportRecord]) -> int:
+    """Time spent importing everything, i.e. the sum over top-level imports"""
+    return sum(record.cumulative_us for record in records if record.depth == 0)
+
+
+def package_totals(records: List[ImportRecord]) -> Dict[str, int]:
+    """Self time summed per top-level package (``aiohttp.client`` counts as ``aiohttp``)"""
+    totals: Dict[str, int] = {}
+    for record in records:
+        package = record.module.split(".", 1)[0]
+        totals[package] = totals.get(package, 0) + record.self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def print_report(module: str, records: List[ImportRecord], top: int) -> None:
+    print(f"Importing {module}: {total_us(records) / 1000:.1f} ms, {len(records)} modules")
+    print()
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    slowest = sorted(records, key=lambda record: record.cumulative_us, reverse=True)[:top]
+    for record in slowest:
+        print(f"{record.cumulative_us / 1000:>14.1f} {record.self_us / 1000:>9.1f}  "
+              f"{'  ' * record.depth}{record.module}")
+    print()
+    print(f"{'self ms':>14}  package")
+    for package, self_us in list(package_totals(records).items())[:top]:
+        print(f"{self_us / 1000:>14.1f}  {package}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--module", default="main", help="Module to import from src/")
+    parser.add_argument("--top", type=int, default=20, help="Rows per table")
+    parser.add_argument("--json", action="store_true", help="Print the records as JSON instead")
+    parser.add_argument("--budget-ms", type=float,
+                        help="Exit 1 when the total import time exceeds this many milliseconds")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    try:
+        records = profile_imports(args.module)
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "total_ms": total_us(records) / 1000,
+            "modules": [record._asdict() for record in records],
+        }, indent=2))
+    else:
+        print_report(args.module, records, args.top)
+
+    total_ms = total_us(records) / 1000
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"OVER BUDGET {total_ms:.1f} ms > {args.budget_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
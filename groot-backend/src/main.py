@@ -3,37 +3,24 @@ import time
 import threading
 import logging
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, Response, send_from_directory, jsonify
 from flask_cors import CORS
 from models.user import db
 from routes.user import user_bp
 from routes.agents import agents_bp
-
-# Initialize HTTP session with increased pool size
-session = requests.Session()
-retry_strategy = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[500, 502, 503, 504]
-)
-session.mount("http://", HTTPAdapter(
-    max_retries=retry_strategy,
-    pool_connections=20,  # Increased pool size
-    pool_maxsize=20
-))
-
-# Create thread pool with more workers
-executor = ThreadPoolExecutor(max_workers=8)  # Increased worker count
+from utils.task_store import task_store
+from utils.health import health_monitor
+from utils.aio import ollama_client, runtime
+from utils.llm import count_tokens
+from utils.metrics import CONTENT_TYPE, metrics
 
 # Initialize Flask app with optimized config
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Worker processes share the SQLite file; wait for each other's write locks instead of failing
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
 app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False  # Disable pretty print for performance
 
 # Enable CORS with simple configuration
@@ -41,6 +28,8 @@ CORS(app, origins=["http://localhost:5173", "http://127.0.0.1:5173"], supports_c
 
 # Initialize database
 db.init_app(app)
+task_store.init_app(app)
+metrics.init_app(app)
 
 # Register blueprints with URL prefix
 app.register_blueprint(user_bp, url_prefix='/api')
@@ -49,12 +38,10 @@ app.register_blueprint(agents_bp, url_prefix='/api')
 def warmup_ollama():
     """Optimized GPU warmup with smaller prompt"""
     try:
-        session.post(
-            "http://localhost:11434/api/generate",
-            json={
+        ollama_client.generate_sync(
+            {
                 "model": "mistral",
                 "prompt": "warmup",
-                "stream": False,
                 "options": {
                     "num_gpu_layers": 35,
                     "main_gpu": 0
@@ -94,13 +81,8 @@ def serve(path):
 @app.route('/api/performance')
 def performance_stats():
     """Optimized performance monitor"""
-    try:
-        ollama_status = session.get(
-            "http://localhost:11434",
-            timeout=2  # Reduced timeout
-        ).status_code
-    except:
-        ollama_status = "unreachable"
+    # Cached by the health monitor; never probes Ollama inline
+    ollama_status = health_monitor.status("ollama")["detail"] or "unknown"
 
     return jsonify({
         "status": "healthy",
@@ -109,6 +91,11 @@ def performance_stats():
         "timestamp": datetime.utcnow().isoformat() + "Z"
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype=CONTENT_TYPE)
+
 # OPTIONS requests are handled automatically by Flask-CORS
 
 @app.route('/api/<path:path>', methods=['OPTIONS'])
@@ -125,14 +112,52 @@ def after_request(response):
     response.headers.add('X-XSS-Protection', '1; mode=block')
     return response
 
-def create_app():
-    """Factory init function with background warmup"""
+def _dispose_engine():
+    # Pooled SQLite connections must not cross a fork; the child opens its own
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engine)
+
+def create_app(warmup=True, recover=True):
+    """Factory init function with background warmup
+
+    ``recover`` fails tasks a previous run left unfinished; a multi-worker
+    server does that once in its master instead (see ``recover_tasks``).
+    """
     with app.app_context():
         db.create_all()
-        # Run warmup in background
-        threading.Thread(target=warmup_ollama, daemon=True).start()
+        # WAL lets readers in other worker processes proceed while one writes
+        db.session.execute(db.text('PRAGMA journal_mode=WAL'))
+        if recover:
+            task_store.recover()
+        task_store.load()
+        if warmup:
+            health_monitor.ensure_started()
+            # Run warmup in background
+            threading.Thread(target=warmup_ollama, daemon=True).start()
     return app
 
+def recover_tasks():
+    """Fail tasks a previous run left unfinished; called once by the server master before workers start"""
+    with app.app_context():
+        db.create_all()
+    failed = task_store.recover()
+    if failed:
+        app.logger.warning(f"Marked {failed} tasks interrupted by the last shutdown as failed")
+
+def preload():
+    """
+    Load the token encoder and warm up the model once, before a
+    multi-worker server forks, so workers start ready and share the
+    encoder's memory. The async runtime is closed again because its loop
+    thread would not survive the fork; each worker starts its own.
+    """
+    count_tokens("warmup")
+    warmup_ollama()
+    runtime.close()
+
 if __name__ == '__main__':
     # Optimized logging setup
     logging.basicConfig(
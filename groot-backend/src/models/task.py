@@ -0,0 +1,75 @@
+from models.user import db
+
+# Fields stored in dedicated columns; anything else on a task record goes into ``details``
+TASK_COLUMNS = ("id", "description", "status", "priority", "model", "result", "error",
+                "created_at", "completed_at")
+
+
+class Task(db.Model):
+    __tablename__ = 'tasks'
+
+    id = db.Column(db.String(36), primary_key=True)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, index=True)
+    priority = db.Column(db.String(20))
+    model = db.Column(db.String(50))
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    # ISO-8601 UTC strings, as served by the API; they sort chronologically
+    created_at = db.Column(db.String(32), nullable=False, index=True)
+    completed_at = db.Column(db.String(32))
+    details = db.Column(db.JSON)
+
+    __table_args__ = (
+        db.Index('ix_tasks_status_created_at', 'status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Task {self.id} {self.status}>'
+
+    @classmethod
+    def from_dict(cls, data):
+        task = cls()
+        task.update_from_dict(data)
+        return task
+
+    def update_from_dict(self, data):
+        for column in TASK_COLUMNS:
+            if column in data:
+                setattr(self, column, data[column])
+        details = {key: value for key, value in data.items() if key not in TASK_COLUMNS}
+        self.details = details or None
+
+    def to_dict(self, include_result=True):
+        data = {column: getattr(self, column) for column in TASK_COLUMNS
+                if include_result or column != 'result'}
+        data.update(self.details or {})
+        return data
+
+
+class Activity(db.Model):
+    __tablename__ = 'activities'
+
+    id = db.Column(db.String(36), primary_key=True)
+    timestamp = db.Column(db.String(32), nullable=False, index=True)
+    agent = db.Column(db.String(80), nullable=False)
+    action = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    task_id = db.Column(db.String(36), index=True)
+
+    def __repr__(self):
+        return f'<Activity {self.agent}: {self.action}>'
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: data.get(key) for key in ('id', 'timestamp', 'agent', 'action', 'type', 'task_id')})
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'timestamp': self.timestamp,
+            'agent': self.agent,
+            'action': self.action,
+            'type': self.type,
+            'task_id': self.task_id
+        }
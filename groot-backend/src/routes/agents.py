@@ -1,19 +1,32 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 import time
 import threading
 from datetime import datetime
 import uuid
-import requests
 import json
 import os
-import tempfile
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from concurrent.futures import ThreadPoolExecutor
 import logging
 from functools import wraps
 from werkzeug.utils import secure_filename
 from utils.puter import puter_ai
+from utils.upload import StreamingUpload, UploadError, max_upload_bytes
+from utils.stream import task_streams, format_sse
+from utils.aio import ollama_client
+from utils.health import health_monitor
+from utils.batching import embed_batcher, generate_batcher
+from utils.scheduler import scheduler, QueueFullError, PRIORITIES
+from utils.ratelimit import rate_limiter, client_id
+from utils.deadline import Deadline, Interrupted, deadline_scope, task_deadlines
+from utils.cache import response_cache, analysis_cache
+from utils.mapreduce import map_reduce
+from utils.workflow import Step, Workflow, workflow_executor
+from utils.registry import AgentRegistry, UnknownAgentError, AGENT_STATUSES
+from utils.events import event_bus, CHANNELS
+from utils.semantic_cache import semantic_cache
+from utils.singleflight import llm_flights
+from utils.task_store import task_store, to_history, TASK_FILTERS, ACTIVITY_FILTERS, TERMINAL_STATUSES
+from utils.pagination import (InvalidQueryError, decode_cursor, parse_limit, parse_fields,
+                              parse_filters, project, make_etag)
 
 # Initialize blueprint
 agents_bp = Blueprint("agents", __name__)
@@ -22,27 +35,6 @@ agents_bp = Blueprint("agents", __name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create a persistent HTTP session with connection pooling
-session = requests.Session()
-retry_strategy = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[500, 502, 503, 504]
-)
-session.mount("http://", HTTPAdapter(
-    max_retries=retry_strategy,
-    pool_connections=20,  # Increased pool size
-    pool_maxsize=20
-))
-
-# Thread pool for concurrent task processing
-executor = ThreadPoolExecutor(max_workers=8)  # Increased worker count
-
-# Global state for tasks and activity
-active_tasks = {}
-activity_log = []
-task_history = []
-
 # Define the multi-agent system
 AGENTS = [
     {
@@ -79,7 +71,20 @@ AGENTS = [
     },
 ]
 
-active_agents = AGENTS.copy()
+# Live agent state; AGENTS stays an untouched template
+agent_registry = AgentRegistry(AGENTS)
+
+# Feed agent and task changes into the dashboard event stream
+agent_registry.add_listener(lambda event: event_bus.publish("agent", event, key=event["agent"]["id"]))
+task_store.add_listener(
+    lambda event, task_id, fields: event_bus.publish("task", dict(fields, event=event, id=task_id), key=task_id)
+)
+# Tasks cancelled through another worker process are stopped here
+task_store.add_listener(
+    lambda event, task_id, fields: task_deadlines.cancel(task_id) if event == "cancel_requested" else None
+)
+
+PUTER_REQUEST_TIMEOUT = float(os.getenv("PUTER_REQUEST_TIMEOUT", "120"))
 
 # Decorator for error handling
 def handle_errors(f):
@@ -92,6 +97,43 @@ def handle_errors(f):
             return jsonify({"success": False, "error": str(e)}), 500
     return wrapper
 
+def request_client():
+    """Rate-limit and fair-share identity of the current request"""
+    return client_id(request.remote_addr)
+
+def rate_limited(route):
+    """Refuse the request with 429 once the client has used up its token bucket for ``route``"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            decision = rate_limiter.check(route, request_client())
+            if decision is not None and not decision.allowed:
+                response = jsonify({
+                    "success": False,
+                    "error": "Rate limit exceeded, please retry later",
+                    "retry_after": decision.retry_after
+                })
+                response.status_code = 429
+                response.headers["Retry-After"] = str(decision.retry_after)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+            if decision is not None:
+                response.headers["X-RateLimit-Limit"] = str(decision.limit)
+                response.headers["X-RateLimit-Remaining"] = str(decision.remaining)
+            return response
+        return wrapper
+    return decorator
+
+def with_deadline(seconds):
+    """Run the request under a deadline of ``seconds`` that bounds every downstream call it makes"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with deadline_scope(Deadline(seconds)):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
 def add_activity(agent_name, action, task_id=None, activity_type="info"):
     """Add an activity to the log with improved structure"""
     activity = {
@@ -102,54 +144,85 @@ def add_activity(agent_name, action, task_id=None, activity_type="info"):
         "type": activity_type,
         "task_id": task_id,
     }
-    activity_log.append(activity)
+    task_store.add_activity(activity)
+    event_bus.publish("activity", activity)
     logger.info(f"Activity: {agent_name} - {action}")
     return activity
 
 def update_agent_status(agent_name, status):
     """Update agent status with validation"""
-    valid_statuses = ["active", "idle", "busy", "error"]
-    if status not in valid_statuses:
+    if status not in AGENT_STATUSES:
         logger.warning(f"Invalid status '{status}' for agent {agent_name}")
         status = "error"
     
-    for agent in active_agents:
-        if agent["name"] == agent_name:
-            agent["status"] = status
-            logger.debug(f"Updated {agent_name} status to {status}")
-            break
+    try:
+        agent_registry.set_status(agent_name, status)
+        logger.debug(f"Updated {agent_name} status to {status}")
+    except UnknownAgentError:
+        logger.warning(f"Unknown agent {agent_name}")
+
+LLM_OPTIONS = {
+    "num_gpu_layers": 35,
+    "main_gpu": 0
+}
+
+def call_llm_api(prompt, model_name="mistral", max_tokens=200, temperature=0.7, timeout=30,
+                 on_chunk=None, use_cache=True, batch=False):
+    """Ultra-fast LLM API call - exactly like PowerShell
+
+    When ``on_chunk`` is given the request is sent with ``stream: true`` and
+    every token fragment is handed to the callback as Ollama emits it.
+    ``timeout`` caps this call; the current task's deadline takes precedence
+    when it is sooner.
+    Identical requests are answered from ``response_cache`` unless
+    ``use_cache`` is False, and identical requests that arrive while a
+    generation is still running share it instead of starting another one.
+    Short prompts marked ``batch`` may be packed with others into one
+    generation when ``LLM_BATCH_WINDOW_MS`` is set; their output arrives
+    in one piece.
+    """
+    cache_key = response_cache.make_key(model_name, prompt, temperature, max_tokens, LLM_OPTIONS)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit for prompt: {prompt[:50]}...")
+            if on_chunk is not None:
+                on_chunk(cached)
+            return cached
 
-def call_llm_api(prompt, model_name="mistral", max_tokens=200, temperature=0.7, timeout=30):
-    """Ultra-fast LLM API call - exactly like PowerShell"""
+    def generate(emit):
+        # Always stream so that callers joining mid-flight still see partial output
+        result = _generate(prompt, model_name, max_tokens, temperature, timeout, emit, batch)
+        if use_cache:
+            response_cache.set(cache_key, result)
+        return result
+
+    return llm_flights.do(cache_key, generate, on_chunk)
+
+def _generate(prompt, model_name, max_tokens, temperature, timeout, on_chunk, batch=False):
+    """Send a single generation request to Ollama through the shared async client"""
     try:
-        url = "http://localhost:11434/api/generate"
         payload = {
             "model": model_name,
             "prompt": prompt,
             "temperature": temperature,
             "num_predict": max_tokens,
-            "stream": False,  # Disable streaming for speed
-            "options": {
-                "num_gpu_layers": 35,
-                "main_gpu": 0
-            }
+            "options": LLM_OPTIONS
         }
 
         logger.info(f"Calling LLM with prompt: {prompt[:50]}...")
         start_time = time.time()
         
-        response = session.post(url, json=payload, timeout=timeout)
-        if response.status_code != 200:
-            raise Exception(f"API Error {response.status_code}: {response.text}")
-        
-        result = response.json().get("response", "")
+        if batch and generate_batcher.enabled:
+            result = generate_batcher.generate_sync(payload, timeout)
+            on_chunk(result)
+        else:
+            result = ollama_client.generate_sync(payload, timeout, on_chunk)
         logger.info(f"LLM response in {(time.time()-start_time):.2f}s")
         return result
 
-    except requests.exceptions.Timeout:
-        raise Exception(f"Timeout after {timeout} seconds")
-    except requests.exceptions.ConnectionError:
-        raise Exception("Cannot connect to Ollama server")
+    except Interrupted:
+        raise
     except Exception as e:
         raise Exception(f"LLM Error: {str(e)}")
 
@@ -158,7 +231,8 @@ def research_with_llm(query):
     try:
         return call_llm_api(
             prompt=f"Provide concise technical analysis of: {query}",
-            timeout=45  # Reduced timeout
+            timeout=45,  # Reduced timeout
+            batch=True
         )
     except Exception as e:
         logger.warning(f"Research failed: {str(e)}")
@@ -179,46 +253,207 @@ def generate_content_with_llm(topic, research_summary=""):
         logger.warning(f"Content generation failed: {str(e)}")
         raise Exception("Content generation failed")
 
-def simulate_agent_work(task_id, task_description):
-    """Ultra-fast single API call workflow - like PowerShell"""
+def simulate_agent_work(task_id, task_description, workflow="direct"):
+    """Ultra-fast single API call workflow - like PowerShell (or the multi-agent DAG when requested)
+
+    Runs under the task's deadline, which started at submission: every model
+    call made for the task gets only the time that is left, and cancelling
+    the task aborts the calls in flight.
+    """
+    stream = task_streams.open(task_id)
+    deadline = task_deadlines.get(task_id) or task_deadlines.open(task_id)
+
+    def publish_chunk(chunk):
+        if task_store.append_result(task_id, chunk):
+            task_store.sync(task_id)
+        stream.append(chunk)
+
     try:
-        # Single direct call like PowerShell - no complex workflow
-        update_agent_status("Research Agent", "active")
-        add_activity("Research Agent", "Processing request", task_id)
-        
-        # Make one direct call with the exact prompt
-        result = call_llm_api(
-            prompt=task_description,
-            timeout=120,
-            max_tokens=300
-        )
-        
-        if task_id in active_tasks:
-            active_tasks[task_id].update({
-                "status": "completed",
-                "result": result,
-                "completed_at": datetime.utcnow().isoformat() + "Z"
-            })
-            
-            task_history.append({
-                "id": task_id,
-                "task": task_description,
-                "timestamp": active_tasks[task_id]["created_at"],
-                "status": "completed",
-                "result": result[:500] + "..." if len(result) > 500 else result
-            })
-            
-            add_activity("System", "Task completed successfully", task_id, "success")
+        with deadline_scope(deadline):
+            run_task(task_id, task_description, workflow, deadline, publish_chunk)
+        stream.close("completed")
 
     except Exception as e:
-        logger.error(f"Task processing failed: {str(e)}")
-        if task_id in active_tasks:
-            active_tasks[task_id].update({
-                "status": "failed",
-                "error": str(e),
-                "completed_at": datetime.utcnow().isoformat() + "Z"
-            })
-            add_activity("System", f"Task failed: {str(e)}", task_id, "error")
+        if deadline.reason == "cancelled":
+            status, error = "cancelled", "Cancelled by client"
+        elif deadline.reason == "expired":
+            status, error = "failed", f"Deadline of {deadline.seconds:g}s exceeded"
+        else:
+            status, error = "failed", str(e)
+        logger.error(f"Task processing {status}: {error}")
+        task = task_store.get(task_id)
+        if task is not None and task["status"] not in TERMINAL_STATUSES:
+            # Keep whatever was streamed before the failure out of the result field
+            task_store.update(
+                task_id,
+                status=status,
+                result=None,
+                partial_result=task.get("result"),
+                error=error,
+                completed_at=datetime.utcnow().isoformat() + "Z"
+            )
+            if status == "cancelled":
+                add_activity("System", "Task cancelled", task_id)
+            else:
+                add_activity("System", f"Task failed: {error}", task_id, "error")
+        stream.close(status, error)
+    finally:
+        task_deadlines.close(task_id)
+
+def run_task(task_id, task_description, workflow, deadline, publish_chunk):
+    """Produce and record the result of a task (raises when it fails or is interrupted)"""
+    # Cancelled or out of time while it was queued
+    deadline.check()
+    task = task_store.update(
+        task_id,
+        status="processing",
+        started_at=datetime.utcnow().isoformat() + "Z"
+    )
+    
+    fits = map_reduce.fits(task_description)
+    # Paraphrases of an earlier task are answered from the semantic cache (opt-in)
+    namespace = f"{workflow}:{task['model'] if task else 'mistral'}"
+    query = semantic_cache.embed(task_description) if fits else None
+    hit = semantic_cache.get(query, namespace)
+    
+    if hit is not None:
+        add_activity("System", f"Answered from semantic cache (similarity {hit.score:.2f})", task_id)
+        task_store.update(task_id, semantic_match={"prompt": hit.prompt, "similarity": round(hit.score, 3)})
+        publish_chunk(hit.value)
+        result = hit.value
+    elif workflow == "multi_agent" and fits:
+        result = run_multi_agent_workflow(task_id, task_description, publish_chunk)
+    else:
+        # Busy for the whole call, back to idle however it ends
+        agent_registry.acquire("Research Agent")
+        try:
+            if not fits:
+                result = process_long_input(task_id, task_description, publish_chunk)
+            else:
+                # Single direct call like PowerShell - no complex workflow
+                add_activity("Research Agent", "Processing request", task_id)
+                
+                # Make one direct call with the exact prompt, streaming tokens into the task
+                result = call_llm_api(
+                    prompt=task_description,
+                    timeout=120,
+                    max_tokens=300,
+                    on_chunk=publish_chunk
+                )
+        finally:
+            agent_registry.release("Research Agent")
+    
+    if hit is None:
+        semantic_cache.set(query, task_description, result, namespace)
+    # A cancellation that arrived after the last model call still wins
+    deadline.check()
+    task = task_store.update(
+        task_id,
+        status="completed",
+        result=result,
+        completed_at=datetime.utcnow().isoformat() + "Z"
+    )
+    if task is not None:
+        add_activity("System", "Task completed successfully", task_id, "success")
+
+def process_long_input(task_id, task_description, publish_chunk):
+    """Map-reduce a prompt over the context limit, recording chunk progress on the task"""
+    add_activity("Research Agent", "Input exceeds context limit, processing in chunks", task_id)
+    
+    def report(stage, done, total):
+        task_store.update(task_id, progress={"stage": stage, "done": done, "total": total})
+    
+    def generate(prompt, on_chunk=None):
+        return call_llm_api(prompt=prompt, timeout=120, max_tokens=300, on_chunk=on_chunk)
+    
+    return map_reduce.run(task_description, generate, on_chunk=publish_chunk, on_progress=report)
+
+WORKFLOWS = ("direct", "multi_agent")
+
+RESEARCH_ANGLES = (
+    ("background", "Key concepts and background"),
+    ("approaches", "Current approaches, tools and best practices"),
+    ("risks", "Risks, limitations and open questions"),
+)
+
+def build_task_workflow(task_description):
+    """Parallel research sub-queries -> content and planning side by side -> coordinator synthesis"""
+    steps = [
+        Step(
+            f"research-{name}",
+            "Research Agent",
+            lambda inputs, angle=angle: research_with_llm(f"{angle} of {task_description}")
+        )
+        for name, angle in RESEARCH_ANGLES
+    ]
+    research_ids = [step.id for step in steps]
+    
+    def research_summary(inputs):
+        return "\n\n".join(inputs[step_id] for step_id in research_ids)
+    
+    steps.append(Step(
+        "content",
+        "Content Agent",
+        lambda inputs: generate_content_with_llm(task_description, research_summary(inputs)),
+        deps=research_ids
+    ))
+    steps.append(Step(
+        "plan",
+        "Task Agent",
+        lambda inputs: call_llm_api(
+            prompt=f"Outline the concrete steps to accomplish: {task_description}"
+                   f"\n\nResearch Context:\n{research_summary(inputs)}",
+            timeout=45
+        ),
+        deps=research_ids
+    ))
+    steps.append(Step(
+        "synthesis",
+        "Coordinator Agent",
+        lambda inputs, on_chunk=None: call_llm_api(
+            prompt=f"Answer the request: {task_description}\n\nUse this material from your team.\n\n"
+                   f"Examples:\n{inputs['content']}\n\nPlan:\n{inputs['plan']}",
+            timeout=120,
+            max_tokens=300,
+            on_chunk=on_chunk
+        ),
+        deps=("content", "plan"),
+        stream=True
+    ))
+    return Workflow("multi_agent", steps)
+
+def run_multi_agent_workflow(task_id, task_description, publish_chunk):
+    """Run the multi-agent DAG for a task, recording per-step timing on the task record"""
+    lock = threading.Lock()
+    steps = {}
+    
+    def on_step(event, step, timing):
+        if event == "started":
+            agent_registry.acquire(step.agent)
+        else:
+            agent_registry.release(step.agent)
+        with lock:
+            steps[step.id] = dict(timing, status=event)
+            snapshot = dict(steps)
+        task_store.update(task_id, steps=snapshot)
+        if event == "started":
+            add_activity(step.agent, f"Started step: {step.id}", task_id)
+    
+    add_activity("Coordinator Agent", "Planning multi-agent workflow", task_id)
+    outcome = workflow_executor.run(build_task_workflow(task_description), on_chunk=publish_chunk, on_step=on_step)
+    task_store.update(task_id, workflow={
+        "name": "multi_agent",
+        "elapsed": outcome["elapsed"],
+        "critical_path": outcome["critical_path"],
+        "total_step_time": outcome["total_step_time"]
+    })
+    add_activity(
+        "Coordinator Agent",
+        f"Workflow finished in {outcome['elapsed']}s "
+        f"(critical path {outcome['critical_path']}s, {outcome['total_step_time']}s of agent work)",
+        task_id
+    )
+    return outcome["result"]
 
 # API Endpoints
 @agents_bp.route("/agents", methods=["GET"])
@@ -227,12 +462,59 @@ def get_agents():
     """Get all agents and their current status"""
     return jsonify({
         "success": True,
-        "agents": active_agents,
+        "agents": agent_registry.list_agents(),
         "timestamp": datetime.utcnow().isoformat() + "Z"
     })
 
+def dashboard_snapshot():
+    """Everything a dashboard shows, sent when it connects to /api/events"""
+    running = []
+    for status in ("queued", "processing"):
+        running.extend(task_store.list_tasks({"status": status}, include_result=False)[0])
+    return {
+        "agents": agent_registry.list_agents(),
+        "tasks": running,
+        "activity": task_store.list_activity({})[0],
+        "counts": {
+            "active_agents": agent_registry.count("active"),
+            "active_tasks": task_store.count("processing"),
+            "queued_tasks": task_store.count("queued"),
+            "total_completed_tasks": task_store.count("completed"),
+            "total_failed_tasks": task_store.count("failed")
+        }
+    }
+
+@agents_bp.route("/events", methods=["GET"])
+@handle_errors
+def stream_events():
+    """Multiplexed dashboard feed: agent, task and activity deltas as Server-Sent Events"""
+    channels = [channel for channel in request.args.get("channels", ",".join(CHANNELS)).split(",") if channel]
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+        return jsonify({
+            "success": False,
+            "error": f"Channels must be among: {', '.join(CHANNELS)}"
+        }), 400
+    
+    # Resume after the last event the client saw; otherwise start with a snapshot
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("offset")
+    try:
+        last_event_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_event_id = None
+    
+    return Response(
+        stream_with_context(event_bus.iter_events(last_event_id, channels, snapshot=dashboard_snapshot)),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @agents_bp.route("/tasks", methods=["POST"])
 @handle_errors
+@rate_limited("tasks")
 def submit_task():
     """Submit a new task for processing"""
     data = request.get_json()
@@ -244,29 +526,73 @@ def submit_task():
             "error": "Task description is required"
         }), 400
     
+    priority = data.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        return jsonify({
+            "success": False,
+            "error": f"Priority must be one of: {', '.join(PRIORITIES)}"
+        }), 400
+    
+    workflow = data.get("workflow", "direct")
+    if workflow not in WORKFLOWS:
+        return jsonify({
+            "success": False,
+            "error": f"Workflow must be one of: {', '.join(WORKFLOWS)}"
+        }), 400
+    
+    # End-to-end budget in seconds, counted from now (time spent queued included)
+    timeout = data.get("timeout", task_deadlines.default_seconds)
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) \
+            or not 0 < timeout <= task_deadlines.default_seconds:
+        return jsonify({
+            "success": False,
+            "error": f"Timeout must be a number of seconds up to {task_deadlines.default_seconds:g}"
+        }), 400
+    
     task_id = str(uuid.uuid4())
     task_description = data["task"]
     
     task = {
         "id": task_id,
         "description": task_description,
-        "status": "processing",
+        "status": "queued",
+        "priority": priority,
+        "workflow": workflow,
+        "model": "mistral",
+        "timeout": timeout,
         "created_at": datetime.utcnow().isoformat() + "Z",
         "result": None
     }
     
-    active_tasks[task_id] = task
+    task_store.create(task)
+    task_deadlines.open(task_id, timeout)
     
-    # Submit to thread pool
-    executor.submit(simulate_agent_work, task_id, task_description)
+    # Hand off to the bounded scheduler; reject instead of queueing without limit
+    try:
+        position = scheduler.submit(
+            simulate_agent_work, task_id, task_description, workflow,
+            priority=priority, owner=request_client()
+        )
+    except QueueFullError as e:
+        task_store.delete(task_id)
+        task_deadlines.close(task_id)
+        logger.warning(f"Rejected task, queue full ({e.queue_depth} waiting)")
+        response = jsonify({
+            "success": False,
+            "error": "Server is busy, please retry later",
+            "retry_after": e.retry_after
+        })
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
     
-    logger.info(f"Started processing task {task_id}")
+    logger.info(f"Queued task {task_id} at position {position}")
     add_activity("System", f"Task started: {task_description}", task_id)
     
     return jsonify({
         "success": True,
         "task_id": task_id,
         "message": "Task submitted successfully",
+        "queue_position": position,
         "timestamp": task["created_at"]
     })
 
@@ -274,7 +600,8 @@ def submit_task():
 @handle_errors
 def get_task_status(task_id):
     """Get the status of a specific task"""
-    if task_id not in active_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         logger.warning(f"Task not found: {task_id}")
         return jsonify({
             "success": False,
@@ -283,31 +610,184 @@ def get_task_status(task_id):
     
     return jsonify({
         "success": True,
-        "task": active_tasks[task_id],
+        "task": task,
         "timestamp": datetime.utcnow().isoformat() + "Z"
     })
 
-@agents_bp.route("/activity", methods=["GET"])
+@agents_bp.route("/tasks/<task_id>", methods=["DELETE"])
 @handle_errors
-def get_activity_log():
-    """Get the activity log"""
+def cancel_task(task_id):
+    """Cancel a queued or running task, aborting its in-flight model calls"""
+    task = task_store.get(task_id)
+    if task is None:
+        logger.warning(f"Task not found for cancellation: {task_id}")
+        return jsonify({
+            "success": False,
+            "error": "Task not found"
+        }), 404
+    
+    if task["status"] in TERMINAL_STATUSES:
+        return jsonify({
+            "success": False,
+            "error": f"Task already {task['status']}"
+        }), 409
+    
+    if task_store.is_local(task_id):
+        # A running task records the cancellation itself as soon as its model call is aborted
+        task_deadlines.cancel(task_id)
+        if task["status"] == "queued":
+            task_store.update(
+                task_id,
+                status="cancelled",
+                error="Cancelled by client",
+                completed_at=datetime.utcnow().isoformat() + "Z"
+            )
+            stream = task_streams.get(task_id)
+            if stream is not None:
+                stream.close("cancelled", "Cancelled by client")
+            add_activity("System", "Task cancelled", task_id)
+    elif not task_store.request_cancel(task_id):
+        # Finished in another worker process meanwhile
+        return jsonify({
+            "success": False,
+            "error": "Task already finished"
+        }), 409
+    
+    logger.info(f"Cancelled task {task_id}")
     return jsonify({
         "success": True,
-        "activities": activity_log[-50:],
-        "count": len(activity_log),
+        "task_id": task_id,
+        "status": "cancelled",
         "timestamp": datetime.utcnow().isoformat() + "Z"
     })
 
+@agents_bp.route("/tasks/<task_id>/stream", methods=["GET"])
+@handle_errors
+def stream_task(task_id):
+    """Stream task output as Server-Sent Events while it is generated"""
+    task = task_store.get(task_id)
+    if task is None:
+        logger.warning(f"Task not found for streaming: {task_id}")
+        return jsonify({
+            "success": False,
+            "error": "Task not found"
+        }), 404
+    
+    # Resume from the last character offset the client saw after a reconnect
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("offset", "0")
+    try:
+        offset = max(0, int(last_event_id))
+    except ValueError:
+        offset = 0
+    
+    stream = task_streams.get(task_id)
+    if stream is None and task["status"] in ("queued", "processing") and not task_store.is_local(task_id):
+        # Running in another worker process: follow the record it writes through
+        events = follow_task_record(task_id, offset)
+    else:
+        if stream is None:
+            # Task finished before streaming existed (or was pruned): replay the final record
+            stream = task_streams.open(task_id)
+            if task["status"] not in ("queued", "processing"):
+                stream.append(task.get("result") or "")
+                stream.close(task["status"], task.get("error"))
+        events = stream.iter_events(offset)
+    
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+def follow_task_record(task_id, offset, interval=None):
+    """SSE frames for a task running in another worker, polled from the shared task store"""
+    interval = interval or task_store.sync_interval
+    while True:
+        task = task_store.get(task_id) or {"status": "failed", "error": "Task not found"}
+        result = task.get("result") or ""
+        if len(result) > offset:
+            yield format_sse({"text": result[offset:]}, event="chunk", event_id=len(result))
+            offset = len(result)
+        if task["status"] not in ("queued", "processing"):
+            yield format_sse({"status": task["status"], "error": task.get("error")}, event="done", event_id=offset)
+            return
+        yield ": keep-alive\n\n"
+        time.sleep(interval)
+
+def drain_tasks(timeout):
+    """
+    Graceful shutdown: refuse new tasks, let queued and running ones finish
+    for up to ``timeout`` seconds, then fail whatever is left so it is not
+    reported as running forever
+    """
+    remaining = scheduler.drain(timeout)
+    if remaining:
+        failed = task_store.fail_running("Interrupted by server shutdown")
+        logger.warning(f"Shutdown timed out with {remaining} jobs left; marked {failed} tasks failed")
+    return remaining
+
+def listing_response(version, build):
+    """Serve a paginated listing, answering 304 when the client's ETag is still current"""
+    etag = make_etag(version, request.full_path)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    
+    try:
+        payload = build()
+    except InvalidQueryError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    payload.update({"success": True, "timestamp": datetime.utcnow().isoformat() + "Z"})
+    response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@agents_bp.route("/activity", methods=["GET"])
+@handle_errors
+def get_activity_log():
+    """Get the activity log (newest page first; follow next_cursor for older entries)"""
+    def build():
+        fields = parse_fields(request.args.get("fields"))
+        activities, next_cursor = task_store.list_activity(
+            parse_filters(request.args, ACTIVITY_FILTERS),
+            cursor=decode_cursor(request.args.get("cursor")),
+            limit=parse_limit(request.args.get("limit"))
+        )
+        return {
+            "activities": [project(activity, fields) for activity in activities],
+            "count": task_store.activity_count,
+            "next_cursor": next_cursor
+        }
+    
+    return listing_response(task_store.activity_count, build)
+
 @agents_bp.route("/history", methods=["GET"])
 @handle_errors
 def get_task_history():
-    """Get task history"""
-    return jsonify({
-        "success": True,
-        "history": task_history,
-        "count": len(task_history),
-        "timestamp": datetime.utcnow().isoformat() + "Z"
-    })
+    """Get task history (newest page first; follow next_cursor for older entries)"""
+    def build():
+        fields = parse_fields(request.args.get("fields"))
+        filters = parse_filters(request.args, TASK_FILTERS)
+        filters.setdefault("status", "completed")
+        tasks, next_cursor = task_store.list_tasks(
+            filters,
+            cursor=decode_cursor(request.args.get("cursor")),
+            limit=parse_limit(request.args.get("limit")),
+            include_result=fields is None or "result" in fields
+        )
+        return {
+            "history": [project(to_history(task), fields) for task in tasks],
+            "count": task_store.count_tasks(filters),
+            "next_cursor": next_cursor
+        }
+    
+    return listing_response(task_store.version, build)
 
 @agents_bp.route("/status", methods=["GET"])
 @handle_errors
@@ -316,13 +796,29 @@ def get_system_status():
     return jsonify({
         "success": True,
         "status": {
-            "active_agents": sum(1 for agent in active_agents if agent["status"] == "active"),
-            "idle_agents": sum(1 for agent in active_agents if agent["status"] == "idle"),
-            "active_tasks": sum(1 for task in active_tasks.values() if task["status"] == "processing"),
-            "total_agents": len(active_agents),
-            "total_completed_tasks": len(task_history),
-            "total_failed_tasks": sum(1 for task in active_tasks.values() if task.get("status") == "failed"),
-            "thread_pool": executor._max_workers
+            "active_agents": agent_registry.count("active"),
+            "idle_agents": agent_registry.count("idle"),
+            "active_tasks": task_store.count("processing"),
+            "queued_tasks": task_store.count("queued"),
+            "total_agents": len(agent_registry),
+            "total_completed_tasks": task_store.count("completed"),
+            "total_failed_tasks": task_store.count("failed"),
+            "total_cancelled_tasks": task_store.count("cancelled"),
+            "thread_pool": scheduler.max_concurrency,
+            "scheduler": scheduler.stats(),
+            "rate_limits": rate_limiter.stats(),
+            "deadlines": task_deadlines.stats(),
+            "cache": response_cache.stats(),
+            "semantic_cache": semantic_cache.stats(),
+            "analysis_cache": analysis_cache.stats(),
+            "coalescing": llm_flights.stats(),
+            "backends": ollama_client.pool.stats(),
+            "http": ollama_client.runtime.http.stats(),
+            "batching": {"embeddings": embed_batcher.stats(), "generations": generate_batcher.stats()},
+            "long_input": map_reduce.stats(),
+            "workflows": workflow_executor.stats(),
+            "events": event_bus.stats(),
+            "health": health_monitor.stats()
         },
         "timestamp": datetime.utcnow().isoformat() + "Z"
     })
@@ -333,7 +829,7 @@ def performance_stats():
     """Performance monitoring endpoint"""
     return jsonify({
         "success": True,
-        "ollama_status": session.get("http://localhost:11434").status_code,
+        "ollama_status": health_monitor.status("ollama")["detail"] or "unknown",
         "active_threads": threading.active_count(),
         "system_time": datetime.utcnow().isoformat() + "Z"
     })
@@ -341,72 +837,63 @@ def performance_stats():
 # Puter.js AI Integration Routes
 @agents_bp.route("/puter/upload", methods=["POST"])
 @handle_errors
+@rate_limited("puter")
+@with_deadline(PUTER_REQUEST_TIMEOUT)
 def puter_upload_file():
-    """Upload and process file with Puter.js AI"""
+    """Upload and process file with Puter.js AI, streaming the request body through to the API"""
     try:
-        if 'file' not in request.files:
-            return jsonify({"success": False, "error": "No file provided"}), 400
+        upload = StreamingUpload(request.stream, request.content_type or "", max_upload_bytes())
+        upload.open()
         
-        file = request.files['file']
-        task_description = request.form.get('task', 'Analyze this file and provide insights')
-        
-        if file.filename == '':
-            return jsonify({"success": False, "error": "No file selected"}), 400
-        
-        # Check if Puter.js is available
-        if not puter_ai.is_available():
+        # Check if Puter.js is available (cached status, never probes inline)
+        if not health_monitor.available("puter"):
             return jsonify({"success": False, "error": "Puter.js AI service is not available"}), 503
         
-        # Save file temporarily
-        filename = secure_filename(file.filename) if file.filename else "uploaded_file"
-        temp_dir = tempfile.mkdtemp()
-        file_path = os.path.join(temp_dir, filename)
-        file.save(file_path)
+        filename = secure_filename(upload.filename) or "uploaded_file"
+        upload.filename = filename
         
-        try:
-            # Process file with Puter.js
-            result = puter_ai.process_file(file_path, task_description)
+        # Process file with Puter.js while it is still being received
+        result = puter_ai.process_upload(upload)
+        
+        if result["success"]:
+            # Add to task history
+            task_id = str(uuid.uuid4())
+            task_store.create({
+                "id": task_id,
+                "description": f"Puter.js File Analysis: {filename}",
+                "status": "completed",
+                "result": result["result"],
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "completed_at": datetime.utcnow().isoformat() + "Z",
+                "model": "puter-ai",
+                "file_info": result.get("file_info", {})
+            })
             
-            if result["success"]:
-                # Add to task history
-                task_id = str(uuid.uuid4())
-                task_history.append({
-                    "id": task_id,
-                    "task": f"Puter.js File Analysis: {filename}",
-                    "status": "completed",
-                    "result": result["result"],
-                    "created_at": datetime.utcnow().isoformat() + "Z",
-                    "completed_at": datetime.utcnow().isoformat() + "Z",
-                    "model": "puter-ai",
-                    "file_info": result.get("file_info", {})
-                })
-                
-                add_activity("Puter.js AI", f"Processed file: {filename}", task_id, "success")
-                
-                return jsonify({
-                    "success": True,
-                    "task_id": task_id,
-                    "result": result["result"],
-                    "file_info": result.get("file_info", {}),
-                    "metadata": result.get("metadata", {})
-                })
-            else:
-                return jsonify({"success": False, "error": result["error"]}), 500
-                
-        finally:
-            # Clean up temporary file
-            try:
-                os.remove(file_path)
-                os.rmdir(temp_dir)
-            except:
-                pass
-                
+            action = "Returned cached analysis" if result.get("cached") else "Processed file"
+            add_activity("Puter.js AI", f"{action}: {filename}", task_id, "success")
+            
+            return jsonify({
+                "success": True,
+                "task_id": task_id,
+                "result": result["result"],
+                "file_info": result.get("file_info", {}),
+                "metadata": result.get("metadata", {}),
+                "cached": result.get("cached", False)
+            })
+        else:
+            return jsonify({"success": False, "error": result["error"]}), 500
+    
+    except UploadError as e:
+        logger.warning(f"Rejected Puter.js upload: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), e.status
     except Exception as e:
         logger.error(f"Error in Puter.js file upload: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @agents_bp.route("/puter/fast-mode", methods=["POST"])
 @handle_errors
+@rate_limited("puter")
+@with_deadline(PUTER_REQUEST_TIMEOUT)
 def puter_fast_mode():
     """Fast mode analysis using Puter.js AI"""
     try:
@@ -417,8 +904,8 @@ def puter_fast_mode():
         if not text_input.strip():
             return jsonify({"success": False, "error": "No text provided"}), 400
         
-        # Check if Puter.js is available
-        if not puter_ai.is_available():
+        # Check if Puter.js is available (cached status, never probes inline)
+        if not health_monitor.available("puter"):
             return jsonify({"success": False, "error": "Puter.js AI service is not available"}), 503
         
         # Process with Puter.js fast mode
@@ -427,9 +914,9 @@ def puter_fast_mode():
         if result["success"]:
             # Add to task history
             task_id = str(uuid.uuid4())
-            task_history.append({
+            task_store.create({
                 "id": task_id,
-                "task": f"Puter.js Fast Mode: {text_input[:50]}...",
+                "description": f"Puter.js Fast Mode: {text_input[:50]}...",
                 "status": "completed",
                 "result": result["result"],
                 "created_at": datetime.utcnow().isoformat() + "Z",
@@ -460,12 +947,13 @@ def puter_fast_mode():
 def puter_status():
     """Check Puter.js AI service status"""
     try:
-        is_available = puter_ai.is_available()
+        is_available = health_monitor.available("puter")
         return jsonify({
             "success": True,
             "available": is_available,
             "service": "Puter.js AI",
-            "status": "online" if is_available else "offline"
+            "status": "online" if is_available else "offline",
+            "health": health_monitor.status("puter")
         })
     except Exception as e:
         logger.error(f"Error checking Puter.js status: {str(e)}")
@@ -0,0 +1,337 @@
+# src/utils/aio.py
+import asyncio
+import atexit
+import os
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.backends import Backend, BackendPool, BackendUnavailable, NoHealthyBackendError, backend_urls_from_env
+from utils.circuit import CircuitBreaker, CircuitOpenError, breaker_from_env
+from utils.deadline import current_deadline
+from utils.http_client import HttpClient, client_from_env
+from utils.metrics import RATE_BUCKETS, metrics
+from utils.stream import handle_ollama_line
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """
+    One background asyncio event loop shared by all outbound HTTP calls
+
+    The loop runs on a single daemon thread and drives the shared
+    ``HttpClient``, whose pooled sessions live on it, so any number of
+    in-flight requests cost a coroutine each instead of a blocked OS thread.
+    Synchronous code hands coroutines over with ``run``/``submit``; ``run``
+    gives up at the current task's deadline and cancels the coroutine, so a
+    cancelled or expired task aborts its HTTP requests. aiohttp is only
+    imported when a session is first created, which keeps it out of startup.
+    """
+
+    def __init__(self, http: Optional[HttpClient] = None):
+        self.http = http or HttpClient()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running event loop, started on first use"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="aio-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Schedule a coroutine on the loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and block the calling thread for its result
+
+        Raises:
+            TaskCancelled: If the current task is cancelled meanwhile
+            DeadlineExceeded: If the current task's deadline passes first
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRuntime.run() called from the event loop thread; await instead")
+        deadline = current_deadline()
+        if deadline is None:
+            return self.submit(coro).result(timeout)
+        try:
+            deadline.check()
+        except Exception:
+            coro.close()
+            raise
+        return deadline.wait(self.submit(coro), timeout)
+
+    def after_fork(self) -> None:
+        """
+        Forget the loop copied from a parent process (its thread did not
+        survive the fork); the child starts its own on first use
+        """
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self.http.after_fork()
+
+    def close(self) -> None:
+        """Close the HTTP sessions, cancel background tasks (health checks) and stop the loop"""
+        with self._lock:
+            loop = self._loop
+            if loop is None:
+                return
+            self._loop = None
+        asyncio.run_coroutine_threadsafe(_shutdown(self.http), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+async def _shutdown(http: HttpClient) -> None:
+    await http.close()
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class OllamaClient:
+    """Async client for a pool of Ollama hosts with thin synchronous wrappers"""
+
+    def __init__(self, runtime: AsyncRuntime, pool: BackendPool, breaker: Optional[CircuitBreaker] = None):
+        self.runtime = runtime
+        self.pool = pool
+        self.breaker = breaker or CircuitBreaker("ollama")
+
+    async def generate(self, payload: Dict[str, Any], timeout: float,
+                       on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Run ``/api/generate`` on the best backend; streams NDJSON to ``on_chunk`` when given
+
+        A backend that cannot be reached is reported to the pool and the
+        request is retried on the next one, as long as nothing was streamed
+        yet and the ``ollama`` retry budget allows. Fails fast while the
+        circuit breaker is open.
+
+        Raises:
+            CircuitOpenError: If the Ollama circuit is open
+            Exception: With the same messages the blocking client used
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Ollama circuit is open, failing fast")
+        try:
+            result = await self._generate(payload, timeout, on_chunk)
+        except (BackendUnavailable, NoHealthyBackendError):
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # An API error or a slow generation still means Ollama is reachable
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _generate(self, payload: Dict[str, Any], timeout: float,
+                        on_chunk: Optional[Callable[[str], None]]) -> str:
+        self.pool.ensure_health_checks(self.runtime)
+        model = payload.get("model")
+        payload = dict(payload, stream=on_chunk is not None)
+        streamed = []
+
+        def relay(chunk: str) -> None:
+            streamed.append(True)
+            on_chunk(chunk)
+
+        tried = set()
+        while True:
+            backend = self.pool.choose(model, exclude=tried)
+            try:
+                with self.pool.track(backend, model):
+                    return await self._generate_on(backend, payload, timeout, relay if on_chunk else None)
+            except BackendUnavailable as e:
+                tried.add(backend.url)
+                logger.warning(f"Ollama backend {backend.url} failed: {str(e)}")
+                if streamed or len(tried) == len(self.pool.backends):
+                    raise
+                if not self.runtime.http.budget("ollama").try_spend():
+                    logger.warning("Ollama retry budget exhausted, not failing over")
+                    raise
+
+    async def _generate_on(self, backend: Backend, payload: Dict[str, Any], timeout: float,
+                           on_chunk: Optional[Callable[[str], None]]) -> str:
+        import aiohttp
+
+        start_time = time.time()
+        model = payload.get("model", "")
+        final: Dict[str, Any] = {}
+        first_token = []
+
+        def relay(chunk: str) -> None:
+            if not first_token:
+                first_token.append(time.time())
+            on_chunk(chunk)
+
+        try:
+            # Generations are not resent on the same host; _generate fails over instead
+            async with self.runtime.http.request(
+                "ollama", "POST", f"{backend.url}/api/generate",
+                json=payload, timeout=timeout, retry=False
+            ) as response:
+                if response.status >= 500:
+                    raise BackendUnavailable(f"API Error {response.status}: {await response.text()}")
+                if response.status != 200:
+                    raise Exception(f"API Error {response.status}: {await response.text()}")
+                if on_chunk is None:
+                    final = await response.json(content_type=None)
+                    result = final.get("response", "")
+                else:
+                    result = await _consume_ollama_stream(response, relay, start_time, final)
+        except asyncio.TimeoutError:
+            LLM_REQUESTS.labels(model, backend.url, "timeout").inc()
+            raise Exception(f"Timeout after {timeout} seconds")
+        except asyncio.CancelledError:
+            # The task was cancelled or ran out of time; leaving the request closes the stream
+            LLM_REQUESTS.labels(model, backend.url, "cancelled").inc()
+            raise
+        except aiohttp.ClientConnectionError as e:
+            LLM_REQUESTS.labels(model, backend.url, "unavailable").inc()
+            logger.debug(f"Connection to {backend.url} failed: {str(e)}")
+            raise BackendUnavailable("Cannot connect to Ollama server")
+        except BackendUnavailable:
+            LLM_REQUESTS.labels(model, backend.url, "unavailable").inc()
+            raise
+        except Exception:
+            LLM_REQUESTS.labels(model, backend.url, "error").inc()
+            raise
+        _observe_generation(model, backend.url, start_time, first_token[0] if first_token else None, final)
+        return result
+
+    async def ping(self, timeout: float = 2) -> int:
+        """Return the HTTP status of the root endpoint of the preferred backend"""
+        backend = self.pool.choose()
+        async with self.runtime.http.request("ollama", "GET", backend.url, timeout=timeout, retry=False) as response:
+            return response.status
+
+    async def embed(self, text: str, model: str, timeout: float = 10) -> List[float]:
+        """Embedding of ``text`` from ``/api/embed``, preferring a host with ``model`` loaded"""
+        return (await self.embed_many([text], model, timeout))[0]
+
+    async def embed_many(self, texts: List[str], model: str, timeout: float = 10) -> List[List[float]]:
+        """Embeddings of ``texts`` (in order) from a single ``/api/embed`` request"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Ollama circuit is open, failing fast")
+        # Not tracked by the pool: embedding latency says nothing about generation speed
+        backend = self.pool.choose(model)
+        async with self.runtime.http.request(
+            "ollama", "POST", f"{backend.url}/api/embed",
+            json={"model": model, "input": texts}, timeout=timeout
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"API Error {response.status}: {await response.text()}")
+            body = await response.json(content_type=None)
+        embeddings = body["embeddings"]
+        if len(embeddings) != len(texts):
+            raise Exception(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    def generate_sync(self, payload: Dict[str, Any], timeout: float,
+                      on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        return self.runtime.run(self.generate(payload, timeout, on_chunk))
+
+    def ping_sync(self, timeout: float = 2) -> int:
+        return self.runtime.run(self.ping(timeout))
+
+    def embed_sync(self, text: str, model: str, timeout: float = 10) -> List[float]:
+        return self.runtime.run(self.embed(text, model, timeout))
+
+
+async def _consume_ollama_stream(response, on_chunk: Callable[[str], None], start_time: float,
+                                 final: Optional[Dict[str, Any]] = None) -> str:
+    """Async counterpart of ``utils.stream.consume_ollama_stream``"""
+    parts = []
+    async for line in response.content:
+        if handle_ollama_line(line, parts, on_chunk, start_time, final):
+            break
+    return "".join(parts)
+
+
+def _observe_generation(model: str, backend: str, start_time: float, first_token: Optional[float],
+                        final: Dict[str, Any]) -> None:
+    """
+    Record one successful generation
+
+    Time to first token is measured when streaming; otherwise it is taken
+    from the load and prompt-evaluation times Ollama reports. Tokens per
+    second use Ollama's own eval counters when present.
+    """
+    LLM_REQUESTS.labels(model, backend, "ok").inc()
+    LLM_GENERATION_SECONDS.labels(model, backend).observe(time.time() - start_time)
+    if first_token is not None:
+        LLM_TTFT_SECONDS.labels(model, backend).observe(first_token - start_time)
+    elif "prompt_eval_duration" in final:
+        LLM_TTFT_SECONDS.labels(model, backend).observe(
+            (final.get("load_duration", 0) + final["prompt_eval_duration"]) / 1e9
+        )
+    tokens, eval_ns = final.get("eval_count"), final.get("eval_duration")
+    if tokens:
+        LLM_TOKENS.labels(model, backend).inc(tokens)
+        if eval_ns:
+            LLM_TOKENS_PER_SECOND.labels(model, backend).observe(tokens / (eval_ns / 1e9))
+
+
+# Metrics
+LLM_REQUESTS = metrics.counter(
+    "groot_llm_requests", "Ollama generation attempts by outcome", ("model", "backend", "outcome")
+)
+LLM_TTFT_SECONDS = metrics.histogram(
+    "groot_llm_time_to_first_token_seconds", "Time from sending a generation to its first token", ("model", "backend")
+)
+LLM_GENERATION_SECONDS = metrics.histogram(
+    "groot_llm_generation_seconds", "Total time of successful generations", ("model", "backend")
+)
+LLM_TOKENS_PER_SECOND = metrics.histogram(
+    "groot_llm_tokens_per_second", "Decoding speed reported by Ollama", ("model", "backend"), buckets=RATE_BUCKETS
+)
+LLM_TOKENS = metrics.counter("groot_llm_tokens", "Tokens generated", ("model", "backend"))
+
+
+# Global instances
+runtime = AsyncRuntime(client_from_env())
+ollama_pool = BackendPool(
+    backend_urls_from_env(),
+    strategy=os.getenv("OLLAMA_ROUTING", "least_outstanding"),
+    max_failures=int(os.getenv("OLLAMA_MAX_FAILURES", "3")),
+    eject_seconds=float(os.getenv("OLLAMA_EJECT_SECONDS", "30")),
+    check_interval=float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+)
+ollama_client = OllamaClient(runtime, ollama_pool, breaker_from_env("ollama"))
+atexit.register(runtime.close)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=runtime.after_fork)
+    os.register_at_fork(after_in_child=ollama_pool.after_fork)
+metrics.callback(
+    "groot_ollama_backend_outstanding", "In-flight generations per Ollama host",
+    lambda: {(backend.url,): backend.outstanding for backend in ollama_pool.backends}, ("backend",)
+)
+metrics.callback(
+    "groot_ollama_backend_healthy", "1 while an Ollama host is not ejected",
+    lambda: {(backend.url,): backend.available(time.time()) for backend in ollama_pool.backends}, ("backend",),
+    merge="max"
+)
+metrics.callback(
+    "groot_http_connections", "Outbound connections opened or reused per upstream",
+    lambda: {(name, kind): upstream[f"{kind}_connections"]
+             for name, upstream in runtime.http.stats().items() for kind in ("new", "reused")},
+    ("upstream", "kind"), kind="counter"
+)
+metrics.callback(
+    "groot_http_retries", "Outbound retries allowed or denied by the retry budget",
+    lambda: {(name, outcome): upstream[key] for name, upstream in runtime.http.stats().items()
+             for outcome, key in (("allowed", "retries"), ("denied", "denied"))},
+    ("upstream", "outcome"), kind="counter"
+)
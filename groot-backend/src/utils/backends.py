@@ -0,0 +1,187 @@
+# src/utils/backends.py
+import asyncio
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Set
+
+if TYPE_CHECKING:
+    from utils.http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+ROUTING_STRATEGIES = ("least_outstanding", "ewma")
+
+
+class NoHealthyBackendError(Exception):
+    """Raised when every backend in the pool is ejected"""
+
+
+class BackendUnavailable(Exception):
+    """A backend could not be reached (counts towards ejection)"""
+
+
+class Backend:
+    """Routing state for one Ollama host"""
+
+    __slots__ = ("url", "outstanding", "latency", "failures", "ejected_until", "models", "last_check")
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.latency = 0.0          # EWMA of successful request latency (seconds)
+        self.failures = 0           # consecutive failures
+        self.ejected_until = 0.0
+        self.models: Set[str] = set()
+        self.last_check = 0.0
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.available(time.time()),
+            "outstanding": self.outstanding,
+            "latency_ewma": round(self.latency, 3),
+            "failures": self.failures,
+            "models": sorted(self.models),
+        }
+
+
+class BackendPool:
+    """
+    Health-aware load balancer over several Ollama hosts
+
+    Requests go to an available host that already has the model loaded when
+    possible, then to the one with the fewest outstanding requests
+    (``least_outstanding``) or the lowest latency EWMA weighted by load
+    (``ewma``). Hosts are ejected after ``max_failures`` consecutive errors
+    (passive checks) and re-admitted either when the ejection expires or when
+    the periodic ``/api/ps`` probe (active check) succeeds.
+    """
+
+    def __init__(self, urls: List[str], strategy: str = "least_outstanding", max_failures: int = 3,
+                 eject_seconds: float = 30.0, check_interval: float = 10.0):
+        if not urls:
+            raise ValueError("BackendPool needs at least one backend URL")
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Unknown routing strategy '{strategy}'")
+        self.backends = [Backend(url) for url in urls]
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checking = False
+
+    def choose(self, model: Optional[str] = None, exclude: Set[str] = frozenset()) -> Backend:
+        """Pick the best available backend for ``model``, skipping URLs in ``exclude``"""
+        now = time.time()
+        with self._lock:
+            candidates = [backend for backend in self.backends
+                          if backend.available(now) and backend.url not in exclude]
+            if not candidates:
+                raise NoHealthyBackendError("No healthy Ollama backend available")
+            if model:
+                name = normalize_model(model)
+                warm = [backend for backend in candidates if name in backend.models]
+                candidates = warm or candidates
+            return min(candidates, key=self._score)
+
+    def _score(self, backend: Backend):
+        if self.strategy == "ewma":
+            return ((backend.outstanding + 1) * (backend.latency or 0.001), backend.outstanding)
+        return (backend.outstanding, backend.latency)
+
+    @contextmanager
+    def track(self, backend: Backend, model: Optional[str] = None) -> Iterator[Backend]:
+        """Account an in-flight request against ``backend`` and record its outcome"""
+        with self._lock:
+            backend.outstanding += 1
+        started = time.time()
+        try:
+            yield backend
+        except BackendUnavailable:
+            self.record_failure(backend)
+            raise
+        else:
+            self.record_success(backend, time.time() - started, model)
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def record_success(self, backend: Backend, latency: float, model: Optional[str] = None) -> None:
+        with self._lock:
+            backend.failures = 0
+            backend.ejected_until = 0.0
+            backend.latency = latency if backend.latency == 0.0 else 0.8 * backend.latency + 0.2 * latency
+            if model:
+                backend.models.add(normalize_model(model))
+
+    def record_failure(self, backend: Backend) -> None:
+        with self._lock:
+            backend.failures += 1
+            if backend.failures >= self.max_failures:
+                backend.ejected_until = time.time() + self.eject_seconds
+                logger.warning(f"Ejected Ollama backend {backend.url} for {self.eject_seconds:.0f}s")
+
+    async def check(self, http: "HttpClient", backend: Backend) -> bool:
+        """Active health check: probe ``/api/ps`` and refresh the loaded-model set"""
+        try:
+            async with http.request("ollama", "GET", f"{backend.url}/api/ps", timeout=3, retry=False) as response:
+                if response.status != 200:
+                    raise BackendUnavailable(f"status {response.status}")
+                body = await response.json(content_type=None)
+        except Exception as e:
+            logger.debug(f"Health check failed for {backend.url}: {str(e)}")
+            self.record_failure(backend)
+            return False
+
+        loaded = {normalize_model(entry.get("name") or entry.get("model", "")) for entry in body.get("models", [])}
+        with self._lock:
+            if backend.ejected_until:
+                logger.info(f"Re-admitted Ollama backend {backend.url}")
+            backend.failures = 0
+            backend.ejected_until = 0.0
+            backend.models = loaded
+            backend.last_check = time.time()
+        return True
+
+    async def run_health_checks(self, runtime) -> None:
+        """Probe every backend forever, every ``check_interval`` seconds"""
+        while True:
+            await asyncio.gather(*(self.check(runtime.http, backend) for backend in self.backends))
+            await asyncio.sleep(self.check_interval)
+
+    def ensure_health_checks(self, runtime) -> None:
+        """Start the background checker on the runtime's loop (idempotent)"""
+        with self._lock:
+            if self._checking or self.check_interval <= 0:
+                return
+            self._checking = True
+        runtime.submit(self.run_health_checks(runtime))
+
+    def after_fork(self) -> None:
+        """Health checks ran on the parent's loop; let the child start its own"""
+        self._lock = threading.Lock()
+        self._checking = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "backends": [backend.to_dict() for backend in self.backends],
+            }
+
+
+def normalize_model(name: str) -> str:
+    """``mistral`` and ``mistral:latest`` refer to the same model"""
+    return name if ":" in name or not name else f"{name}:latest"
+
+
+def backend_urls_from_env() -> List[str]:
+    hosts = os.getenv("OLLAMA_HOSTS") or os.getenv("OLLAMA_URL", "http://localhost:11434")
+    return [host.strip() for host in hosts.split(",") if host.strip()]
@@ -0,0 +1,245 @@
+# src/utils/batching.py
+import asyncio
+import json
+import os
+import time
+import logging
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from utils.aio import OllamaClient, ollama_client
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("item", "future", "enqueued_at", "batch")
+
+    def __init__(self, item: Any, future: asyncio.Future):
+        self.item = item
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+        self.batch: Optional["_Batch"] = None
+
+
+class _Batch:
+    __slots__ = ("entries", "task")
+
+    def __init__(self, entries: List[_Pending]):
+        self.entries = entries
+        self.task: Optional[asyncio.Future] = None
+
+
+class _Batcher:
+    """
+    Collect requests of the same group for ``window`` seconds (or until
+    ``max_batch`` of them are waiting) and hand them to ``_send`` together
+
+    A batch that fails fails every request in it. A caller that gives up
+    (cancelled or out of time) drops its request, or the whole call once
+    nobody in the batch is waiting for it any more.
+    """
+
+    def __init__(self, window: float, max_batch: int, size_metric, wait_metric):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.inputs = 0
+        self._size_metric = size_metric
+        self._wait_metric = wait_metric
+        self._pending: Dict[Hashable, List[_Pending]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_batch > 1
+
+    async def _submit(self, group: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        entry = _Pending(item, loop.create_future())
+        pending = self._pending.setdefault(group, [])
+        pending.append(entry)
+        if len(pending) >= self.max_batch:
+            self._flush(group)
+        elif group not in self._timers:
+            self._timers[group] = loop.call_later(self.window, self._flush, group)
+        try:
+            return await entry.future
+        except asyncio.CancelledError:
+            if entry.batch is None:
+                pending = self._pending.get(group, [])
+                if entry in pending:
+                    pending.remove(entry)
+            elif all(other.future.done() for other in entry.batch.entries):
+                entry.batch.task.cancel()
+            raise
+
+    def _flush(self, group: Hashable) -> None:
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        entries = self._pending.pop(group, [])
+        if not entries:
+            return
+        now = time.perf_counter()
+        self.batches += 1
+        self.inputs += len(entries)
+        self._size_metric.observe(len(entries))
+        batch = _Batch(entries)
+        for entry in entries:
+            self._wait_metric.observe(now - entry.enqueued_at)
+            entry.batch = batch
+        batch.task = asyncio.ensure_future(self._dispatch(group, batch))
+
+    async def _dispatch(self, group: Hashable, batch: _Batch) -> None:
+        try:
+            results = await self._send(group, [entry.item for entry in batch.entries])
+        except Exception as e:
+            for entry in batch.entries:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+        else:
+            for entry, result in zip(batch.entries, results):
+                if not entry.future.done():
+                    entry.future.set_result(result)
+
+    async def _send(self, group: Hashable, items: List[Any]) -> List[Any]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window_ms": round(self.window * 1000, 1),
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "inputs": self.inputs,
+            "mean_batch_size": round(self.inputs / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class EmbeddingBatcher(_Batcher):
+    """
+    Collect embedding requests for a few milliseconds and send them as one
+
+    Ollama's ``/api/embed`` takes a list of inputs and embeds them in a
+    single forward pass, so concurrent requests for the same model that
+    arrive within ``window`` seconds (up to ``max_batch`` of them) share one
+    HTTP request and one model call. With ``window`` 0 every request is
+    sent on its own.
+    """
+
+    def __init__(self, client: OllamaClient, window: float = 0.005, max_batch: int = 16):
+        super().__init__(window, max_batch, EMBED_BATCH_SIZE, EMBED_BATCH_WAIT)
+        self.client = client
+
+    async def embed(self, text: str, model: str, timeout: float = 10) -> List[float]:
+        """Same contract as ``OllamaClient.embed``, batched when enabled"""
+        if not self.enabled:
+            return await self.client.embed(text, model, timeout)
+        return await self._submit((model, timeout), text)
+
+    def embed_sync(self, text: str, model: str, timeout: float = 10) -> List[float]:
+        return self.client.runtime.run(self.embed(text, model, timeout))
+
+    async def _send(self, group: Tuple[str, float], texts: List[str]) -> List[List[float]]:
+        model, timeout = group
+        return await self.client.embed_many(texts, model, timeout)
+
+
+class GenerationBatcher(_Batcher):
+    """
+    Pack short prompts that arrive together into one ``/api/generate`` call
+
+    ``/api/generate`` has no multi-prompt form, so requests with the same
+    model and options that arrive within ``window`` seconds are sent as a
+    single JSON-mode prompt asking for one answer per request, with room
+    for all of their tokens. One request and one model pass replace several,
+    which pays off for one-line prompts where per-request overhead
+    dominates. When the reply is not a JSON list of the right length, each
+    prompt is sent on its own instead (counted in ``fallbacks``). Meant
+    for short, non-streamed prompts only; with ``window`` 0 it is off.
+    """
+
+    def __init__(self, client: OllamaClient, window: float = 0.0, max_batch: int = 4):
+        super().__init__(window, max_batch, GENERATE_BATCH_SIZE, GENERATE_BATCH_WAIT)
+        self.client = client
+        self.fallbacks = 0
+
+    async def generate(self, payload: Dict[str, Any], timeout: float) -> str:
+        """Same contract as ``OllamaClient.generate`` without streaming, batched when enabled"""
+        if not self.enabled:
+            return await self.client.generate(payload, timeout)
+        shared = dict(payload)
+        prompt = shared.pop("prompt")
+        return await self._submit((json.dumps(shared, sort_keys=True), timeout), prompt)
+
+    def generate_sync(self, payload: Dict[str, Any], timeout: float) -> str:
+        return self.client.runtime.run(self.generate(payload, timeout))
+
+    async def _send(self, group: Tuple[str, float], prompts: List[str]) -> List[str]:
+        shared, timeout = json.loads(group[0]), group[1]
+        if len(prompts) > 1:
+            packed = dict(shared, prompt=pack_prompts(prompts), format="json")
+            if "num_predict" in shared:
+                packed["num_predict"] = shared["num_predict"] * len(prompts)
+            answers = unpack_answers(await self.client.generate(packed, timeout), len(prompts))
+            if answers is not None:
+                return answers
+            self.fallbacks += 1
+            logger.warning(f"Batched generation of {len(prompts)} prompts was malformed, sending them one by one")
+        return list(await asyncio.gather(
+            *(self.client.generate(dict(shared, prompt=prompt), timeout) for prompt in prompts)
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), fallbacks=self.fallbacks)
+
+
+def pack_prompts(prompts: List[str]) -> str:
+    """One prompt asking for a JSON object with an answer per request, in order"""
+    requests = "\n\n".join(f"Request {n}:\n{prompt}" for n, prompt in enumerate(prompts, 1))
+    return (
+        f"Answer each of the following {len(prompts)} requests independently. Reply with only a JSON "
+        f'object {{"answers": [...]}} holding exactly {len(prompts)} strings, the answer to request n '
+        f"at position n.\n\n{requests}"
+    )
+
+
+def unpack_answers(text: str, count: int) -> Optional[List[str]]:
+    """The answers of a packed reply, or None when it is not ``count`` strings"""
+    try:
+        answers = json.loads(text).get("answers")
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(answers, list) or len(answers) != count or not all(isinstance(a, str) for a in answers):
+        return None
+    return answers
+
+
+EMBED_BATCH_SIZE = metrics.histogram(
+    "groot_embed_batch_size", "Inputs sent per /api/embed request", buckets=(1, 2, 4, 8, 16, 32)
+)
+EMBED_BATCH_WAIT = metrics.histogram(
+    "groot_embed_batch_wait_seconds", "Time an embedding request waited for its batch to fill",
+    buckets=(0.001, 0.002, 0.005, 0.01, 0.02, 0.05)
+)
+GENERATE_BATCH_SIZE = metrics.histogram(
+    "groot_generate_batch_size", "Prompts packed into one /api/generate request", buckets=(1, 2, 3, 4, 6, 8)
+)
+GENERATE_BATCH_WAIT = metrics.histogram(
+    "groot_generate_batch_wait_seconds", "Time a generation waited for its batch to fill",
+    buckets=(0.001, 0.002, 0.005, 0.01, 0.02, 0.05)
+)
+
+# Global instances; EMBED_BATCH_WINDOW_MS=0 disables embedding batching,
+# generation batching is off unless LLM_BATCH_WINDOW_MS is set
+embed_batcher = EmbeddingBatcher(
+    ollama_client,
+    window=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")) / 1000,
+    max_batch=int(os.getenv("EMBED_BATCH_MAX", "16"))
+)
+generate_batcher = GenerationBatcher(
+    ollama_client,
+    window=float(os.getenv("LLM_BATCH_WINDOW_MS", "0")) / 1000,
+    max_batch=int(os.getenv("LLM_BATCH_MAX", "4"))
+)
@@ -0,0 +1,241 @@
+# src/utils/cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache for LLM responses
+
+    Entries live in a bounded in-memory ``OrderedDict`` (by entry count and
+    total characters). When ``db_path`` is set, every entry is also written to
+    a small SQLite table so hits survive restarts; a memory miss falls back to
+    the table and promotes the row back into memory. The table is opened on
+    first use, not at import. ``max_db_chars`` bounds the table as well: a
+    running total of its size is kept, and the oldest rows are dropped only
+    once it goes over the limit.
+    """
+
+    def __init__(self, max_entries: int = 512, max_chars: int = 8_000_000,
+                 ttl: float = 3600.0, db_path: Optional[str] = None,
+                 table: str = "response_cache", max_db_chars: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.db_path = db_path
+        self.table = table
+        self.max_db_chars = max_db_chars
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        self._db_chars = 0
+        self._db_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float, num_predict: int,
+                 options: Optional[Dict[str, Any]] = None) -> str:
+        """Build a stable cache key from everything that affects the generation"""
+        material = json.dumps(
+            [model, prompt, temperature, num_predict, options or {}],
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key`` or ``None``"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+                self.evictions += 1
+
+            value = self._db_get(key, now)
+            if value is None:
+                self.misses += 1
+                return None
+            self._store(key, value[0], value[1])
+            self.hits += 1
+            return value[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response, evicting least recently used entries as needed"""
+        if not value or len(value) > self.max_chars:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+            self._db_set(key, value, expires_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+            db = self._connect()
+            if db is not None:
+                db.execute(f"DELETE FROM {self.table}")
+                db.commit()
+                self._db_chars = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": bool(self.db_path) and not self._db_failed,
+            }
+
+    def _store(self, key: str, value: str, expires_at: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at)
+        self._chars += len(value)
+        while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._chars -= len(value)
+
+    def after_fork(self) -> None:
+        """SQLite connections must not cross a fork; the child reopens the table on first use"""
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """The table's connection, opened on first use (called with the lock held)"""
+        if self._db is not None or not self.db_path or self._db_failed:
+            return self._db
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{self.table}_expires_at ON {self.table} (expires_at)"
+            )
+            self._prune_db()
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache persistence disabled: {str(e)}")
+            self._db = None
+            self._db_failed = True
+        return self._db
+
+    def _db_get(self, key: str, now: float) -> Optional[tuple]:
+        db = self._connect()
+        if db is None:
+            return None
+        try:
+            return db.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            return None
+
+    def _db_set(self, key: str, value: str, expires_at: float) -> None:
+        db = self._connect()
+        if db is None:
+            return
+        try:
+            if self.max_db_chars is not None:
+                replaced = db.execute(f"SELECT LENGTH(value) FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                self._db_chars += len(value) - (replaced[0] if replaced else 0)
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._db_writes += 1
+            if self._db_writes % 100 == 0 or (self.max_db_chars is not None and self._db_chars > self.max_db_chars):
+                self._prune_db()
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+    def _prune_db(self) -> None:
+        """Drop expired rows, then the oldest rows beyond ``max_db_chars``"""
+        self._db.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+        if self.max_db_chars is None:
+            return
+        # Every row is written with the same TTL, so expires_at orders rows by age
+        pruned = self._db.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER (ORDER BY expires_at DESC) AS total "
+            f"FROM {self.table}) WHERE total > ?)",
+            (self.max_db_chars,)
+        ).rowcount
+        self.evictions += max(pruned, 0)
+        self._db_chars = self._db.execute(f"SELECT COALESCE(SUM(LENGTH(value)), 0) FROM {self.table}").fetchone()[0]
+
+
+# Global instance; set LLM_CACHE_DB to keep responses across restarts
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    db_path=os.getenv("LLM_CACHE_DB") or None
+)
+
+# Puter file analyses keyed by content hash + task; kept on disk unless PUTER_CACHE_DB is empty
+analysis_cache = ResponseCache(
+    max_entries=int(os.getenv("PUTER_CACHE_SIZE", "256")),
+    max_chars=int(float(os.getenv("PUTER_CACHE_MAX_MB", "16")) * 1024 * 1024),
+    ttl=float(os.getenv("PUTER_CACHE_TTL", "604800")),
+    db_path=os.getenv(
+        "PUTER_CACHE_DB",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "puter_cache.db")
+    ) or None,
+    table="analysis_cache",
+    max_db_chars=int(float(os.getenv("PUTER_CACHE_DB_MAX_MB", "128")) * 1024 * 1024)
+)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=response_cache.after_fork)
+    os.register_at_fork(after_in_child=analysis_cache.after_fork)
+
+
+# Caches reported on /metrics by name; other cache modules add themselves
+CACHES = {"llm": response_cache, "puter": analysis_cache}
+
+
+def _cache_stat(field: str):
+    return lambda: {(name,): cache.stats()[field] for name, cache in list(CACHES.items())}
+
+
+metrics.callback("groot_cache_hits", "Cache lookups that found a fresh entry", _cache_stat("hits"), ("cache",), "counter")
+metrics.callback("groot_cache_misses", "Cache lookups that found nothing", _cache_stat("misses"), ("cache",), "counter")
+metrics.callback("groot_cache_evictions", "Entries dropped for space", _cache_stat("evictions"), ("cache",), "counter")
+metrics.callback("groot_cache_entries", "Entries held in memory", _cache_stat("entries"), ("cache",))
@@ -0,0 +1,94 @@
+# src/utils/circuit.py
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for one backend
+
+    ``failure_threshold`` consecutive failures open the circuit and calls fail
+    fast for ``reset_timeout`` seconds. After that a single trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    Outcomes come from real requests as well as background health probes.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the trial slot when half-open)"""
+        now = time.time()
+        with self._lock:
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_started = 0.0
+            if self.state == CLOSED:
+                return True
+            # A trial whose outcome was never reported is given up after reset_timeout
+            if self.state == HALF_OPEN and now - self._trial_started >= self.reset_timeout:
+                self._trial_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being refused (does not claim the trial slot)"""
+        with self._lock:
+            return self.state == OPEN and time.time() - self.opened_at < self.reset_timeout
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.time()
+                self.trips += 1
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "retry_in": round(max(0.0, self.opened_at + self.reset_timeout - time.time()), 1)
+                if self.state == OPEN else 0.0,
+            }
+
+
+def breaker_from_env(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3")),
+        reset_timeout=float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    )
@@ -0,0 +1,228 @@
+# src/utils/deadline.py
+import contextvars
+import os
+import threading
+import time
+import logging
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Interrupted(Exception):
+    """Raised inside a task once it was cancelled or ran out of time"""
+
+
+class TaskCancelled(Interrupted):
+    """Raised when a client cancelled the task"""
+
+
+class DeadlineExceeded(Interrupted):
+    """Raised when the task's deadline passed"""
+
+
+class Deadline:
+    """
+    End-to-end time budget and cancellation signal of one task
+
+    The deadline is made current with ``deadline_scope`` and every blocking
+    call below it asks for what is left instead of using its own timeout:
+    ``AsyncRuntime.run`` waits at most ``remaining()`` for a coroutine and
+    cancels it when the deadline passes or ``cancel`` is called, which
+    aborts the in-flight HTTP request. Callbacks registered with ``watch``
+    run on cancellation, so threads waiting elsewhere can wake up.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, expires_at: Optional[float] = None):
+        self.seconds = seconds
+        if expires_at is None and seconds:
+            expires_at = time.monotonic() + seconds
+        self.expires_at = expires_at  # time.monotonic() value
+        self.reason: Optional[str] = None  # "cancelled" or "expired" once interrupted
+        self._callbacks: Dict[int, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or ``None`` without a time limit"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, default: Optional[float]) -> Optional[float]:
+        """``default`` shortened to the time left"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return remaining if default is None else min(default, remaining)
+
+    def check(self) -> None:
+        """
+        Raises:
+            TaskCancelled: If the task was cancelled
+            DeadlineExceeded: If the deadline passed
+        """
+        if self.reason is None and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self._interrupt("expired")
+        if self.reason == "cancelled":
+            raise TaskCancelled("Task was cancelled")
+        if self.reason == "expired":
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded")
+
+    def cancel(self) -> bool:
+        """Interrupt everything running under this deadline; False if it already ended"""
+        return self._interrupt("cancelled")
+
+    def extend_to(self, other: Optional["Deadline"]) -> None:
+        """Push the expiry out to ``other``'s if that is later (``None`` lifts the limit)"""
+        with self._lock:
+            if self.reason is not None or self.expires_at is None:
+                return
+            if other is None or other.expires_at is None:
+                self.seconds, self.expires_at = None, None
+            elif other.expires_at > self.expires_at:
+                self.seconds, self.expires_at = other.seconds, other.expires_at
+
+    @contextmanager
+    def watch(self, callback: Callable[[], Any]) -> Iterator[None]:
+        """Call ``callback`` if the deadline is interrupted while the block runs"""
+        key = id(callback)
+        with self._lock:
+            interrupted = self.reason is not None
+            if not interrupted:
+                self._callbacks[key] = callback
+        if interrupted:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.pop(key, None)
+
+    def wait(self, future: Future, timeout: Optional[float] = None) -> Any:
+        """
+        Result of ``future``, cancelling it when the deadline passes or the task is cancelled
+
+        Raises:
+            TaskCancelled: If the task was cancelled
+            DeadlineExceeded: If the deadline passed first
+        """
+        limit = time.monotonic() + timeout if timeout is not None else None
+        with self.watch(future.cancel):
+            while True:
+                try:
+                    return future.result(self.timeout(None if limit is None else max(0.0, limit - time.monotonic())))
+                except FutureTimeoutError:
+                    if limit is not None and time.monotonic() >= limit:
+                        raise
+                    remaining = self.remaining()
+                    if remaining is not None and remaining <= 0:
+                        future.cancel()
+                        self.check()
+                        raise
+                    # The deadline was extended while waiting
+                except CancelledError:
+                    self.check()
+                    raise
+
+    def _interrupt(self, reason: str) -> bool:
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            callbacks, self._callbacks = list(self._callbacks.values()), {}
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancellation callback failed: {str(e)}")
+        return True
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the task running in this context, if any"""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """
+    Make ``deadline`` current for the block
+
+    Threads started from pools do not inherit it; submit work there with
+    ``contextvars.copy_context().run`` to carry it along.
+    """
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+class TaskDeadlines:
+    """Deadlines of this process's queued and running tasks, by task id"""
+
+    def __init__(self, default_seconds: float = 300.0):
+        self.default_seconds = default_seconds
+        self._deadlines: Dict[str, Deadline] = {}
+        self._lock = threading.Lock()
+        self.cancelled = 0
+        self.expired = 0
+
+    def open(self, task_id: str, seconds: Optional[float] = None) -> Deadline:
+        """Start the clock for a task; ``seconds`` defaults to ``default_seconds``"""
+        deadline = Deadline(seconds or self.default_seconds)
+        with self._lock:
+            self._deadlines[task_id] = deadline
+        return deadline
+
+    def get(self, task_id: str) -> Optional[Deadline]:
+        with self._lock:
+            return self._deadlines.get(task_id)
+
+    def cancel(self, task_id: str) -> bool:
+        """Cancel a task of this process; False if it is not queued or running here"""
+        deadline = self.get(task_id)
+        return deadline is not None and deadline.cancel()
+
+    def close(self, task_id: str) -> Optional[str]:
+        """Forget a finished task; returns ``cancelled``/``expired`` if it was interrupted"""
+        with self._lock:
+            deadline = self._deadlines.pop(task_id, None)
+            if deadline is None or deadline.reason is None:
+                return None
+            if deadline.reason == "cancelled":
+                self.cancelled += 1
+            else:
+                self.expired += 1
+            return deadline.reason
+
+    def after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._deadlines = {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "default_seconds": self.default_seconds,
+                "active": len(self._deadlines),
+                "cancelled": self.cancelled,
+                "expired": self.expired,
+            }
+
+
+# Global instance
+task_deadlines = TaskDeadlines(default_seconds=float(os.getenv("GROOT_TASK_TIMEOUT", "300")))
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=task_deadlines.after_fork)
+metrics.callback(
+    "groot_tasks_interrupted", "Tasks cancelled by a client or stopped at their deadline",
+    lambda: {("cancelled",): task_deadlines.cancelled, ("expired",): task_deadlines.expired},
+    ("reason",), kind="counter"
+)
@@ -0,0 +1,330 @@
+# src/utils/events.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.stream import format_sse
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ("agent", "task", "activity")
+
+
+class _Event:
+    __slots__ = ("seq", "id", "channel", "key", "data")
+
+    def __init__(self, seq: int, id: int, channel: str, key: Optional[str], data: Dict[str, Any]):
+        self.seq = seq          # position in this process's log
+        self.id = id            # SSE id, the relay's row id when there is one
+        self.channel = channel
+        self.key = key
+        self.data = data
+
+
+class EventBus:
+    """
+    Multiplexed change feed for dashboards
+
+    Publishers append deltas to one bounded ring of events; every
+    Server-Sent Events client reads it through its own cursor, so an open
+    dashboard costs no per-client buffering and no re-serialized lists, and
+    a wake-up only touches the events the client has not seen yet.
+    Backpressure is handled per client: a reader that falls more than
+    ``coalesce_after`` events behind gets the latest delta per agent/task
+    instead of every intermediate one, and a reader that falls off the end
+    of the log (or resumes from an id that is no longer there) receives a
+    ``reset`` with a fresh snapshot. With a ``relay`` the log carries the
+    events of every worker process of the server, in the relay's order and
+    with its ids, so ``Last-Event-ID`` means the same on every worker.
+    """
+
+    def __init__(self, backlog: int = 2048, coalesce_after: int = 64, relay: Optional["EventRelay"] = None):
+        self.backlog = max(1, backlog)
+        self.coalesce_after = coalesce_after
+        self.relay = relay
+        self._ring: List[Optional[_Event]] = [None] * self.backlog
+        self._seq = 0       # events appended by this process; ring slot is seq % backlog
+        self._last_id = 0   # SSE id of the newest event
+        self._cond = threading.Condition()
+        self.published = 0
+        self.coalesced = 0
+        self.resets = 0
+        self.clients = 0
+
+    def publish(self, channel: str, data: Dict[str, Any], key: Optional[str] = None) -> None:
+        """
+        Append a delta; events with the same ``channel`` and ``key`` may be coalesced
+
+        With a relay the event is appended once the relay has given it its id.
+        """
+        if self.relay is not None:
+            self.relay.send(self, channel, data, key)
+        else:
+            self._append(channel, data, key)
+
+    def _append(self, channel: str, data: Dict[str, Any], key: Optional[str], event_id: Optional[int] = None) -> None:
+        with self._cond:
+            self._seq += 1
+            self._last_id = event_id if event_id is not None else self._seq
+            self._ring[self._seq % self.backlog] = _Event(self._seq, self._last_id, channel, key, data)
+            self.published += 1
+            self._cond.notify_all()
+
+    def _resume_at(self, event_id: int) -> None:
+        """Continue numbering after ``event_id`` (the relay's newest row when it starts)"""
+        with self._cond:
+            if self._seq == 0:
+                self._last_id = event_id
+
+    @property
+    def last_event_id(self) -> int:
+        with self._cond:
+            return self._last_id
+
+    def iter_events(self, last_event_id: Optional[int] = None, channels: Iterable[str] = CHANNELS,
+                    snapshot: Optional[Callable[[], Dict[str, Any]]] = None,
+                    heartbeat: float = 15.0) -> Iterator[str]:
+        """
+        Yield SSE frames for one client
+
+        Args:
+            last_event_id: Resume after this event; ``None`` starts with a snapshot
+            channels: Channels the client wants
+            snapshot: Builds the full state sent on connect and on reset
+            heartbeat: Seconds of silence before a keep-alive comment is sent
+        """
+        channels = frozenset(channels)
+        if self.relay is not None:
+            self.relay.start(self, wait=True)
+        with self._cond:
+            self.clients += 1
+            cursor = self._cursor_after(last_event_id) if last_event_id is not None else None
+            resumable = cursor is not None
+            if not resumable:
+                cursor, snapshot_id = self._seq, self._last_id
+                if last_event_id is not None:
+                    self.resets += 1
+        try:
+            if not resumable:
+                yield format_sse(snapshot() if snapshot else {}, event="snapshot", event_id=snapshot_id)
+            while True:
+                with self._cond:
+                    if self._seq <= cursor:
+                        self._cond.wait_for(lambda: self._seq > cursor, heartbeat)
+                    if cursor < self._oldest() - 1:
+                        events = None
+                        cursor, snapshot_id = self._seq, self._last_id
+                        self.resets += 1
+                    else:
+                        events = [self._ring[seq % self.backlog] for seq in range(cursor + 1, self._seq + 1)]
+                if events is None:
+                    # Fell behind the retained log: start over from a fresh snapshot
+                    yield format_sse(snapshot() if snapshot else {}, event="reset", event_id=snapshot_id)
+                    continue
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                cursor = events[-1].seq
+                if len(events) > self.coalesce_after:
+                    events = self._coalesce(events)
+                for event in events:
+                    if event.channel in channels:
+                        yield format_sse(event.data, event=event.channel, event_id=event.id)
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    def _oldest(self) -> int:
+        """Position of the oldest event still in the ring"""
+        return max(1, self._seq - self.backlog + 1)
+
+    def _cursor_after(self, event_id: int) -> Optional[int]:
+        """Position of the last event with an id up to ``event_id``; None if later ones are gone"""
+        if event_id < 0 or event_id > self._last_id:
+            return None
+        if self._seq == 0:
+            return 0 if event_id == self._last_id else None
+        low, high = self._oldest(), self._seq
+        if event_id < self._ring[low % self.backlog].id - 1:
+            return None
+        # Ids only grow, so binary search for the last one <= event_id (low - 1 if none)
+        position = low - 1
+        while low <= high:
+            middle = (low + high) // 2
+            if self._ring[middle % self.backlog].id <= event_id:
+                position, low = middle, middle + 1
+            else:
+                high = middle - 1
+        return position
+
+    def _coalesce(self, events: List[_Event]) -> List[_Event]:
+        """Keep the last event per keyed entity, merging the fields of the ones it replaces"""
+        positions: Dict[tuple, int] = {}
+        out: List[Optional[_Event]] = []
+        for event in events:
+            if event.key is None:
+                out.append(event)
+                continue
+            entity = (event.channel, event.key)
+            index = positions.get(entity)
+            if index is not None:
+                previous, out[index] = out[index], None
+                event = _Event(event.seq, event.id, event.channel, event.key, dict(previous.data, **event.data))
+            positions[entity] = len(out)
+            out.append(event)
+        result = [event for event in out if event is not None]
+        with self._cond:
+            self.coalesced += len(events) - len(result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                "clients": self.clients,
+                "last_event_id": self._last_id,
+                "published": self.published,
+                "coalesced": self.coalesced,
+                "resets": self.resets,
+            }
+        if self.relay is not None:
+            stats["relay"] = self.relay.stats()
+        return stats
+
+
+class EventRelay:
+    """
+    Carries events between the worker processes of a multi-worker server
+
+    Every process appends the events it publishes to a table in a shared
+    SQLite file and tails all rows, its own included, into its ``EventBus``
+    with the row id as the event id. Every worker's log therefore holds the
+    same events in the same order under the same ids, and a dashboard that
+    reconnects to another worker resumes at the right place. Both happen on
+    one background thread, woken by a publish and otherwise every
+    ``interval`` seconds, started by the first publish or subscriber. Rows
+    older than ``retention`` seconds are pruned; events that cannot be
+    written are retried, keeping at most ``max_outbox``.
+    """
+
+    def __init__(self, path: str, interval: float = 0.25, retention: float = 600.0, max_outbox: int = 2048):
+        self.path = path
+        self.interval = interval
+        self.retention = retention
+        self.max_outbox = max_outbox
+        self.relayed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.after_fork()
+
+    def after_fork(self) -> None:
+        """A forked child is a new origin with its own connection and thread"""
+        self.origin = uuid.uuid4().hex
+        self._outbox: List[tuple] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_id: Optional[int] = None
+
+    def send(self, bus: EventBus, channel: str, data: Dict[str, Any], key: Optional[str]) -> None:
+        with self._lock:
+            self._outbox.append((channel, key, data))
+            if len(self._outbox) > self.max_outbox:
+                del self._outbox[0]
+                self.dropped += 1
+        self.start(bus)
+        self._wake.set()
+
+    def start(self, bus: EventBus, wait: bool = False) -> None:
+        """Start the relay thread; with ``wait``, give it a moment to learn the newest row id"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(bus,), name="event-relay", daemon=True)
+                self._thread.start()
+        if wait:
+            self._ready.wait(1.0)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "origin TEXT NOT NULL, created REAL NOT NULL, channel TEXT NOT NULL, key TEXT, data TEXT NOT NULL)"
+            )
+        return self._db
+
+    def _run(self, bus: EventBus) -> None:
+        writes = 0
+        while True:
+            self._wake.clear()
+            outbox = []
+            try:
+                db = self._connect()
+                if self._last_id is None:
+                    # Only events published from now on are relayed
+                    self._last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+                    bus._resume_at(self._last_id)
+                    self._ready.set()
+                with self._lock:
+                    outbox, self._outbox = self._outbox, []
+                now = time.time()
+                if outbox:
+                    db.executemany(
+                        "INSERT INTO events (origin, created, channel, key, data) VALUES (?, ?, ?, ?, ?)",
+                        [(self.origin, now, channel, key, json.dumps(data)) for channel, key, data in outbox]
+                    )
+                    outbox = []
+                    writes += 1
+                    if writes % 100 == 0:
+                        db.execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+                rows = db.execute(
+                    "SELECT id, origin, channel, key, data FROM events WHERE id > ? ORDER BY id", (self._last_id,)
+                ).fetchall()
+                for row_id, origin, channel, key, data in rows:
+                    self._last_id = row_id
+                    bus._append(channel, json.loads(data), key, event_id=row_id)
+                    if origin != self.origin:
+                        self.relayed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Event relay failed: {str(e)}")
+                if outbox:
+                    # Not written: try again next round, oldest first
+                    with self._lock:
+                        self._outbox[:0] = outbox
+                        overflow = len(self._outbox) - self.max_outbox
+                        if overflow > 0:
+                            del self._outbox[:overflow]
+                            self.dropped += overflow
+            self._wake.wait(self.interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {"relayed": self.relayed, "dropped": self.dropped, "errors": self.errors}
+
+
+def _relay_from_env() -> Optional[EventRelay]:
+    path = os.getenv("EVENTS_DB")
+    if path is None and int(os.getenv("GROOT_WORKERS", "1")) > 1:
+        # Every worker only sees its own changes otherwise
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "events.db")
+    return EventRelay(path) if path else None
+
+
+# Global instance
+event_bus = EventBus(
+    backlog=int(os.getenv("EVENTS_BACKLOG", "2048")),
+    coalesce_after=int(os.getenv("EVENTS_COALESCE_AFTER", "64")),
+    relay=_relay_from_env()
+)
+if event_bus.relay is not None and hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=event_bus.relay.after_fork)
@@ -0,0 +1,141 @@
+# src/utils/health.py
+import asyncio
+import os
+import threading
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.aio import AsyncRuntime, runtime, ollama_client
+from utils.circuit import CircuitBreaker
+from utils.puter import puter_ai
+
+logger = logging.getLogger(__name__)
+
+
+class _Probe:
+    __slots__ = ("check", "breaker", "healthy", "detail", "checked_at", "latency")
+
+    def __init__(self, check, breaker: CircuitBreaker):
+        self.check = check
+        self.breaker = breaker
+        self.healthy: Optional[bool] = None
+        self.detail: Any = None
+        self.checked_at = 0.0
+        self.latency = 0.0
+
+
+class HealthMonitor:
+    """
+    Background availability checks with cached results
+
+    Every registered backend is probed on the runtime's loop every
+    ``interval`` seconds and the outcome is fed to its circuit breaker.
+    Request handlers only read the cached status, so they never wait on a
+    health probe; a status older than ``ttl`` counts as unknown and the
+    breaker alone decides.
+    """
+
+    def __init__(self, runtime: AsyncRuntime, interval: float = 5.0, ttl: float = 15.0, timeout: float = 3.0):
+        self.runtime = runtime
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self._probes: Dict[str, _Probe] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def register(self, name: str, check: Callable[[], Awaitable[Any]], breaker: CircuitBreaker) -> None:
+        """
+        Add a backend; ``check`` returns ``(healthy, detail)`` and may raise
+        (counted as unhealthy with detail ``"unreachable"``)
+        """
+        self._probes[name] = _Probe(check, breaker)
+
+    def available(self, name: str) -> bool:
+        """False when the last fresh probe failed or the circuit is open"""
+        self.ensure_started()
+        probe = self._probes[name]
+        with self._lock:
+            fresh = time.time() - probe.checked_at <= self.ttl
+            if fresh and probe.healthy is False:
+                return False
+        return not probe.breaker.is_open
+
+    def status(self, name: str) -> Dict[str, Any]:
+        """Cached status of one backend"""
+        self.ensure_started()
+        probe = self._probes[name]
+        with self._lock:
+            age = time.time() - probe.checked_at if probe.checked_at else None
+            return {
+                "healthy": probe.healthy if age is not None and age <= self.ttl else None,
+                "detail": probe.detail,
+                "age": round(age, 1) if age is not None else None,
+                "latency": round(probe.latency, 3),
+                "circuit": probe.breaker.to_dict(),
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: self.status(name) for name in self._probes}
+
+    async def probe(self, name: str) -> None:
+        """Run one check for ``name`` and record the result"""
+        probe = self._probes[name]
+        started = time.time()
+        try:
+            healthy, detail = await asyncio.wait_for(probe.check(), self.timeout)
+        except Exception as e:
+            logger.debug(f"Health check failed for {name}: {str(e)}")
+            healthy, detail = False, "unreachable"
+        if healthy:
+            probe.breaker.record_success()
+        else:
+            probe.breaker.record_failure()
+        with self._lock:
+            probe.healthy = bool(healthy)
+            probe.detail = detail
+            probe.checked_at = time.time()
+            probe.latency = probe.checked_at - started
+
+    async def run(self) -> None:
+        """Probe every backend forever, every ``interval`` seconds"""
+        while True:
+            await asyncio.gather(*(self.probe(name) for name in list(self._probes)))
+            await asyncio.sleep(self.interval)
+
+    def after_fork(self) -> None:
+        """Probes ran on the parent's loop; let the child start its own"""
+        self._lock = threading.Lock()
+        self._started = False
+
+    def ensure_started(self) -> None:
+        """Start the background checker on the runtime's loop (idempotent)"""
+        with self._lock:
+            if self._started or self.interval <= 0:
+                return
+            self._started = True
+        self.runtime.submit(self.run())
+
+
+async def _check_ollama():
+    status = await ollama_client.ping()
+    return status == 200, status
+
+
+async def _check_puter():
+    available = await puter_ai.is_available_async()
+    return available, "online" if available else "offline"
+
+
+# Global instance
+health_monitor = HealthMonitor(
+    runtime,
+    interval=float(os.getenv("HEALTH_CHECK_INTERVAL", "5")),
+    ttl=float(os.getenv("HEALTH_CACHE_TTL", "15")),
+    timeout=float(os.getenv("HEALTH_CHECK_TIMEOUT", "3"))
+)
+health_monitor.register("ollama", _check_ollama, ollama_client.breaker)
+health_monitor.register("puter", _check_puter, puter_ai.breaker)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=health_monitor.after_fork)
@@ -0,0 +1,302 @@
+# src/utils/http_client.py
+import asyncio
+import os
+import random
+import threading
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+RETRY_STATUSES = frozenset((502, 503, 504))
+
+
+class HostPolicy:
+    """Connection, timeout and retry settings for one upstream service"""
+
+    __slots__ = ("name", "max_connections", "max_per_host", "keepalive", "connect_timeout",
+                 "timeout", "max_retries", "retry_backoff")
+
+    def __init__(self, name: str, max_connections: int = 200, max_per_host: int = 50,
+                 keepalive: float = 30.0, connect_timeout: float = 5.0, timeout: float = 300.0,
+                 max_retries: int = 1, retry_backoff: float = 0.1):
+        self.name = name
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests
+
+    Within a sliding ``window`` of seconds, retries may add at most
+    ``ratio`` of the requests sent plus ``min_per_second`` per second. When
+    an upstream goes down, every request fails and wants a retry; the
+    budget runs dry quickly, so retries cannot multiply the load on a
+    struggling service.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, window: int = 10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = max(1, int(window))
+        self._buckets: Dict[int, list] = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.denied = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._bucket()[0] += 1
+
+    def try_spend(self) -> bool:
+        """Claim one retry; False once the budget for the window is used up"""
+        with self._lock:
+            bucket = self._bucket()
+            requests = sum(counts[0] for counts in self._buckets.values())
+            retries = sum(counts[1] for counts in self._buckets.values())
+            if retries + 1 > self.ratio * requests + self.min_per_second * self.window:
+                self.denied += 1
+                return False
+            bucket[1] += 1
+            self.allowed += 1
+            return True
+
+    def _bucket(self) -> list:
+        now = int(time.monotonic())
+        bucket = self._buckets.get(now)
+        if bucket is None:
+            for second in [second for second in self._buckets if second <= now - self.window]:
+                del self._buckets[second]
+            bucket = self._buckets[now] = [0, 0]
+        return bucket
+
+    def after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"retries": self.allowed, "denied": self.denied}
+
+
+class _Upstream:
+    """A policy with its own pooled session, retry budget and connection counts"""
+
+    def __init__(self, policy: HostPolicy, budget: RetryBudget):
+        self.policy = policy
+        self.budget = budget
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self.new_connections = 0
+        self.reused_connections = 0
+
+
+class HttpClient:
+    """
+    Pooled HTTP(S) client shared by every outbound call
+
+    Each upstream (``ollama``, ``puter``, ...) gets its own connection pool
+    on the shared event loop with its policy's per-host cap and keep-alive
+    time, so a slow upstream cannot take all connections and HTTPS
+    connections to Puter are kept open between calls instead of repeating
+    the TLS handshake. Requests that fail before anything was sent, and
+    idempotent ones that hit a dropped connection or a 502/503/504, are
+    retried with backoff while the upstream's retry budget allows.
+    New and reused connections are counted per upstream.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, HostPolicy]] = None,
+                 default: Optional[HostPolicy] = None,
+                 retry_ratio: float = 0.2, retry_min_per_second: float = 1.0):
+        self.default = default or HostPolicy("default")
+        self.retry_ratio = retry_ratio
+        self.retry_min_per_second = retry_min_per_second
+        self._upstreams: Dict[str, _Upstream] = {}
+        self._lock = threading.Lock()
+        for policy in (policies or {}).values():
+            self._add(policy)
+
+    def _add(self, policy: HostPolicy) -> _Upstream:
+        upstream = _Upstream(policy, RetryBudget(self.retry_ratio, self.retry_min_per_second))
+        self._upstreams[policy.name] = upstream
+        return upstream
+
+    def _upstream(self, name: str) -> _Upstream:
+        upstream = self._upstreams.get(name)
+        if upstream is None:
+            with self._lock:
+                upstream = self._upstreams.get(name)
+                if upstream is None:
+                    default = self.default
+                    upstream = self._add(HostPolicy(name, **{
+                        key: value for key, value in default.to_dict().items() if key != "name"
+                    }))
+        return upstream
+
+    def policy(self, name: str) -> HostPolicy:
+        return self._upstream(name).policy
+
+    def budget(self, name: str) -> RetryBudget:
+        """The upstream's retry budget, also drawn from by callers that fail over themselves"""
+        return self._upstream(name).budget
+
+    def timeout(self, name: str, total: Optional[float] = None) -> "aiohttp.ClientTimeout":
+        """The upstream's timeouts, with ``total`` overriding its default total time"""
+        import aiohttp
+
+        policy = self.policy(name)
+        return aiohttp.ClientTimeout(total=total if total is not None else policy.timeout,
+                                     sock_connect=policy.connect_timeout)
+
+    async def session(self, name: str) -> "aiohttp.ClientSession":
+        """The upstream's pooled session (must be awaited on the loop)"""
+        upstream = self._upstream(name)
+        if upstream.session is None or upstream.session.closed:
+            import aiohttp
+
+            policy = upstream.policy
+            connector = aiohttp.TCPConnector(
+                limit=policy.max_connections,
+                limit_per_host=policy.max_per_host,
+                keepalive_timeout=policy.keepalive,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True
+            )
+            upstream.session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[self._trace(upstream)]
+            )
+        return upstream.session
+
+    @asynccontextmanager
+    async def request(self, name: str, method: str, url: str, timeout: Optional[float] = None,
+                      retry: bool = True, **kwargs: Any) -> AsyncIterator["aiohttp.ClientResponse"]:
+        """
+        Send a request to upstream ``name`` and yield the response
+
+        Args:
+            name: Upstream whose pool, timeouts and retry budget are used
+            method: HTTP method
+            url: Absolute URL
+            timeout: Total seconds, overriding the policy's default
+            retry: False for bodies that cannot be sent twice (streams)
+            **kwargs: Passed to ``aiohttp.ClientSession.request``
+        """
+        import aiohttp
+
+        upstream = self._upstream(name)
+        policy = upstream.policy
+        session = await self.session(name)
+        client_timeout = self.timeout(name, timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        upstream.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = await session.request(method, url, timeout=client_timeout, **kwargs)
+            except (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError) as e:
+                # Refused connections never reached the server; dropped ones only matter for writes
+                sent = isinstance(e, aiohttp.ServerDisconnectedError) and not idempotent
+                if sent or not self._may_retry(upstream, retry, attempt):
+                    raise
+                logger.debug(f"Retrying {method} {url} after {type(e).__name__}")
+            else:
+                if not (idempotent and response.status in RETRY_STATUSES
+                        and self._may_retry(upstream, retry, attempt)):
+                    async with response:
+                        yield response
+                    return
+                response.release()
+                logger.debug(f"Retrying {method} {url} after status {response.status}")
+            attempt += 1
+            await asyncio.sleep(policy.retry_backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+    def _may_retry(self, upstream: _Upstream, retry: bool, attempt: int) -> bool:
+        return retry and attempt < upstream.policy.max_retries and upstream.budget.try_spend()
+
+    @staticmethod
+    def _trace(upstream: _Upstream) -> "aiohttp.TraceConfig":
+        import aiohttp
+
+        async def on_create(session, context, params):
+            upstream.new_connections += 1
+
+        async def on_reuse(session, context, params):
+            upstream.reused_connections += 1
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+
+    async def close(self) -> None:
+        for upstream in list(self._upstreams.values()):
+            if upstream.session is not None and not upstream.session.closed:
+                await upstream.session.close()
+            upstream.session = None
+
+    def after_fork(self) -> None:
+        """Sessions belong to the parent's loop; the child opens its own on first use"""
+        self._lock = threading.Lock()
+        for upstream in self._upstreams.values():
+            upstream.session = None
+            upstream.budget.after_fork()
+
+    def stats(self) -> Dict[str, Any]:
+        result = {}
+        for name, upstream in list(self._upstreams.items()):
+            opened, reused = upstream.new_connections, upstream.reused_connections
+            result[name] = dict(
+                upstream.budget.stats(),
+                new_connections=opened,
+                reused_connections=reused,
+                reuse_ratio=round(reused / (opened + reused), 3) if opened + reused else None,
+            )
+        return result
+
+
+def policy_from_env(name: str, **defaults: Any) -> HostPolicy:
+    """``HostPolicy`` for ``name`` from ``HTTP_<NAME>_*`` variables, falling back to the shared ``HTTP_*`` ones"""
+    prefix = f"HTTP_{name.upper()}_"
+
+    def setting(key: str, cast, fallback):
+        value = os.getenv(prefix + key) or os.getenv("HTTP_" + key)
+        return cast(value) if value else fallback
+
+    policy = HostPolicy(name, **defaults)
+    return HostPolicy(
+        name,
+        max_connections=setting("MAX_CONNECTIONS", int, policy.max_connections),
+        max_per_host=setting("MAX_PER_HOST", int, policy.max_per_host),
+        keepalive=setting("KEEPALIVE", float, policy.keepalive),
+        connect_timeout=setting("CONNECT_TIMEOUT", float, policy.connect_timeout),
+        timeout=setting("TIMEOUT", float, policy.timeout),
+        max_retries=setting("RETRIES", int, policy.max_retries),
+        retry_backoff=policy.retry_backoff
+    )
+
+
+def client_from_env() -> HttpClient:
+    return HttpClient(
+        {
+            "ollama": policy_from_env("ollama", keepalive=60.0, connect_timeout=5.0, timeout=300.0),
+            "puter": policy_from_env("puter", max_per_host=20, keepalive=30.0, connect_timeout=10.0,
+                                     timeout=120.0, max_retries=2),
+        },
+        default=policy_from_env("default"),
+        retry_ratio=float(os.getenv("HTTP_RETRY_RATIO", "0.2")),
+        retry_min_per_second=float(os.getenv("HTTP_RETRY_MIN_PER_SECOND", "1"))
+    )
+
@@ -1,47 +1,131 @@
 # src/utils/llm.py
-import requests
-import json
-import tiktoken
+import logging
+from functools import lru_cache
 from flask import current_app
 
-def count_tokens(text, model="gpt-3.5-turbo"):
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_MODEL = "gpt-3.5-turbo"
+
+# Every token covers at least one UTF-8 byte and a character is at most 4 bytes
+MAX_BYTES_PER_CHAR = 4
+
+# Average characters per token of the default encoding on English prose and code
+CHARS_PER_TOKEN = 4
+# Text is only called too long unencoded when even this many times denser-than-average
+# tokens could not cover it (the long-input path re-encodes it anyway)
+TOKEN_ESTIMATE_MARGIN = 3
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_TOKEN_MODEL):
     """
-    Count tokens in text using tiktoken.
-    Using gpt-3.5-turbo encoding as it's commonly supported.
+    Load the tiktoken encoding for ``model`` once per process.
+    Returns None (also memoized) when it cannot be loaded. tiktoken is
+    imported here rather than at module level so it stays out of startup.
     """
     try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
     except Exception as e:
-        current_app.logger.warning(f"Could not count tokens with tiktoken: {e}")
+        logger.warning(f"Could not load tiktoken encoding for {model}: {e}")
+        return None
+
+
+def count_tokens(text, model=DEFAULT_TOKEN_MODEL):
+    """
+    Count tokens in text using tiktoken.
+    Using gpt-3.5-turbo encoding as it's commonly supported.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
         # Fallback: rough estimate (1 token ≈ 4 characters)
         return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens_many(texts, model=DEFAULT_TOKEN_MODEL):
+    """Count tokens for several texts in one call (tiktoken encodes the batch in parallel)"""
+    texts = list(texts)
+    encoding = get_encoding(model)
+    if encoding is None:
+        return [len(text) // 4 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+
+
+def split_by_tokens(text, max_tokens, overlap=0, model=DEFAULT_TOKEN_MODEL):
+    """
+    Split ``text`` into pieces of at most ``max_tokens`` tokens, cut on token
+    boundaries, each repeating the last ``overlap`` tokens of the previous one.
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+    step = max_tokens - overlap
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Same 4 characters per token estimate as count_tokens
+        size, step = max_tokens * 4, step * 4
+        return [text[start:start + size] for start in range(0, max(len(text) - overlap * 4, 1), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[start:start + max_tokens])
+            for start in range(0, max(len(tokens) - overlap, 1), step)]
+
+
+def check_token_limit(text, limit, model=DEFAULT_TOKEN_MODEL):
+    """
+    Check whether ``text`` fits in ``limit`` tokens, encoding it only when it must.
+
+    Returns (fits, token_count); token_count is None when the answer was
+    decided from the text length alone. Only text inside the band between
+    the two length checks below is encoded.
+    """
+    # Clearly under: even one token per byte stays within the limit
+    if len(text) * MAX_BYTES_PER_CHAR <= limit:
+        return True, None
+    if len(text.encode("utf-8")) <= limit:
+        return True, None
+    # Clearly over: the calibrated estimate exceeds the limit by more than the margin
+    if len(text) > limit * CHARS_PER_TOKEN * TOKEN_ESTIMATE_MARGIN:
+        return False, None
+    tokens = count_tokens(text, model)
+    return tokens <= limit, tokens
 
 def call_llm_api(prompt):
-    # Count tokens in the prompt
-    prompt_tokens = count_tokens(prompt)
+    # Check the prompt against the token limit (only encoded when the length is inconclusive)
     max_prompt_tokens = 3750
+    fits, prompt_tokens = check_token_limit(prompt, max_prompt_tokens)
     
-    if prompt_tokens > max_prompt_tokens:
-        current_app.logger.warning(f"Prompt too long: {prompt_tokens} tokens (max: {max_prompt_tokens})")
-        return f"Error: Prompt too long ({prompt_tokens} tokens). Maximum allowed is {max_prompt_tokens} tokens."
+    if not fits:
+        # Long-input mode: map-reduce over token chunks instead of rejecting the prompt
+        from utils.mapreduce import map_reduce
+        app = current_app._get_current_object()
+        
+        def generate(part):
+            with app.app_context():
+                result = call_llm_api(part)
+            if result.startswith("Error: "):
+                raise Exception(result[len("Error: "):])
+            return result
+        
+        current_app.logger.info(f"Prompt over {max_prompt_tokens} tokens, using long-input mode")
+        try:
+            return map_reduce.run(prompt, generate)
+        except Exception as e:
+            current_app.logger.error(f"Long-input processing failed: {e}")
+            return f"Error: {str(e)}"
     
-    url = "http://localhost:11434/api/generate"
+    # Goes through the shared, pooled client (and the Ollama host pool) instead of a fresh connection
+    from utils.aio import ollama_client
     payload = {
         "model": "mistral",
         "prompt": prompt,
-        "stream": False,
-        "num_predict": 3750,
-        "timeout": 300
+        "num_predict": 3750
     }
-    headers = {"Content-Type": "application/json"}
     
     try:
         current_app.logger.debug(f"Sending to Ollama: {payload}")
-        current_app.logger.info(f"Prompt tokens: {prompt_tokens}")
-        response = requests.post(url, data=json.dumps(payload), headers=headers, timeout=300)
-        response.raise_for_status()
-        return response.json().get("response", "No response")
-    except requests.exceptions.RequestException as e:
+        current_app.logger.info(f"Prompt tokens: {prompt_tokens if prompt_tokens is not None else 'under limit'}")
+        return ollama_client.generate_sync(payload, timeout=300) or "No response"
+    except Exception as e:
         current_app.logger.error(f"API call failed: {e}")
         return f"Error: {str(e)}"
\ No newline at end of file
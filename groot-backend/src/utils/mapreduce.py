@@ -0,0 +1,155 @@
+# src/utils/mapreduce.py
+import contextvars
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.backends import backend_urls_from_env
+from utils.llm import DEFAULT_TOKEN_MODEL, check_token_limit, split_by_tokens
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT = (
+    "The request below is too long to handle at once, so it was split into {total} overlapping parts. "
+    "It begins with:\n\n{head}\n\n"
+    "This is part {index} of {total}. Carry out the request for this part only and keep every detail "
+    "needed for the final answer:\n\n{chunk}"
+)
+
+REDUCE_PROMPT = (
+    "A request was too long to handle at once, so it was split into {total} parts and each part was "
+    "processed separately. The request begins with:\n\n{head}\n\n"
+    "Results for each part, in order:\n\n{partials}\n\n"
+    "Combine them into one complete, consistent answer to the original request."
+)
+
+
+class MapReduce:
+    """
+    Long-input mode for prompts that exceed the model's context
+
+    The prompt is split on token boundaries into overlapping chunks, every
+    chunk is processed concurrently (``map``), and the partial results are
+    combined by a final summarization pass (``reduce``) whose tokens are
+    streamed. When the partial results are themselves too long they are
+    reduced by another map-reduce round. Map calls of all running tasks share
+    one pool of ``max_parallel`` threads, which caps how many chunks are in
+    flight at once.
+    """
+
+    def __init__(self, max_prompt_tokens: int = 3750, chunk_tokens: int = 3000, overlap: int = 200,
+                 head_tokens: int = 200, max_parallel: int = 2, max_rounds: int = 3,
+                 model: str = DEFAULT_TOKEN_MODEL):
+        if chunk_tokens + head_tokens >= max_prompt_tokens:
+            raise ValueError("chunk_tokens + head_tokens must leave room in max_prompt_tokens")
+        if overlap >= chunk_tokens:
+            raise ValueError("overlap must be smaller than chunk_tokens")
+        self.max_prompt_tokens = max_prompt_tokens
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.head_tokens = head_tokens
+        self.max_parallel = max(1, max_parallel)
+        self.max_rounds = max_rounds
+        self.model = model
+        self._executor = ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="map")
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.chunks_processed = 0
+
+    def fits(self, prompt: str) -> bool:
+        """Whether ``prompt`` can be sent in a single call"""
+        return check_token_limit(prompt, self.max_prompt_tokens, self.model)[0]
+
+    def run(self, prompt: str, generate: Callable[..., str],
+            on_chunk: Optional[Callable[[str], None]] = None,
+            on_progress: Optional[Callable[[str, int, int], None]] = None) -> str:
+        """
+        Answer an over-long ``prompt`` with map-reduce
+
+        Args:
+            prompt: The full request
+            generate: ``generate(prompt)`` returns the model output; it is
+                called as ``generate(prompt, on_chunk)`` for the final pass
+                when ``on_chunk`` is given
+            on_chunk: Receives the tokens of the final answer as they stream
+            on_progress: Called with ``(stage, done, total)`` as chunks finish
+
+        Raises:
+            Exception: If a chunk fails or the input is still too long after
+                ``max_rounds`` rounds
+        """
+        with self._lock:
+            self.runs += 1
+        head = split_by_tokens(prompt, self.head_tokens, model=self.model)[0]
+        text = prompt
+        for round_number in range(1, self.max_rounds + 1):
+            chunks = split_by_tokens(text, self.chunk_tokens, self.overlap, self.model)
+            logger.info(f"Long-input round {round_number}: {len(chunks)} chunks")
+            partials = self._map(chunks, head, generate, on_progress)
+            reduce_prompt = REDUCE_PROMPT.format(
+                total=len(partials),
+                head=head,
+                partials="\n\n".join(f"[Part {index}]\n{partial}" for index, partial in enumerate(partials, 1))
+            )
+            if self.fits(reduce_prompt):
+                if on_progress is not None:
+                    on_progress("reduce", 0, 1)
+                result = generate(reduce_prompt, on_chunk) if on_chunk is not None else generate(reduce_prompt)
+                if on_progress is not None:
+                    on_progress("reduce", 1, 1)
+                return result
+            # Partial results are still too long: reduce them with another round
+            text = "\n\n".join(partials)
+        raise Exception(f"Input still exceeds {self.max_prompt_tokens} tokens after {self.max_rounds} map-reduce rounds")
+
+    def _map(self, chunks: List[str], head: str, generate: Callable[..., str],
+             on_progress: Optional[Callable[[str, int, int], None]]) -> List[str]:
+        total = len(chunks)
+        done = [0]
+        done_lock = threading.Lock()
+
+        def process(index: int, chunk: str) -> str:
+            result = generate(MAP_PROMPT.format(total=total, head=head, index=index, chunk=chunk))
+            with done_lock:
+                done[0] += 1
+                finished = done[0]
+            with self._lock:
+                self.chunks_processed += 1
+            if on_progress is not None:
+                on_progress("map", finished, total)
+            return result
+
+        if on_progress is not None:
+            on_progress("map", 0, total)
+        # Chunks run in the caller's context, so they share its deadline
+        futures = [self._executor.submit(contextvars.copy_context().run, process, index, chunk)
+                   for index, chunk in enumerate(chunks, 1)]
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "chunk_tokens": self.chunk_tokens,
+                "overlap": self.overlap,
+                "max_parallel": self.max_parallel,
+                "runs": self.runs,
+                "chunks_processed": self.chunks_processed,
+            }
+
+
+# Global instance; by default as many chunks run at once as the Ollama hosts have slots
+map_reduce = MapReduce(
+    max_prompt_tokens=int(os.getenv("LLM_MAX_PROMPT_TOKENS", "3750")),
+    chunk_tokens=int(os.getenv("LLM_CHUNK_TOKENS", "3000")),
+    overlap=int(os.getenv("LLM_CHUNK_OVERLAP", "200")),
+    max_parallel=int(os.getenv("LLM_MAP_PARALLEL", "0"))
+    or int(os.getenv("OLLAMA_NUM_PARALLEL", "2")) * len(backend_urls_from_env())
+)
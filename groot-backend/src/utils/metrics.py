@@ -0,0 +1,409 @@
+# src/utils/metrics.py
+import bisect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans fast cache hits up to slow multi-minute generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+
+class _Child:
+    """
+    One labelled time series
+
+    Every thread writes to its own shard, keyed by thread id, so the hot
+    path takes no lock: the shard is only ever mutated by its owner and
+    new shards are added with an atomic ``dict.setdefault``. A scrape sums
+    a copy of the shards.
+    """
+
+    __slots__ = ("_shards", "_size")
+
+    def __init__(self, size: int):
+        self._shards: Dict[int, List[float]] = {}
+        self._size = size
+
+    def _shard(self) -> List[float]:
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            shard = self._shards.setdefault(ident, [0.0] * self._size)
+        return shard
+
+    def _totals(self) -> List[float]:
+        totals = [0.0] * self._size
+        for shard in self._shards.copy().values():
+            for index, value in enumerate(shard):
+                totals[index] += value
+        return totals
+
+
+class CounterChild(_Child):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shard()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._totals()[0]
+
+
+class HistogramChild(_Child):
+    """Shard layout: one count per bucket plus ``+Inf``, then sum, then count"""
+
+    __slots__ = ("_buckets",)
+
+    def __init__(self, buckets: Sequence[float]):
+        super().__init__(len(buckets) + 3)
+        self._buckets = buckets
+
+    def observe(self, value: float) -> None:
+        shard = self._shard()
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """Cumulative bucket counts (ending with ``+Inf``), sum and count"""
+        totals = self._totals()
+        cumulative, running = [], 0.0
+        for count in totals[:-2]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any):
+        """The series for ``values`` (one per label name), created on first use"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. requests or generated tokens"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield self.name + "_total", dict(zip(self.labelnames, key)), child.value
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed ``le`` buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative, total, count = child.snapshot()
+            for bound, value in zip(bounds, cumulative):
+                yield self.name + "_bucket", dict(labels, le=bound), value
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class CallbackMetric(_Metric):
+    """
+    Values read from an existing component when scraped
+
+    ``fn`` returns a number, or a dict mapping label-value tuples to numbers.
+    Used for gauges such as queue depth and for counters a component
+    already keeps, so nothing is counted twice. ``merge`` says how the
+    values of several worker processes combine (``sum`` or ``max``).
+    """
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], Any],
+                 labelnames: Sequence[str] = (), kind: str = "gauge", merge: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.fn = fn
+        self.merge = merge
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        name = self.name + "_total" if self.kind == "counter" else self.name
+        for key, value in values.items():
+            yield name, dict(zip(self.labelnames, key)), value
+
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics rendered in the Prometheus text format
+
+    Instruments are cheap enough to stay on in production: recording a
+    value touches only the calling thread's shard, and all aggregation
+    happens when ``/metrics`` is scraped. With ``shared`` set, a scrape
+    answers for every worker process of the server, not just its own.
+    """
+
+    def __init__(self, shared: Optional["SharedMetrics"] = None):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.shared = shared
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, fn: Callable[[], Any],
+                 labelnames: Sequence[str] = (), kind: str = "gauge", merge: str = "sum") -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, fn, labelnames, kind, merge))
+
+    def _register(self, metric: _Metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name: str) -> _Metric:
+        return self._metrics[name]
+
+    def collect(self) -> List[Tuple[_Metric, List[Tuple[str, Dict[str, str], float]]]]:
+        """Every metric of this process with its current samples"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        collected = []
+        for metric in metrics:
+            try:
+                collected.append((metric, list(metric.samples())))
+            except Exception as e:
+                logger.warning(f"Collecting metric {metric.name} failed: {str(e)}")
+        return collected
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        collected = self.collect()
+        if self.shared is not None:
+            collected = self.shared.merge(collected)
+        lines = []
+        for metric, samples in collected:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def init_app(self, app) -> None:
+        """Time every Flask request by method, route template and status"""
+        from flask import g, request
+
+        requests = self.histogram(
+            "groot_http_request_duration_seconds",
+            "Time until the response headers are sent (streams keep running afterwards)",
+            ("method", "route", "status")
+        )
+
+        @app.before_request
+        def start_timer():
+            g.metrics_started = time.perf_counter()
+            if self.shared is not None:
+                self.shared.start(self)
+
+        @app.after_request
+        def record_latency(response):
+            started = g.pop("metrics_started", None)
+            if started is not None:
+                route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+                requests.labels(request.method, route, response.status_code).observe(
+                    time.perf_counter() - started
+                )
+            return response
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class SharedMetrics:
+    """
+    Adds up the metrics of every worker process of a multi-worker server
+
+    Each serving process writes its samples to a SQLite file every
+    ``interval`` seconds (from a background thread started by its first
+    request) and again whenever it answers a scrape. A scrape combines its
+    own samples with the latest ones of every process that wrote within
+    three intervals: counters and histograms are summed, gauges summed or
+    maxed as registered. Processes that stop reporting drop out, which
+    scrapers see as an ordinary counter reset.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self.after_fork()
+
+    def after_fork(self) -> None:
+        """A forked child reports as a new process, over its own connection"""
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._db: Optional[sqlite3.Connection] = None
+
+    def start(self, registry: MetricsRegistry) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(registry,), name="metrics-share", daemon=True)
+                self._thread.start()
+
+    def merge(self, collected):
+        """``collected`` (see ``MetricsRegistry.collect``) combined with the other processes' samples"""
+        try:
+            others = self._exchange(collected)
+        except Exception as e:
+            logger.warning(f"Reading shared metrics failed: {str(e)}")
+            return collected
+        merged = []
+        for metric, samples in collected:
+            combine = max if getattr(metric, "merge", "sum") == "max" else lambda a, b: a + b
+            totals: Dict[Tuple[str, Tuple], Tuple[Dict[str, str], float]] = {}
+            for name, labels, value in samples:
+                totals[(name, tuple(labels.items()))] = (labels, value)
+            for snapshot in others:
+                for name, labels, value in snapshot.get(metric.name, ()):
+                    key = (name, tuple(labels.items()))
+                    if key in totals:
+                        totals[key] = (labels, combine(totals[key][1], value))
+                    else:
+                        totals[key] = (labels, value)
+            merged.append((metric, [(name, labels, value) for (name, _), (labels, value) in totals.items()]))
+        return merged
+
+    def _run(self, registry: MetricsRegistry) -> None:
+        while True:
+            try:
+                self._exchange(registry.collect())
+            except Exception as e:
+                logger.warning(f"Sharing metrics failed: {str(e)}")
+            time.sleep(self.interval)
+
+    def _exchange(self, collected) -> List[Dict[str, Any]]:
+        """Store this process's samples; returns the fresh snapshots of the other processes"""
+        snapshot = json.dumps({metric.name: samples for metric, samples in collected})
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO metric_snapshots (origin, updated, samples) VALUES (?, ?, ?)",
+                       (self.origin, now, snapshot))
+            db.execute("DELETE FROM metric_snapshots WHERE updated < ?", (now - 3 * self.interval,))
+            rows = db.execute("SELECT samples FROM metric_snapshots WHERE origin != ?", (self.origin,)).fetchall()
+        return [json.loads(samples) for samples, in rows]
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS metric_snapshots ("
+                "origin TEXT PRIMARY KEY, updated REAL NOT NULL, samples TEXT NOT NULL)"
+            )
+        return self._db
+
+
+def _shared_from_env() -> Optional[SharedMetrics]:
+    path = os.getenv("METRICS_DB")
+    if path is None and int(os.getenv("GROOT_WORKERS", "1")) > 1:
+        # A scrape reaches one worker at random; without this it would only report that worker
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "metrics.db")
+    return SharedMetrics(path) if path else None
+
+
+# Global instance
+metrics = MetricsRegistry(_shared_from_env())
+if metrics.shared is not None and hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=metrics.shared.after_fork)
@@ -0,0 +1,64 @@
+# src/utils/pagination.py
+import base64
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidQueryError(ValueError):
+    """Raised for malformed pagination or filter parameters"""
+
+
+def encode_cursor(position: Tuple[str, str]) -> str:
+    """Encode a ``(timestamp, id)`` keyset position as an opaque token"""
+    raw = json.dumps(list(position), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Decode a token produced by ``encode_cursor`` (``None`` means first page)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, item_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(timestamp), str(item_id)
+    except Exception:
+        raise InvalidQueryError("Invalid cursor")
+
+
+def parse_limit(value: Optional[str]) -> int:
+    if value is None or value == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidQueryError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma separated ``fields`` projection (``None`` keeps every field)"""
+    if not value:
+        return None
+    return [field.strip() for field in value.split(",") if field.strip()]
+
+
+def parse_filters(args, allowed: Iterable[str]) -> Dict[str, str]:
+    """Pick the supported filter parameters out of a request's query string"""
+    return {name: args[name] for name in allowed if args.get(name)}
+
+
+def project(item: Dict, fields: Optional[List[str]]) -> Dict:
+    if fields is None:
+        return item
+    return {key: item[key] for key in fields if key in item}
+
+
+def make_etag(version, *parts) -> str:
+    """Weak ETag value for a listing: changes whenever the data version or the query does"""
+    digest = hashlib.sha1(json.dumps([version, *parts], sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:20]
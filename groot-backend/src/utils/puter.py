@@ -1,106 +1,253 @@
 # src/utils/puter.py
-import requests
+import asyncio
 import json
 import base64
+import hashlib
 import os
-import tempfile
+import time
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any
 from flask import current_app
 import logging
+from utils.aio import AsyncRuntime, runtime
+from utils.cache import ResponseCache, analysis_cache
+from utils.circuit import CircuitBreaker, CircuitOpenError, breaker_from_env
+from utils.metrics import metrics
+from utils.upload import StreamingUpload
 
 logger = logging.getLogger(__name__)
 
+FILE_OPTIONS = {
+    "max_tokens": 2000,
+    "temperature": 0.7,
+    "include_metadata": True
+}
+
+
 class PuterAI:
     """
     Puter.js AI Model Integration
-    Handles file processing and AI interactions through Puter.js API
+    Handles file processing and AI interactions through Puter.js API.
+    Requests run on the shared async runtime; the synchronous methods are
+    thin wrappers around their ``*_async`` counterparts. Successful file
+    analyses are cached by content hash and task description, and calls
+    fail fast while the circuit breaker is open.
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, runtime: AsyncRuntime = runtime,
+                 cache: ResponseCache = analysis_cache, lookahead_bytes: int = 1024 * 1024,
+                 breaker: Optional[CircuitBreaker] = None):
         self.api_key = api_key or os.getenv('PUTER_API_KEY')
-        self.base_url = "https://api.puter.com"
-        self.session = requests.Session()
+        self.base_url = os.getenv('PUTER_BASE_URL', "https://api.puter.com")
+        self.runtime = runtime
+        self.cache = cache
+        self.lookahead_bytes = lookahead_bytes
+        self.breaker = breaker or CircuitBreaker("puter")
+        self.headers = {}
         
         if self.api_key:
-            self.session.headers.update({
+            self.headers.update({
                 'Authorization': f'Bearer {self.api_key}',
                 'Content-Type': 'application/json'
             })
     
-    def process_file(self, file_path: str, task_description: str) -> Dict[str, Any]:
+    def process_upload(self, upload: StreamingUpload) -> Dict[str, Any]:
+        """Blocking wrapper around ``process_upload_async``"""
+        return self.runtime.run(self.process_upload_async(upload))
+    
+    def fast_mode_analysis(self, text_input: str, context: Optional[str] = None) -> Dict[str, Any]:
+        """Blocking wrapper around ``fast_mode_analysis_async``"""
+        return self.runtime.run(self.fast_mode_analysis_async(text_input, context))
+    
+    def is_available(self) -> bool:
+        """Blocking wrapper around ``is_available_async``"""
+        return self.runtime.run(self.is_available_async())
+    
+    async def _post(self, path: str, payload: Dict[str, Any], timeout: float):
+        """POST JSON to the Puter API, returning ``(status, body_text)``"""
+        async with self._guard(path.rsplit("/", 1)[-1]):
+            async with self.runtime.http.request(
+                "puter", "POST", f"{self.base_url}{path}",
+                json=payload,
+                headers=self.headers,
+                timeout=timeout
+            ) as response:
+                return self._record(response.status), await response.text()
+    
+    @asynccontextmanager
+    async def _guard(self, operation: str, local_failure=lambda: False):
         """
-        Process a file using Puter.js AI model
+        Refuse calls while the circuit is open; report unreachable Puter to the breaker
+        
+        ``local_failure`` tells connection errors caused by our own request
+        body (a bad upload) apart from Puter being down; those calls are not
+        counted in the latency histogram either.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Puter.js circuit is open, failing fast")
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if not local_failure():
+                import aiohttp
+
+                if isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+                    self.breaker.record_failure()
+                PUTER_SECONDS.labels(operation, "error").observe(time.perf_counter() - started)
+            raise
+        PUTER_SECONDS.labels(operation, "ok").observe(time.perf_counter() - started)
+    
+    def _record(self, status: int) -> int:
+        if status >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return status
+    
+    async def process_upload_async(self, upload: StreamingUpload) -> Dict[str, Any]:
+        """
+        Process a file straight from an upload stream using Puter.js AI model
+        
+        The JSON body is produced chunk by chunk from ``upload`` (which reads
+        the request stream off the event loop) and sent with chunked transfer
+        encoding. Up to ``lookahead_bytes`` of it are read ahead in memory:
+        when the whole body fits, its content hash is known before connecting
+        and repeat uploads are answered from the analysis cache without
+        contacting Puter. Larger uploads are streamed through as they are
+        read and always go to Puter: hashing them first would mean holding
+        or spooling the whole body, so they are neither looked up nor cached.
         
         Args:
-            file_path: Path to the file to process
-            task_description: Description of what to do with the file
+            upload: An opened ``StreamingUpload``
             
         Returns:
             Dict containing the processing result
+            
+        Raises:
+            UploadError: If the upload is malformed or exceeds the size cap
         """
+        file_name = os.path.basename(upload.filename)
+        file_extension = os.path.splitext(file_name)[1].lower()
+        chunks = upload.json_chunks(
+            extra={"model": "puter-ai", "options": FILE_OPTIONS},
+            metadata={"name": file_name, "type": self._get_mime_type(file_extension)}
+        )
+        
+        failure = []
+        
+        async def next_chunk():
+            try:
+                return await asyncio.to_thread(next, chunks, None)
+            except Exception as e:
+                failure.append(e)
+                raise
+        
+        head, buffered = [], 0
+        while not upload.complete and buffered < self.lookahead_bytes:
+            chunk = await next_chunk()
+            if chunk is None:
+                break
+            head.append(chunk)
+            buffered += len(chunk)
+        cache_key = None
+        if upload.complete:
+            cache_key = self.analysis_key(upload.sha256, upload.task)
+            cached = self._cached_result(cache_key, file_name, upload.size, file_extension)
+            if cached is not None:
+                return cached
+        
+        async def body():
+            while head:
+                yield head.pop(0)
+            while True:
+                chunk = await next_chunk()
+                if chunk is None:
+                    return
+                yield chunk
+        
         try:
-            # Read and encode the file
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-                file_base64 = base64.b64encode(file_content).decode('utf-8')
-            
-            # Get file metadata
-            file_name = os.path.basename(file_path)
-            file_size = len(file_content)
-            file_extension = os.path.splitext(file_name)[1].lower()
-            
-            # Prepare the request payload
-            payload = {
-                "file": {
-                    "name": file_name,
-                    "content": file_base64,
-                    "size": file_size,
-                    "type": self._get_mime_type(file_extension)
-                },
-                "task": task_description,
-                "model": "puter-ai",  # Puter.js AI model
-                "options": {
-                    "max_tokens": 2000,
-                    "temperature": 0.7,
-                    "include_metadata": True
-                }
-            }
-            
-            # Make the API call
-            response = self.session.post(
-                f"{self.base_url}/v1/ai/process-file",
-                json=payload,
-                timeout=120
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                logger.info(f"Successfully processed file {file_name} with Puter.js")
-                return {
-                    "success": True,
-                    "result": result.get("analysis", ""),
-                    "metadata": result.get("metadata", {}),
-                    "file_info": {
-                        "name": file_name,
-                        "size": file_size,
-                        "type": file_extension
-                    }
-                }
-            else:
-                logger.error(f"Puter.js API error: {response.status_code} - {response.text}")
-                return {
-                    "success": False,
-                    "error": f"API Error {response.status_code}: {response.text}"
-                }
-                
+            async with self._guard("process-file", lambda: bool(failure)):
+                # The body is produced as it is sent, so it can only be sent once
+                async with self.runtime.http.request(
+                    "puter", "POST", f"{self.base_url}/v1/ai/process-file",
+                    data=body(),
+                    headers=dict(self.headers, **{'Content-Type': 'application/json'}),
+                    timeout=120,
+                    retry=False
+                ) as response:
+                    status, text = self._record(response.status), await response.text()
         except Exception as e:
+            if failure:
+                raise failure[0]
             logger.error(f"Error processing file with Puter.js: {str(e)}")
             return {
                 "success": False,
                 "error": f"Processing error: {str(e)}"
             }
+        if failure:
+            raise failure[0]
+        return self._file_result(status, text, file_name, upload.size, file_extension, cache_key)
     
-    def fast_mode_analysis(self, text_input: str, context: Optional[str] = None) -> Dict[str, Any]:
+    @staticmethod
+    def analysis_key(content_hash: str, task_description: str) -> str:
+        """Cache key for a file analysis: content hash, task and request options"""
+        material = json.dumps(
+            ["puter-ai", content_hash, task_description, FILE_OPTIONS],
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    def _cached_result(self, cache_key: str, file_name: str, file_size: int,
+                       file_extension: str) -> Optional[Dict[str, Any]]:
+        """Shape a cached analysis like a fresh ``process-file`` result, or return None"""
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        logger.info(f"Puter.js analysis cache hit for {file_name}")
+        result = json.loads(cached)
+        return {
+            "success": True,
+            "result": result["result"],
+            "metadata": result["metadata"],
+            "file_info": {
+                "name": file_name,
+                "size": file_size,
+                "type": file_extension
+            },
+            "cached": True
+        }
+    
+    def _file_result(self, status: int, body: str, file_name: str, file_size: int,
+                     file_extension: str, cache_key: Optional[str] = None) -> Dict[str, Any]:
+        """Shape a ``process-file`` response, caching successful analyses under ``cache_key``"""
+        if status == 200:
+            result = json.loads(body)
+            logger.info(f"Successfully processed file {file_name} with Puter.js")
+            analysis = {
+                "result": result.get("analysis", ""),
+                "metadata": result.get("metadata", {})
+            }
+            if cache_key is not None:
+                self.cache.set(cache_key, json.dumps(analysis))
+            return dict(
+                analysis,
+                success=True,
+                file_info={
+                    "name": file_name,
+                    "size": file_size,
+                    "type": file_extension
+                },
+                cached=False
+            )
+        logger.error(f"Puter.js API error: {status} - {body}")
+        return {
+            "success": False,
+            "error": f"API Error {status}: {body}"
+        }
+    
+    async def fast_mode_analysis_async(self, text_input: str, context: Optional[str] = None) -> Dict[str, Any]:
         """
         Fast mode analysis using Puter.js AI without file processing
         
@@ -124,14 +271,10 @@ class PuterAI:
                 }
             }
             
-            response = self.session.post(
-                f"{self.base_url}/v1/ai/analyze",
-                json=payload,
-                timeout=60
-            )
+            status, body = await self._post("/v1/ai/analyze", payload, timeout=60)
             
-            if response.status_code == 200:
-                result = response.json()
+            if status == 200:
+                result = json.loads(body)
                 logger.info("Successfully completed fast mode analysis with Puter.js")
                 return {
                     "success": True,
@@ -140,10 +283,10 @@ class PuterAI:
                     "processing_time": result.get("processing_time", 0)
                 }
             else:
-                logger.error(f"Puter.js fast mode error: {response.status_code} - {response.text}")
+                logger.error(f"Puter.js fast mode error: {status} - {body}")
                 return {
                     "success": False,
-                    "error": f"Fast mode error: {response.status_code}"
+                    "error": f"Fast mode error: {status}"
                 }
                 
         except Exception as e:
@@ -181,13 +324,23 @@ class PuterAI:
         }
         return mime_types.get(extension.lower(), 'application/octet-stream')
     
-    def is_available(self) -> bool:
+    async def is_available_async(self) -> bool:
         """Check if Puter.js API is available"""
         try:
-            response = self.session.get(f"{self.base_url}/v1/health", timeout=10)
-            return response.status_code == 200
-        except:
+            async with self.runtime.http.request(
+                "puter", "GET", f"{self.base_url}/v1/health",
+                headers=self.headers,
+                timeout=10,
+                retry=False
+            ) as response:
+                return response.status == 200
+        except Exception:
             return False
 
 # Global instance
-puter_ai = PuterAI() 
\ No newline at end of file
+puter_ai = PuterAI(breaker=breaker_from_env("puter"))
+
+# Metrics
+PUTER_SECONDS = metrics.histogram(
+    "groot_puter_request_seconds", "Latency of Puter.js API calls", ("operation", "outcome")
+) 
\ No newline at end of file
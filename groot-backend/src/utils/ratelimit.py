@@ -0,0 +1,227 @@
+# src/utils/ratelimit.py
+import math
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600}
+
+
+class RateLimit(NamedTuple):
+    """``limit`` requests per ``period`` seconds; the full limit may be used in one burst"""
+
+    limit: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int
+
+
+def parse_rate(text: Optional[str]) -> Optional[RateLimit]:
+    """
+    Parse ``"20/60"`` (requests per seconds) or ``"20/minute"``; empty or ``0`` disables
+
+    Raises:
+        ValueError: If the text is malformed
+    """
+    if not text or not text.strip() or text.strip() == "0":
+        return None
+    count, _, period = text.strip().partition("/")
+    period = period.strip().lower() or "1"
+    seconds = PERIODS.get(period) or float(period)
+    if int(count) <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit '{text}'")
+    return RateLimit(int(count), float(seconds))
+
+
+def client_id(remote_addr: Optional[str]) -> str:
+    """
+    Who a request is accounted to: its address
+
+    The app has no authentication, so headers such as ``X-API-Key`` or
+    ``X-User-Id`` would be unverified claims: rotating them would give a
+    client fresh buckets, and sending someone else's would drain theirs.
+    """
+    return "ip:" + (remote_addr or "unknown")
+
+
+def _refill(tokens: float, updated: float, now: float, limit: RateLimit) -> float:
+    return min(float(limit.limit), tokens + max(0.0, now - updated) * limit.rate)
+
+
+class MemoryBucketStore:
+    """Token buckets of this process, least recently used ones dropped beyond ``max_keys``"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: RateLimit, now: float) -> Tuple[bool, float]:
+        """Spend one token; returns whether it was available and the tokens left"""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(limit.limit), now))
+            tokens = _refill(tokens, updated, now, limit)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            # A dropped bucket has usually refilled completely anyway
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, tokens
+
+    def after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file, so every worker process of a
+    multi-worker server draws from the same buckets
+
+    Each take is one ``BEGIN IMMEDIATE`` transaction, which serializes
+    concurrent writers across processes.
+    """
+
+    def __init__(self, path: str, idle_seconds: float = 3600.0):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        return self._db
+
+    def take(self, key: str, limit: RateLimit, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT tokens, updated FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                tokens = _refill(*(row or (float(limit.limit), now)), now, limit)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                db.execute("INSERT OR REPLACE INTO rate_limits (key, tokens, updated) VALUES (?, ?, ?)",
+                           (key, tokens, now))
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    db.execute("DELETE FROM rate_limits WHERE updated < ?", (now - self.idle_seconds,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return allowed, tokens
+
+    def after_fork(self) -> None:
+        """SQLite connections must not cross a fork; the child opens its own"""
+        self._lock = threading.Lock()
+        self._db = None
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limits per client and route
+
+    Every ``(route, client)`` pair has its own bucket holding up to
+    ``limit`` tokens that refill continuously over ``period``. Routes
+    without a configured limit are not limited. If the store fails (for
+    instance a locked SQLite file), requests are let through rather than
+    refused.
+    """
+
+    def __init__(self, limits: Dict[str, Optional[RateLimit]], store=None):
+        self.limits = {route: limit for route, limit in limits.items() if limit is not None}
+        self.store = store or MemoryBucketStore()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+
+    def check(self, route: str, client: str) -> Optional[Decision]:
+        """Spend one request of ``client`` on ``route``; ``None`` when the route is unlimited"""
+        limit = self.limits.get(route)
+        if limit is None:
+            return None
+        try:
+            allowed, tokens = self.store.take(f"{route}:{client}", limit, time.time())
+        except Exception as e:
+            logger.warning(f"Rate limit check failed, allowing request: {str(e)}")
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.limited += 1
+        retry_after = 0 if allowed else max(1, math.ceil((1 - tokens) / limit.rate))
+        return Decision(allowed, limit.limit, int(tokens), retry_after)
+
+    def after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self.store.after_fork()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limits": {route: f"{limit.limit}/{limit.period:g}s" for route, limit in self.limits.items()},
+                "store": "sqlite" if isinstance(self.store, SQLiteBucketStore) else "memory",
+                "allowed": self.allowed,
+                "limited": self.limited,
+                "errors": self.errors,
+            }
+
+
+def _store_from_env():
+    path = os.getenv("RATE_LIMIT_DB")
+    if path is None and int(os.getenv("GROOT_WORKERS", "1")) > 1:
+        # Worker processes must share their buckets, or each would allow the full limit
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "ratelimit.db")
+    if path:
+        logger.info(f"Sharing rate limit buckets through {path} (set RATE_LIMIT_DB to move it)")
+    return SQLiteBucketStore(path) if path else MemoryBucketStore()
+
+
+# Global instance
+rate_limiter = RateLimiter(
+    {
+        "tasks": parse_rate(os.getenv("RATE_LIMIT_TASKS", "30/minute")),
+        "puter": parse_rate(os.getenv("RATE_LIMIT_PUTER", "60/minute")),
+    },
+    _store_from_env()
+)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=rate_limiter.after_fork)
+metrics.callback(
+    "groot_rate_limit_requests", "Rate-limited requests allowed or refused",
+    lambda: {("allowed",): rate_limiter.allowed, ("limited",): rate_limiter.limited}, ("outcome",), kind="counter"
+)
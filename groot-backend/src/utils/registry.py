@@ -0,0 +1,161 @@
+# src/utils/registry.py
+import threading
+import time
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+AGENT_STATUSES = ("active", "idle", "busy", "error")
+
+
+class UnknownAgentError(KeyError):
+    """Raised when an agent id or name is not registered"""
+
+
+class AgentRecord:
+    """Compact, slot-based state of one agent"""
+
+    __slots__ = ("id", "name", "type", "description", "capabilities", "status", "busy", "updated_at")
+
+    def __init__(self, id: str, name: str, type: str, description: str,
+                 capabilities: Iterable[str], status: str = "idle"):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.description = description
+        self.capabilities = tuple(capabilities)
+        self.status = status
+        self.busy = 0           # running steps holding the agent active
+        self.updated_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "type": self.type,
+            "description": self.description,
+            "capabilities": list(self.capabilities),
+        }
+
+
+class AgentRegistry:
+    """
+    Thread-safe agent table with O(1) lookups and change notifications
+
+    Records are indexed by id and by name and only change under the lock,
+    so status transitions are atomic and the per-status counts stay exact
+    without rescanning. Every change is handed to the listeners, which
+    publish it on the ``agent`` channel of the dashboard event bus.
+    """
+
+    def __init__(self, agents: Iterable[Dict[str, Any]] = ()):
+        self._by_id: Dict[str, AgentRecord] = {}
+        self._by_name: Dict[str, AgentRecord] = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        for agent in agents:
+            self.register(agent)
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Call ``listener(event)`` for every change (under the registry lock, so keep it quick)"""
+        self._listeners.append(listener)
+
+    def register(self, agent: Dict[str, Any]) -> AgentRecord:
+        """Add an agent from a template dict (the template itself is never mutated)"""
+        record = AgentRecord(
+            agent["id"], agent["name"], agent["type"], agent.get("description", ""),
+            agent.get("capabilities", ()), agent.get("status", "idle")
+        )
+        with self._lock:
+            if record.id in self._by_id or record.name in self._by_name:
+                raise ValueError(f"Agent {record.id} ({record.name}) is already registered")
+            self._by_id[record.id] = record
+            self._by_name[record.name] = record
+            self._counts[record.status] += 1
+            self._publish("agent_registered", record, None)
+        return record
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """Snapshot of one agent, looked up by id or name"""
+        with self._lock:
+            return self._lookup(key).to_dict()
+
+    def set_status(self, key: str, status: str) -> str:
+        """Atomically set an agent's status; returns the previous one"""
+        if status not in AGENT_STATUSES:
+            raise ValueError(f"Invalid status '{status}'")
+        with self._lock:
+            record = self._lookup(key)
+            previous = record.status
+            self._transition(record, status)
+            return previous
+
+    def compare_and_set(self, key: str, expected: str, status: str) -> bool:
+        """Set ``status`` only if the agent is currently in ``expected``"""
+        if status not in AGENT_STATUSES:
+            raise ValueError(f"Invalid status '{status}'")
+        with self._lock:
+            record = self._lookup(key)
+            if record.status != expected:
+                return False
+            self._transition(record, status)
+            return True
+
+    def acquire(self, key: str) -> None:
+        """Mark the agent active for one more running step"""
+        with self._lock:
+            record = self._lookup(key)
+            record.busy += 1
+            self._transition(record, "active")
+
+    def release(self, key: str) -> None:
+        """End one running step; the agent goes idle when none are left"""
+        with self._lock:
+            record = self._lookup(key)
+            record.busy = max(0, record.busy - 1)
+            if record.busy == 0 and record.status == "active":
+                self._transition(record, "idle")
+
+    def list_agents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [record.to_dict() for record in self._by_id.values()]
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._counts[status]
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _lookup(self, key: str) -> AgentRecord:
+        record = self._by_id.get(key) or self._by_name.get(key)
+        if record is None:
+            raise UnknownAgentError(key)
+        return record
+
+    def _transition(self, record: AgentRecord, status: str) -> None:
+        previous = record.status
+        if previous == status:
+            return
+        record.status = status
+        record.updated_at = time.time()
+        self._counts[previous] -= 1
+        self._counts[status] += 1
+        self._publish("status_changed", record, previous)
+
+    def _publish(self, kind: str, record: AgentRecord, previous: Optional[str]) -> None:
+        event = {
+            "type": kind,
+            "agent": record.to_dict(),
+            "previous_status": previous,
+            "timestamp": record.updated_at,
+        }
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning(f"Agent listener failed: {str(e)}")
@@ -0,0 +1,321 @@
+# src/utils/scheduler.py
+import math
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+from utils.backends import backend_urls_from_env
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch")
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler refuses new work because its backlog is full"""
+
+    def __init__(self, retry_after: int, queue_depth: int):
+        super().__init__(f"Task queue is full ({queue_depth} waiting)")
+        self.retry_after = retry_after
+        self.queue_depth = queue_depth
+
+
+class ShuttingDownError(QueueFullError):
+    """Raised for new work while the scheduler drains before the process exits"""
+
+    def __init__(self, retry_after: int = 1, queue_depth: int = 0):
+        Exception.__init__(self, "Worker is shutting down")
+        self.retry_after = retry_after
+        self.queue_depth = queue_depth
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "priority", "owner", "enqueued_at")
+
+    def __init__(self, fn, args, kwargs, priority, owner):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.owner = owner
+        self.enqueued_at = time.time()
+
+
+class _FairLane:
+    """
+    One priority lane, shared round-robin between owners
+
+    Every owner has its own FIFO queue; owners take turns in the order
+    they arrived, each getting ``weight`` consecutive jobs per turn. A
+    newcomer therefore waits for at most one turn of every other owner,
+    however many jobs those owners have queued.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self._weights = weights
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._credit = 0  # jobs left in the current owner's turn
+        self._size = 0
+
+    def append(self, job: _Job) -> None:
+        queue = self._queues.get(job.owner)
+        if queue is None:
+            queue = self._queues[job.owner] = deque()
+        queue.append(job)
+        self._size += 1
+
+    def popleft(self) -> _Job:
+        owner, queue = next(iter(self._queues.items()))
+        if self._credit <= 0:
+            self._credit = max(1, self._weights.get(owner, 1))
+        job = queue.popleft()
+        self._size -= 1
+        self._credit -= 1
+        if not queue:
+            del self._queues[owner]
+            self._credit = 0
+        elif self._credit <= 0:
+            self._queues.move_to_end(owner)
+        return job
+
+    def queued(self, owner: str) -> int:
+        queue = self._queues.get(owner)
+        return len(queue) if queue else 0
+
+    def owners(self):
+        return self._queues.keys()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+
+class TaskScheduler:
+    """
+    Bounded, prioritized job scheduler for model-bound work
+
+    Jobs wait in one FIFO lane per priority and are executed by a fixed set of
+    worker threads sized to the number of model slots, so Ollama never sees
+    more concurrent generations than it can serve. Interactive jobs are
+    preferred, but batch jobs still get one turn in every ``batch_every``
+    dispatches so they cannot starve. Within a lane, owners (users or API
+    keys) are served round-robin, optionally weighted, and
+    ``max_queue_per_owner`` keeps one owner from filling the whole backlog,
+    so a heavy user's burst cannot push light users' jobs back.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 32, batch_every: int = 4,
+                 max_queue_per_owner: int = 0, weights: Optional[Dict[str, int]] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(1, max_queue)
+        self.batch_every = max(1, batch_every)
+        self.max_queue_per_owner = max_queue_per_owner
+        self.weights = dict(weights or {})
+        self._lanes: Dict[str, _FairLane] = {priority: _FairLane(self.weights) for priority in PRIORITIES}
+        self._cond = threading.Condition()
+        self._workers = []
+        self._dispatched = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._closing = False
+        # Exponentially weighted averages used for Retry-After estimates
+        self._avg_wait = 0.0
+        self._avg_service = 0.0
+
+    def start(self) -> None:
+        """Start worker threads (idempotent)"""
+        with self._cond:
+            if self._workers:
+                return
+            for index in range(self.max_concurrency):
+                worker = threading.Thread(
+                    target=self._work_loop,
+                    name=f"scheduler-{index}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, fn: Callable[..., Any], *args, priority: str = "interactive", owner: str = "",
+               **kwargs) -> int:
+        """
+        Queue ``fn(*args, **kwargs)`` for execution
+
+        Args:
+            fn: Callable to run on a worker thread
+            priority: One of ``PRIORITIES``
+            owner: User or API key the job is queued for (fair-share unit)
+
+        Returns:
+            Position of the job in the backlog (1-based)
+
+        Raises:
+            ValueError: If the priority is unknown
+            QueueFullError: If the backlog, or the owner's share of it, is at capacity
+            ShuttingDownError: If the scheduler is draining
+        """
+        if priority not in self._lanes:
+            raise ValueError(f"Unknown priority '{priority}'")
+
+        self.start()
+        with self._cond:
+            if self._closing:
+                self._rejected += 1
+                raise ShuttingDownError()
+            depth = self._depth()
+            if depth >= self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(self._estimate_wait(depth + 1), depth)
+            if self.max_queue_per_owner:
+                owned = sum(lane.queued(owner) for lane in self._lanes.values())
+                if owned >= self.max_queue_per_owner:
+                    self._rejected += 1
+                    raise QueueFullError(self._estimate_wait(owned + 1), owned)
+            self._lanes[priority].append(_Job(fn, args, kwargs, priority, owner))
+            self._cond.notify()
+            return depth + 1
+
+    def drain(self, timeout: float) -> int:
+        """
+        Stop accepting jobs and wait up to ``timeout`` seconds for queued and
+        running ones to finish
+
+        Returns:
+            Number of jobs still queued or running when the wait ended
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            self._closing = True
+            while self._depth() + self._running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._depth() + self._running
+
+    def after_fork(self) -> None:
+        """Reset thread state copied from a parent process; workers restart on the next submit"""
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = 0
+
+    def estimate_wait(self) -> int:
+        """Seconds a newly submitted job would wait before starting"""
+        with self._cond:
+            return self._estimate_wait(self._depth() + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, concurrency and timing"""
+        with self._cond:
+            return {
+                "queue_depth": self._depth(),
+                "queue_depth_by_priority": {priority: len(lane) for priority, lane in self._lanes.items()},
+                "waiting_owners": len({owner for lane in self._lanes.values() for owner in lane.owners()}),
+                "max_queue_per_owner": self.max_queue_per_owner,
+                "running": self._running,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(self._avg_wait, 3),
+                "avg_service_seconds": round(self._avg_service, 3),
+            }
+
+    def _depth(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def _estimate_wait(self, position: int) -> int:
+        service = self._avg_service or 30.0  # assume a typical generation until we have data
+        return max(1, math.ceil(position / self.max_concurrency * service))
+
+    def _next_job(self) -> Optional[_Job]:
+        interactive, batch = self._lanes["interactive"], self._lanes["batch"]
+        if not interactive and not batch:
+            return None
+        self._dispatched += 1
+        if batch and (not interactive or self._dispatched % self.batch_every == 0):
+            return batch.popleft()
+        return interactive.popleft()
+
+    def _work_loop(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running += 1
+                started = time.time()
+                self._avg_wait = _ewma(self._avg_wait, started - job.enqueued_at)
+            QUEUE_WAIT_SECONDS.labels(job.priority).observe(started - job.enqueued_at)
+
+            try:
+                job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"Scheduled job failed: {str(e)}")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._completed += 1
+                    self._avg_service = _ewma(self._avg_service, time.time() - started)
+                    self._cond.notify_all()
+
+
+def _ewma(current: float, sample: float, alpha: float = 0.2) -> float:
+    return sample if current == 0.0 else (1 - alpha) * current + alpha * sample
+
+
+def _weights_from_env() -> Dict[str, int]:
+    """``SCHEDULER_WEIGHTS`` as ``owner=weight,...``; malformed entries are logged and skipped"""
+    weights = {}
+    for item in os.getenv("SCHEDULER_WEIGHTS", "").split(","):
+        owner, _, weight = item.partition("=")
+        if not item.strip():
+            continue
+        try:
+            value = int(weight)
+        except ValueError:
+            value = 0
+        if not owner.strip() or value < 1:
+            logger.warning(f"Ignoring malformed SCHEDULER_WEIGHTS entry {item.strip()!r}")
+            continue
+        weights[owner.strip()] = value
+    return weights
+
+
+# Global instance, sized to the number of generations the Ollama hosts run in parallel,
+# split between the worker processes of a multi-worker server
+scheduler = TaskScheduler(
+    max_concurrency=math.ceil(
+        int(os.getenv("OLLAMA_NUM_PARALLEL", "2")) * len(backend_urls_from_env())
+        / max(1, int(os.getenv("GROOT_WORKERS", "1")))
+    ),
+    max_queue=int(os.getenv("GROOT_MAX_QUEUE", "32")),
+    max_queue_per_owner=int(os.getenv("GROOT_MAX_QUEUE_PER_USER", "0")),
+    weights=_weights_from_env()
+)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=scheduler.after_fork)
+
+# Metrics
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "groot_scheduler_queue_wait_seconds", "Time tasks wait in the queue before a worker picks them up", ("priority",)
+)
+metrics.callback(
+    "groot_scheduler_queue_depth", "Tasks waiting for a worker",
+    lambda: {(priority,): depth for priority, depth in scheduler.stats()["queue_depth_by_priority"].items()},
+    ("priority",)
+)
+metrics.callback("groot_scheduler_workers_busy", "Workers running a task", lambda: scheduler.stats()["running"])
+metrics.callback("groot_scheduler_workers", "Worker threads (model slots)", lambda: scheduler.max_concurrency)
+metrics.callback(
+    "groot_scheduler_rejected", "Tasks refused because the queue was full",
+    lambda: scheduler.stats()["rejected"], kind="counter"
+)
@@ -0,0 +1,214 @@
+# src/utils/semantic_cache.py
+import os
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from utils.batching import embed_batcher
+from utils.cache import CACHES
+from utils.deadline import Interrupted
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticHit(NamedTuple):
+    value: str
+    score: float
+    prompt: str
+
+
+class SemanticCache:
+    """
+    Answers near-duplicate prompts with a stored response
+
+    Prompts are embedded (locally, through Ollama) and kept as unit vectors
+    in one contiguous NumPy matrix, so a lookup is a single matrix-vector
+    product followed by an argmax; a stored answer is returned when its
+    cosine similarity reaches ``threshold``. For embeddings larger than
+    twice ``sketch_dim`` the index also keeps a random projection of every
+    vector: lookups scan the small sketches, then score the best
+    ``candidates`` exactly, which keeps 100k entries in the low
+    milliseconds. Entries only match within their namespace (model and
+    workflow) and expire after ``ttl`` seconds; when ``capacity`` is
+    reached the expired or least recently used entry is replaced. NumPy is
+    imported when the first vector arrives.
+    """
+
+    def __init__(self, embed: Callable[[str], Sequence[float]], threshold: float = 0.92,
+                 capacity: int = 10000, ttl: float = 3600.0, sketch_dim: int = 128,
+                 candidates: int = 32, enabled: bool = True):
+        self._embed = embed
+        self.threshold = threshold
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self.sketch_dim = sketch_dim
+        self.candidates = max(1, candidates)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._namespace_ids: Dict[str, int] = {}
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.embed_errors = 0
+
+    def _reset(self, dim: Optional[int] = None) -> None:
+        self._dim = dim
+        self._size = 0
+        self._vectors = self._sketches = self._projection = None
+        self._expires = self._last_used = self._namespaces = None
+        self._entries: List[tuple] = []
+
+    def embed(self, text: str):
+        """Unit-length embedding of ``text``, or ``None`` when disabled or the embedder fails"""
+        if not self.enabled:
+            return None
+        try:
+            vector = self._embed(text)
+        except Interrupted:
+            raise
+        except Exception as e:
+            with self._lock:
+                self.embed_errors += 1
+            logger.warning(f"Embedding failed, skipping semantic cache: {str(e)}")
+            return None
+        import numpy as np
+
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def get(self, query, namespace: str = "") -> Optional[SemanticHit]:
+        """The stored answer most similar to ``query`` (from ``embed``), if it reaches the threshold"""
+        if query is None:
+            return None
+        with LOOKUP_SECONDS.time(), self._lock:
+            best = self._search(query, namespace)
+            if best is None or best[1] < self.threshold:
+                self.misses += 1
+                return None
+            index, score = best
+            self._last_used[index] = time.time()
+            self.hits += 1
+            prompt, value = self._entries[index]
+            return SemanticHit(value, score, prompt)
+
+    def set(self, query, prompt: str, value: str, namespace: str = "") -> None:
+        """Store ``value`` as the answer for the prompt embedded as ``query``"""
+        if query is None or not value:
+            return
+        now = time.time()
+        with self._lock:
+            if self._dim != len(query):
+                if self._dim is not None:
+                    logger.warning(f"Embedding size changed to {len(query)}, clearing the semantic cache")
+                self._reset(len(query))
+            index = self._slot(now)
+            self._vectors[index] = query
+            if self._projection is not None:
+                self._sketches[index] = query @ self._projection
+            self._expires[index] = now + self.ttl
+            self._last_used[index] = now
+            self._namespaces[index] = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+            if index == len(self._entries):
+                self._entries.append((prompt, value))
+            else:
+                self._entries[index] = (prompt, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _search(self, query, namespace: str):
+        """``(index, cosine similarity)`` of the best live entry in ``namespace``"""
+        import numpy as np
+
+        namespace_id = self._namespace_ids.get(namespace)
+        if namespace_id is None or self._size == 0 or len(query) != self._dim:
+            return None
+        n = self._size
+        excluded = (self._namespaces[:n] != namespace_id) | (self._expires[:n] <= time.time())
+        if self._projection is not None and n > self.candidates:
+            approximate = self._sketches[:n] @ (query @ self._projection)
+            approximate[excluded] = -np.inf
+            rows = np.argpartition(approximate, -self.candidates)[-self.candidates:]
+            rows = rows[np.isfinite(approximate[rows])]
+            if not len(rows):
+                return None
+            scores = self._vectors[rows] @ query
+            best = int(np.argmax(scores))
+            return int(rows[best]), float(scores[best])
+        scores = self._vectors[:n] @ query
+        scores[excluded] = -np.inf
+        best = int(np.argmax(scores))
+        return (best, float(scores[best])) if np.isfinite(scores[best]) else None
+
+    def _slot(self, now: float) -> int:
+        """Row for a new entry: the next free one, else the expired or least recently used one"""
+        import numpy as np
+
+        if self._size < self.capacity:
+            if self._vectors is None or self._size == len(self._vectors):
+                self._grow(min(self.capacity, max(1024, 2 * self._size)))
+            self._size += 1
+            return self._size - 1
+        expired = int(np.argmin(self._expires))
+        index = expired if self._expires[expired] <= now else int(np.argmin(self._last_used))
+        self.evictions += 1
+        return index
+
+    def _grow(self, rows: int) -> None:
+        import numpy as np
+
+        def grown(array, shape, dtype):
+            new = np.zeros(shape, dtype=dtype)
+            if array is not None:
+                new[:len(array)] = array
+            return new
+
+        if self._projection is None and self._dim > 2 * self.sketch_dim:
+            rng = np.random.default_rng(0)
+            self._projection = (rng.standard_normal((self._dim, self.sketch_dim)) /
+                                np.sqrt(self.sketch_dim)).astype(np.float32)
+        self._vectors = grown(self._vectors, (rows, self._dim), np.float32)
+        if self._projection is not None:
+            self._sketches = grown(self._sketches, (rows, self.sketch_dim), np.float32)
+        self._expires = grown(self._expires, rows, np.float64)
+        self._last_used = grown(self._last_used, rows, np.float64)
+        self._namespaces = grown(self._namespaces, rows, np.int32)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "embed_errors": self.embed_errors,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+# Metrics
+LOOKUP_SECONDS = metrics.histogram(
+    "groot_semantic_cache_lookup_seconds", "Similarity search time of the semantic cache"
+).labels()
+
+# Global instance; opt in with SEMANTIC_CACHE=1 (needs an embedding model pulled into Ollama)
+EMBED_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "nomic-embed-text")
+semantic_cache = SemanticCache(
+    embed=lambda text: embed_batcher.embed_sync(text, EMBED_MODEL, timeout=10),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    capacity=int(os.getenv("SEMANTIC_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+    enabled=os.getenv("SEMANTIC_CACHE", "").lower() in ("1", "true", "yes", "on")
+)
+CACHES["semantic"] = semantic_cache
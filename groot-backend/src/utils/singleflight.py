@@ -0,0 +1,190 @@
+# src/utils/singleflight.py
+import contextvars
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.deadline import Deadline, current_deadline, deadline_scope
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """
+    A single in-flight call shared by a leader and any number of followers
+
+    The call runs under its own ``deadline``, which lasts as long as the
+    latest deadline of the callers attached to it and is cancelled once every
+    one of them has been interrupted.
+    """
+
+    def __init__(self, first: Optional[Deadline]):
+        self.chunks: List[str] = []
+        self.subscribers: List[Callable[[str], None]] = []
+        self.callers: List[Optional[Deadline]] = [first]
+        self.deadline = Deadline(first.seconds, first.expires_at) if first is not None else Deadline()
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def attach(self, deadline: Optional[Deadline]) -> bool:
+        """Add a caller; False once the call finished or was abandoned by everyone"""
+        with self._cond:
+            if self.done or self.deadline.reason is not None:
+                return False
+            self.callers.append(deadline)
+            self.deadline.extend_to(deadline)
+            return True
+
+    def subscribe(self, on_chunk: Callable[[str], None]) -> None:
+        """Replay chunks produced so far, then receive new ones as they arrive"""
+        with self._cond:
+            for chunk in self.chunks:
+                _deliver(on_chunk, chunk)
+            self.subscribers.append(on_chunk)
+
+    def emit(self, chunk: str) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            for on_chunk in self.subscribers:
+                _deliver(on_chunk, chunk)
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.chunks = []
+            self._cond.notify_all()
+
+    def interrupted(self) -> None:
+        """A caller was interrupted: wake the waiters and drop the call if nobody is left"""
+        with self._cond:
+            abandoned = all(d is not None and d.reason is not None for d in self.callers)
+            self._cond.notify_all()
+        if abandoned:
+            self.deadline.cancel()
+
+    def wait(self, deadline: Optional[Deadline] = None) -> Any:
+        """The leader's result, giving up when the waiter's own ``deadline`` ends"""
+        with self._cond:
+            while not self.done:
+                if deadline is not None:
+                    deadline.check()
+                self._cond.wait(deadline.remaining() if deadline is not None else None)
+            if self.error is not None:
+                raise self.error
+            return self.result
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution
+
+    The first caller for a key (the leader) starts ``fn``; callers that
+    arrive while it is still running attach to the same flight, receive
+    every streamed chunk (including the ones emitted before they joined)
+    and get its result or exception. ``fn`` runs on a thread of the flight,
+    in the leader's context but under the flight's deadline, and every
+    caller, the leader included, only waits for it under its own deadline:
+    a cancelled or expired caller returns at once, freeing its worker, while
+    the call goes on for the callers that still have time. It is only
+    abandoned when nobody is waiting for it any more.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[Callable[[str], None]], Any],
+           on_chunk: Optional[Callable[[str], None]] = None) -> Any:
+        """
+        Run ``fn`` once per concurrent ``key``
+
+        Args:
+            key: Identity of the call; equal keys are deduplicated
+            fn: Callable receiving an ``emit(chunk)`` function for partial output
+            on_chunk: Optional callback for partial output of this caller
+
+        Returns:
+            The (shared) return value of ``fn``
+        """
+        deadline = current_deadline()
+        with self._lock:
+            flight = self._flights.get(key)
+            # A finished or abandoned flight may linger until its thread unregisters it
+            leader = flight is None or not flight.attach(deadline)
+            if leader:
+                flight = _Flight(deadline)
+                self._flights[key] = flight
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        # Output is only relayed to callers that are still waiting
+        forward = _Forward(on_chunk) if on_chunk is not None else None
+        if forward is not None:
+            flight.subscribe(forward)
+        if leader:
+            context = contextvars.copy_context()
+            threading.Thread(
+                target=context.run, args=(self._run, key, flight, fn), name="singleflight", daemon=True
+            ).start()
+        else:
+            logger.info("Attached to in-flight generation")
+        try:
+            if deadline is None:
+                return flight.wait()
+            with deadline.watch(flight.interrupted):
+                return flight.wait(deadline)
+        finally:
+            if forward is not None:
+                forward.on_chunk = None
+
+    def _run(self, key: str, flight: _Flight, fn: Callable[[Callable[[str], None]], Any]) -> None:
+        try:
+            with deadline_scope(flight.deadline):
+                result = fn(flight.emit)
+        except BaseException as e:
+            flight.finish(error=e)
+        else:
+            flight.finish(result)
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+class _Forward:
+    """A caller's chunk callback that can be detached once it stops waiting"""
+
+    __slots__ = ("on_chunk",)
+
+    def __init__(self, on_chunk: Callable[[str], None]):
+        self.on_chunk = on_chunk
+
+    def __call__(self, chunk: str) -> None:
+        if self.on_chunk is not None:
+            self.on_chunk(chunk)
+
+
+def _deliver(on_chunk: Callable[[str], None], chunk: str) -> None:
+    try:
+        on_chunk(chunk)
+    except Exception as e:
+        logger.warning(f"Chunk subscriber failed: {str(e)}")
+
+
+# Global instance for LLM generations
+llm_flights = SingleFlight()
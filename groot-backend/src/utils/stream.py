@@ -0,0 +1,183 @@
+# src/utils/stream.py
+import json
+import threading
+import time
+import logging
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Callable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStream:
+    """
+    Incremental output buffer for a single task.
+
+    The worker appends chunks as the model produces them; any number of
+    Server-Sent Events clients can replay the buffer from an offset and then
+    block until more chunks arrive or the stream is closed. Offsets and event
+    ids are character positions in the generated text, so they stay valid
+    even if the stream is later rebuilt from the stored result.
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.chunks: List[str] = []
+        self.length = 0
+        self._ends: List[int] = []
+        self.status = "processing"
+        self.error: Optional[str] = None
+        self.closed_at: Optional[float] = None
+        self._cond = threading.Condition()
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def append(self, text: str) -> None:
+        """Publish a chunk of generated text to all readers"""
+        if not text:
+            return
+        with self._cond:
+            self.chunks.append(text)
+            self.length += len(text)
+            self._ends.append(self.length)
+            self._cond.notify_all()
+
+    def close(self, status: str = "completed", error: Optional[str] = None) -> None:
+        """Mark the stream as finished and wake up every reader"""
+        with self._cond:
+            self.status = status
+            self.error = error
+            self.closed_at = time.time()
+            self._cond.notify_all()
+
+    def text(self) -> str:
+        """Return everything generated so far"""
+        with self._cond:
+            return "".join(self.chunks)
+
+    def iter_events(self, offset: int = 0, heartbeat: float = 15.0) -> Iterator[str]:
+        """
+        Yield SSE-formatted events starting at character ``offset``
+
+        Args:
+            offset: Number of characters the client already has (e.g. from Last-Event-ID)
+            heartbeat: Seconds of silence before a keep-alive comment is sent
+
+        Yields:
+            Encoded ``text/event-stream`` frames
+        """
+        while True:
+            with self._cond:
+                if offset >= self.length and not self.closed:
+                    self._cond.wait(timeout=heartbeat)
+                pending = self._pending(offset)
+                closed = self.closed
+                length = self.length
+
+            if pending:
+                for end, text in pending:
+                    offset = end
+                    yield format_sse({"text": text}, event="chunk", event_id=end)
+            elif not closed:
+                yield ": keep-alive\n\n"
+
+            if closed and offset >= length:
+                yield format_sse(
+                    {"status": self.status, "error": self.error},
+                    event="done",
+                    event_id=max(offset, length),
+                )
+                return
+
+    def _pending(self, offset: int) -> List[tuple]:
+        """Return ``(end_offset, text)`` pairs covering everything after ``offset``"""
+        index = bisect_right(self._ends, offset)
+        pending = []
+        for end, chunk in zip(self._ends[index:], self.chunks[index:]):
+            start = end - len(chunk)
+            pending.append((end, chunk[max(0, offset - start):]))
+        return pending
+
+
+class TaskStreamRegistry:
+    """Thread-safe registry of task streams with bounded retention of finished ones"""
+
+    def __init__(self, max_closed: int = 256):
+        self.max_closed = max_closed
+        self._streams: "OrderedDict[str, TaskStream]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, task_id: str) -> TaskStream:
+        with self._lock:
+            stream = self._streams.get(task_id)
+            if stream is None:
+                stream = TaskStream(task_id)
+                self._streams[task_id] = stream
+            self._prune()
+            return stream
+
+    def get(self, task_id: str) -> Optional[TaskStream]:
+        with self._lock:
+            return self._streams.get(task_id)
+
+    def _prune(self) -> None:
+        closed = [task_id for task_id, s in self._streams.items() if s.closed]
+        for task_id in closed[:max(0, len(closed) - self.max_closed)]:
+            del self._streams[task_id]
+
+
+def format_sse(data, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Encode a payload as a single Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def consume_ollama_stream(response, on_chunk: Callable[[str], None], start_time: float) -> str:
+    """Read Ollama's NDJSON stream line by line, forwarding each fragment"""
+    parts = []
+    try:
+        for line in response.iter_lines():
+            if handle_ollama_line(line, parts, on_chunk, start_time):
+                break
+    finally:
+        response.close()
+    return "".join(parts)
+
+
+def handle_ollama_line(line, parts: List[str], on_chunk: Callable[[str], None], start_time: float,
+                       final: Optional[dict] = None) -> bool:
+    """
+    Process one NDJSON line from ``/api/generate``
+
+    Appends the fragment to ``parts`` and forwards it to ``on_chunk``.
+    Returns True once Ollama reports the generation as done (copying that
+    last message, with its timing counters, into ``final`` when given) and
+    raises if the line carries an error.
+    """
+    line = line.strip()
+    if not line:
+        return False
+    message = json.loads(line)
+    if message.get("error"):
+        raise Exception(message["error"])
+    piece = message.get("response", "")
+    if piece:
+        if not parts:
+            logger.info(f"LLM first token in {(time.time()-start_time):.2f}s")
+        parts.append(piece)
+        on_chunk(piece)
+    if message.get("done") and final is not None:
+        final.update(message)
+    return bool(message.get("done"))
+
+
+# Global instance
+task_streams = TaskStreamRegistry()
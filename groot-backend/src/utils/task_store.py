@@ -0,0 +1,517 @@
+# src/utils/task_store.py
+import os
+import threading
+import time
+import logging
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from models.user import db
+from models.task import Task, Activity
+from utils.pagination import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a task record no longer changes
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+TASK_FILTERS = ("status", "model", "priority", "task_id", "since", "until")
+ACTIVITY_FILTERS = ("agent", "type", "task_id", "since", "until")
+
+
+class TaskRepository:
+    """
+    Task and activity store backed by the application's SQLite database
+
+    Running tasks live in memory and are written through to the ``tasks``
+    table on every status change; streamed output is appended with
+    ``append_result`` into a per-task buffer that is joined only when the
+    task is read, persisted or finished. Records handed out are copies, so
+    callers never see (or mutate) the stored dicts. Finished tasks and
+    recent activity are kept in bounded hot windows, and per-status counters
+    are maintained incrementally so status reporting never scans the table.
+    Without ``init_app`` the repository works purely in memory.
+
+    With ``shared`` set (several server processes on one database) the
+    local counters and activity window only cover this process, so counts,
+    listing versions and unfiltered activity are read from the database
+    instead (cached for ``sync_interval`` seconds), and running tasks are
+    written through every ``sync_interval`` seconds by a background thread
+    so that other processes can follow their progress; ``sync`` only marks
+    a task for the next write, so it is safe to call per streamed token
+    and from the event loop thread. A task cancelled through another
+    process is marked ``cancelled`` in the database; the process running it
+    notices on its next write-through and emits a ``cancel_requested`` event.
+    """
+
+    def __init__(self, hot_size: int = 256, activity_window: int = 200, shared: bool = False,
+                 sync_interval: float = 1.0):
+        self.hot_size = hot_size
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self._app = None
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._output: Dict[str, List[str]] = {}
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._activities: deque = deque(maxlen=activity_window)
+        self._counts: Counter = Counter()
+        self._activity_total = 0
+        # Bumped on every write to a task visible through list_tasks; used for ETags
+        self._version = 0
+        self._dirty: Set[str] = set()
+        self._writer: Optional[threading.Thread] = None
+        # Orders the background write-through against status changes of the same task
+        self._persist_lock = threading.Lock()
+        self._shared_totals: Optional[Tuple[float, Counter, int, Any]] = None
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+
+    def add_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]) -> None:
+        """Call ``listener(event, task_id, fields)`` on create/update/delete (outside the lock)"""
+        self._listeners.append(listener)
+
+    def init_app(self, app) -> None:
+        """Attach to a Flask app so records are persisted through its SQLAlchemy session"""
+        self._app = app
+
+    def load(self) -> None:
+        """Prime counters and the activity window from the database (call after ``db.create_all``)"""
+        if self._app is None:
+            return
+        with self._app.app_context():
+            counts = db.session.query(Task.status, db.func.count(Task.id)).group_by(Task.status).all()
+            activity_total = db.session.query(db.func.count(Activity.id)).scalar() or 0
+            recent = [activity.to_dict() for activity in
+                      Activity.query.order_by(Activity.timestamp.desc()).limit(self._activities.maxlen)]
+
+        with self._lock:
+            self._counts = Counter(dict(counts))
+            self._activity_total = activity_total
+            self._activities.clear()
+            self._activities.extend(reversed(recent))
+
+    def recover(self) -> int:
+        """
+        Fail the tasks a previous server run left queued or running; returns how many
+
+        Call once per server start, before any process takes tasks: in a
+        multi-worker server every worker shares the table, so a worker
+        calling it would fail the tasks its siblings are running.
+        """
+        if self._app is None:
+            return 0
+        with self._app.app_context():
+            interrupted = Task.query.filter(Task.status.in_(("queued", "processing"))).update(
+                {"status": "failed", "error": "Interrupted by server restart"}, synchronize_session=False
+            )
+            db.session.commit()
+        with self._lock:
+            for status in ("queued", "processing"):
+                self._counts["failed"] += self._counts.pop(status, 0)
+            self._shared_totals = None
+        return interrupted
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Register a new task record"""
+        task = dict(task)
+        with self._lock:
+            if task["status"] in TERMINAL_STATUSES:
+                self._remember(task)
+            else:
+                self._live[task["id"]] = task
+            self._counts[task["status"]] += 1
+            self._version += 1
+        self._persist(task, created=True)
+        self._notify("created", task["id"], dict(task))
+        return dict(task)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """A copy of a task from the hot windows, falling back to the database"""
+        with self._lock:
+            task = self._live.get(task_id) or self._recent.get(task_id)
+            if task is not None:
+                return self._snapshot(task)
+        if self._app is None:
+            return None
+        with self._app.app_context():
+            row = db.session.get(Task, task_id)
+            return row.to_dict() if row is not None else None
+
+    def is_local(self, task_id: str) -> bool:
+        """Whether ``task_id`` is running in this process"""
+        with self._lock:
+            return task_id in self._live
+
+    def append_result(self, task_id: str, chunk: str) -> bool:
+        """Append streamed output to a running task; False if it is not running here"""
+        with self._lock:
+            task = self._live.get(task_id)
+            if task is None:
+                return False
+            output = self._output.get(task_id)
+            if output is None:
+                output = self._output[task_id] = [task["result"]] if task.get("result") else []
+                task["first_token_at"] = datetime.utcnow().isoformat() + "Z"
+            output.append(chunk)
+            self._version += 1
+        return True
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Apply ``fields`` to a running task and persist it if its status changed"""
+        with self._lock:
+            task = self._live.get(task_id)
+            if task is None:
+                return None
+            previous = task["status"]
+            if "result" in fields:
+                self._output.pop(task_id, None)
+            task.update(fields)
+            status = task["status"]
+            self._version += 1
+            if status != previous:
+                self._counts[previous] -= 1
+                self._counts[status] += 1
+                if status in TERMINAL_STATUSES:
+                    task = self._snapshot(task)
+                    del self._live[task_id]
+                    self._output.pop(task_id, None)
+                    self._dirty.discard(task_id)
+                    self._remember(task)
+            task = self._snapshot(task)
+        if status != previous:
+            self._persist(task)
+        else:
+            self.sync(task_id)
+        self._notify("updated", task_id, dict(fields, status=status))
+        return task
+
+    def sync(self, task_id: str) -> None:
+        """In shared mode, have a running task written through within ``sync_interval`` seconds"""
+        if not self.shared or self._app is None:
+            return
+        with self._lock:
+            if task_id not in self._live:
+                return
+            self._dirty.add(task_id)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_through, name="task-sync", daemon=True)
+                self._writer.start()
+
+    def after_fork(self) -> None:
+        """Forget the parent's write-through thread; the child starts its own on demand"""
+        self._lock = threading.RLock()
+        self._persist_lock = threading.Lock()
+        self._dirty = set()
+        self._writer = None
+
+    def fail_running(self, error: str) -> int:
+        """Mark every task queued or running in this process as failed; returns how many"""
+        with self._lock:
+            task_ids = list(self._live)
+        for task_id in task_ids:
+            self.update(task_id, status="failed", error=error)
+        return len(task_ids)
+
+    def request_cancel(self, task_id: str) -> bool:
+        """
+        In shared mode, mark a task queued or running in another process as
+        cancelled; False if it already finished
+        """
+        if self._app is None:
+            return False
+        with self._app.app_context():
+            updated = Task.query.filter(
+                Task.id == task_id, Task.status.in_(("queued", "processing"))
+            ).update({"status": "cancelled", "error": "Cancelled by client"}, synchronize_session=False)
+            db.session.commit()
+        with self._lock:
+            self._shared_totals = None
+        return bool(updated)
+
+    def delete(self, task_id: str) -> None:
+        """Forget a task that was never admitted"""
+        with self._lock:
+            task = self._live.pop(task_id, None) or self._recent.pop(task_id, None)
+            if task is None:
+                return
+            self._output.pop(task_id, None)
+            self._counts[task["status"]] -= 1
+            self._version += 1
+        self._notify("deleted", task_id, {})
+        if self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                Task.query.filter_by(id=task_id).delete()
+                db.session.commit()
+        except Exception as e:
+            logger.warning(f"Could not delete task {task_id}: {str(e)}")
+
+    def list_tasks(self, filters: Dict[str, str], cursor: Optional[Tuple[str, str]] = None,
+                   limit: int = 50, include_result: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of tasks matching ``filters``, walking from newest to oldest
+
+        Args:
+            filters: Subset of ``TASK_FILTERS``; ``since``/``until`` bound ``created_at``
+            cursor: Position returned as ``next_cursor`` by the previous page
+            limit: Page size
+            include_result: Load the (potentially large) ``result`` column
+
+        Returns:
+            ``(tasks, next_cursor)`` with tasks in chronological order
+        """
+        if self._app is None:
+            with self._lock:
+                candidates = [self._snapshot(task) for task in list(self._recent.values()) + list(self._live.values())]
+            return _page_in_memory(candidates, "created_at", _task_matcher(filters), cursor, limit)
+
+        with self._app.app_context():
+            query = Task.query
+            if not include_result:
+                query = query.options(db.defer(Task.result))
+            query = _filter_tasks(query, filters)
+            rows = _keyset_page(query, Task.created_at, Task.id, cursor, limit)
+            tasks = [row.to_dict(include_result=include_result) for row in rows]
+        return _finish_page(tasks, "created_at", limit)
+
+    def count_tasks(self, filters: Dict[str, str]) -> int:
+        """How many tasks match ``filters``; a status alone is answered from the counters"""
+        if set(filters) == {"status"}:
+            return self.count(filters["status"])
+        if self._app is None:
+            matches = _task_matcher(filters)
+            with self._lock:
+                return sum(1 for task in list(self._recent.values()) + list(self._live.values()) if matches(task))
+        with self._app.app_context():
+            return _filter_tasks(Task.query, filters).count()
+
+    def list_activity(self, filters: Dict[str, str], cursor: Optional[Tuple[str, str]] = None,
+                      limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of activity matching ``filters``; see ``list_tasks``"""
+        if cursor is None and not filters and not (self.shared and self._app is not None):
+            with self._lock:
+                window = list(self._activities)
+            if len(window) > limit or len(window) == self._activity_total:
+                # Served entirely from the hot window
+                return _page_in_memory(window, "timestamp", lambda item: True, None, limit)
+
+        if self._app is None:
+            with self._lock:
+                window = list(self._activities)
+            return _page_in_memory(window, "timestamp", _activity_matcher(filters), cursor, limit)
+
+        with self._app.app_context():
+            query = Activity.query
+            if "agent" in filters:
+                query = query.filter(Activity.agent == filters["agent"])
+            if "type" in filters:
+                query = query.filter(Activity.type == filters["type"])
+            if "task_id" in filters:
+                query = query.filter(Activity.task_id == filters["task_id"])
+            if "since" in filters:
+                query = query.filter(Activity.timestamp >= filters["since"])
+            if "until" in filters:
+                query = query.filter(Activity.timestamp < filters["until"])
+            rows = _keyset_page(query, Activity.timestamp, Activity.id, cursor, limit)
+            activities = [row.to_dict() for row in rows]
+        return _finish_page(activities, "timestamp", limit)
+
+    def add_activity(self, activity: Dict[str, Any]) -> None:
+        with self._lock:
+            self._activities.append(activity)
+            self._activity_total += 1
+        if self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                db.session.add(Activity.from_dict(activity))
+                db.session.commit()
+        except Exception as e:
+            logger.warning(f"Could not persist activity: {str(e)}")
+
+    def count(self, status: str) -> int:
+        if self.shared and self._app is not None:
+            return self._shared_state()[1][status]
+        with self._lock:
+            return self._counts[status]
+
+    @property
+    def activity_count(self) -> int:
+        if self.shared and self._app is not None:
+            return self._shared_state()[2]
+        return self._activity_total
+
+    @property
+    def version(self) -> Any:
+        """Changes whenever the task listings may have changed; used for ETags"""
+        if self.shared and self._app is not None:
+            _, counts, _, last_completed = self._shared_state()
+            return f"{sorted(counts.items())}:{last_completed}"
+        return self._version
+
+    def _shared_state(self) -> Tuple[float, Counter, int, Any]:
+        """``(read_at, counts by status, activity total, latest completion)`` across all processes"""
+        with self._lock:
+            state = self._shared_totals
+        if state is not None and time.time() - state[0] < self.sync_interval:
+            return state
+        with self._app.app_context():
+            counts = Counter(dict(
+                db.session.query(Task.status, db.func.count(Task.id)).group_by(Task.status).all()
+            ))
+            activity_total = db.session.query(db.func.count(Activity.id)).scalar() or 0
+            last_completed = db.session.query(db.func.max(Task.completed_at)).scalar()
+        state = (time.time(), counts, activity_total, last_completed)
+        with self._lock:
+            self._shared_totals = state
+        return state
+
+    def _notify(self, event: str, task_id: str, fields: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event, task_id, fields)
+            except Exception as e:
+                logger.warning(f"Task listener failed: {str(e)}")
+
+    def _write_through(self) -> None:
+        """Background loop persisting running tasks marked by ``sync``, batched per interval"""
+        while True:
+            time.sleep(self.sync_interval)
+            with self._lock:
+                tasks = [self._snapshot(self._live[task_id]) for task_id in self._dirty if task_id in self._live]
+                self._dirty.clear()
+            for task in tasks:
+                self._persist(task, progress=True)
+
+    def _snapshot(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """A copy of ``task`` with its buffered output joined into ``result`` (called with the lock held)"""
+        task = dict(task)
+        output = self._output.get(task["id"])
+        if output is not None:
+            task["result"] = "".join(output)
+        return task
+
+    def _remember(self, task: Dict[str, Any]) -> None:
+        self._recent[task["id"]] = task
+        self._recent.move_to_end(task["id"])
+        while len(self._recent) > self.hot_size:
+            self._recent.popitem(last=False)
+
+    def _persist(self, task: Dict[str, Any], created: bool = False, progress: bool = False) -> None:
+        """Write ``task`` to its row; ``progress`` writes never overwrite a finished task"""
+        if self._app is None:
+            return
+        if self.shared:
+            with self._lock:
+                self._shared_totals = None
+        cancelled = False
+        try:
+            with self._persist_lock, self._app.app_context():
+                row = None if created else db.session.get(Task, task["id"])
+                if row is None:
+                    db.session.add(Task.from_dict(task))
+                elif self.shared and row.status == "cancelled" and task["status"] != "cancelled":
+                    # Cancelled through another process: keep the mark and stop the task here
+                    cancelled = True
+                elif progress and (row.status in TERMINAL_STATUSES or not self.is_local(task["id"])):
+                    # Finished after this snapshot was taken
+                    pass
+                else:
+                    row.update_from_dict(task)
+                db.session.commit()
+        except Exception as e:
+            logger.warning(f"Could not persist task {task['id']}: {str(e)}")
+        if cancelled:
+            self._notify("cancel_requested", task["id"], {})
+
+
+def to_history(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a task record the way the history endpoint has always returned it"""
+    entry = {key: value for key, value in task.items() if key not in ("description", "result")}
+    entry.update({
+        "task": task["description"],
+        "timestamp": task["created_at"]
+    })
+    if "result" in task:
+        result = task["result"] or ""
+        entry["result"] = result[:500] + "..." if len(result) > 500 else result
+    return entry
+
+
+def _filter_tasks(query, filters: Dict[str, str]):
+    if "status" in filters:
+        query = query.filter(Task.status == filters["status"])
+    if "model" in filters:
+        query = query.filter(Task.model == filters["model"])
+    if "priority" in filters:
+        query = query.filter(Task.priority == filters["priority"])
+    if "task_id" in filters:
+        query = query.filter(Task.id == filters["task_id"])
+    if "since" in filters:
+        query = query.filter(Task.created_at >= filters["since"])
+    if "until" in filters:
+        query = query.filter(Task.created_at < filters["until"])
+    return query
+
+
+def _keyset_page(query, time_column, id_column, cursor, limit):
+    """Newest-first page strictly older than ``cursor``, with one extra row to detect more"""
+    if cursor is not None:
+        timestamp, item_id = cursor
+        query = query.filter(db.or_(
+            time_column < timestamp,
+            db.and_(time_column == timestamp, id_column < item_id)
+        ))
+    return query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+
+def _page_in_memory(items: Iterable[Dict[str, Any]], time_key: str, matches: Callable,
+                    cursor: Optional[Tuple[str, str]], limit: int):
+    ordered = sorted((item for item in items if matches(item)),
+                     key=lambda item: (item[time_key], item["id"]), reverse=True)
+    if cursor is not None:
+        ordered = [item for item in ordered if (item[time_key], item["id"]) < cursor]
+    return _finish_page(ordered[:limit + 1], time_key, limit)
+
+
+def _finish_page(newest_first: List[Dict[str, Any]], time_key: str, limit: int):
+    page = newest_first[:limit]
+    next_cursor = None
+    if len(newest_first) > limit:
+        oldest = page[-1]
+        next_cursor = encode_cursor((oldest[time_key], oldest["id"]))
+    page.reverse()
+    return page, next_cursor
+
+
+def _task_matcher(filters: Dict[str, str]) -> Callable[[Dict[str, Any]], bool]:
+    def matches(task):
+        return (task["status"] == filters.get("status", task["status"])
+                and task.get("model") == filters.get("model", task.get("model"))
+                and task.get("priority") == filters.get("priority", task.get("priority"))
+                and task["id"] == filters.get("task_id", task["id"])
+                and task["created_at"] >= filters.get("since", "")
+                and ("until" not in filters or task["created_at"] < filters["until"]))
+    return matches
+
+
+def _activity_matcher(filters: Dict[str, str]) -> Callable[[Dict[str, Any]], bool]:
+    def matches(activity):
+        return (activity["agent"] == filters.get("agent", activity["agent"])
+                and activity["type"] == filters.get("type", activity["type"])
+                and activity.get("task_id") == filters.get("task_id", activity.get("task_id"))
+                and activity["timestamp"] >= filters.get("since", "")
+                and ("until" not in filters or activity["timestamp"] < filters["until"]))
+    return matches
+
+
+# Global instance; shared between the worker processes of a multi-worker server
+task_store = TaskRepository(
+    hot_size=int(os.getenv("TASK_HOT_WINDOW", "256")),
+    shared=int(os.getenv("GROOT_WORKERS", "1")) > 1,
+    sync_interval=float(os.getenv("TASK_SYNC_INTERVAL", "1"))
+)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=task_store.after_fork)
@@ -0,0 +1,163 @@
+# src/utils/upload.py
+import base64
+import hashlib
+import json
+import os
+from typing import Any, Dict, IO, Iterator, Optional
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 64 * 1024
+MAX_FIELD_SIZE = 64 * 1024
+DEFAULT_TASK = "Analyze this file and provide insights"
+
+
+class UploadError(Exception):
+    """Raised for uploads that cannot be processed; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class Base64Encoder:
+    """Incremental base64: encodes whole 3-byte groups and carries the remainder over"""
+
+    def __init__(self):
+        self._tail = b""
+
+    def encode(self, data: bytes) -> bytes:
+        data = self._tail + data
+        cut = len(data) - len(data) % 3
+        self._tail = data[cut:]
+        return base64.b64encode(data[:cut])
+
+    def finish(self) -> bytes:
+        tail, self._tail = self._tail, b""
+        return base64.b64encode(tail)
+
+
+class StreamingUpload:
+    """
+    Single-file ``multipart/form-data`` upload read straight from the request stream
+
+    ``open`` parses up to the start of the ``file`` part (collecting any form
+    fields before it). ``json_chunks`` then yields the JSON request body for
+    the Puter API piece by piece, base64-encoding file data as it is read, so
+    memory stays at a few chunks regardless of the file size. Fields sent
+    after the file (the dashboard sends ``task`` last) are emitted at the end
+    of the body. The file content is hashed on the way through; ``complete``
+    turns true (and ``sha256``/``task`` become final) just before the last
+    chunk is yielded.
+    """
+
+    def __init__(self, stream: IO[bytes], content_type: str, max_bytes: int, chunk_size: int = CHUNK_SIZE):
+        mimetype, options = parse_options_header(content_type)
+        if mimetype != "multipart/form-data" or "boundary" not in options:
+            raise UploadError("Expected a multipart/form-data upload")
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size = 0
+        self.complete = False
+        self._hash = hashlib.sha256()
+        self._decoder = MultipartDecoder(options["boundary"].encode("latin-1"))
+        self._events = self._iter_events()
+
+    def open(self) -> None:
+        """Consume the stream up to the first byte of the file part"""
+        for event in self._events:
+            if isinstance(event, Field):
+                self.fields[event.name] = self._read_field()
+            elif isinstance(event, File):
+                if event.name != "file":
+                    raise UploadError(f"Unexpected file field '{event.name}'")
+                if not event.filename:
+                    raise UploadError("No file selected")
+                self.filename = event.filename
+                self.content_type = event.headers.get("Content-Type")
+                return
+        raise UploadError("No file provided")
+
+    @property
+    def sha256(self) -> str:
+        """Hex digest of the file content read so far"""
+        return self._hash.hexdigest()
+
+    @property
+    def task(self) -> str:
+        return self.fields.get("task") or DEFAULT_TASK
+
+    def json_chunks(self, extra: Dict[str, Any], metadata: Dict[str, Any]) -> Iterator[bytes]:
+        """
+        Yield the Puter ``process-file`` JSON body
+
+        Args:
+            extra: Top-level keys appended after the file (``task`` is filled
+                from the form if not given)
+            metadata: Keys added to the ``file`` object ahead of its content
+        """
+        head = json.dumps(metadata).encode("utf-8")[:-1] + (b", " if metadata else b"")
+        yield b'{"file": ' + head + b'"content": "'
+        encoder = Base64Encoder()
+        for data in self._file_data():
+            yield encoder.encode(data)
+        yield encoder.finish() + b'", "size": ' + str(self.size).encode("ascii") + b"}"
+
+        # Fields that follow the file part
+        for event in self._events:
+            if isinstance(event, Field):
+                self.fields[event.name] = self._read_field()
+
+        tail = dict(extra)
+        tail.setdefault("task", self.task)
+        self.complete = True
+        yield b", " + json.dumps(tail).encode("utf-8")[1:]
+
+    def _file_data(self) -> Iterator[bytes]:
+        for event in self._events:
+            if not isinstance(event, Data):
+                raise UploadError("Malformed multipart body")
+            self.size += len(event.data)
+            if self.size > self.max_bytes:
+                raise UploadError(f"File exceeds the {self.max_bytes / (1024 * 1024):g} MB upload limit", 413)
+            if event.data:
+                self._hash.update(event.data)
+                yield event.data
+            if not event.more_data:
+                return
+
+    def _read_field(self) -> str:
+        parts, size = [], 0
+        for event in self._events:
+            if not isinstance(event, Data):
+                raise UploadError("Malformed multipart body")
+            size += len(event.data)
+            if size > MAX_FIELD_SIZE:
+                raise UploadError("Form field too large", 413)
+            parts.append(event.data)
+            if not event.more_data:
+                break
+        return b"".join(parts).decode("utf-8", "replace")
+
+    def _iter_events(self):
+        while True:
+            try:
+                event = self._decoder.next_event()
+            except ValueError:
+                raise UploadError("Malformed multipart body")
+            if isinstance(event, NeedData):
+                self._decoder.receive_data(self.stream.read(self.chunk_size) or None)
+            elif isinstance(event, Epilogue):
+                return
+            else:
+                yield event
+
+
+def max_upload_bytes() -> int:
+    """Upload size cap from ``PUTER_MAX_UPLOAD_MB``"""
+    return int(float(os.getenv("PUTER_MAX_UPLOAD_MB", "25")) * 1024 * 1024)
@@ -0,0 +1,218 @@
+# src/utils/workflow.py
+import os
+import threading
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from utils.deadline import Deadline, current_deadline, deadline_scope
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowError(Exception):
+    """Raised for invalid workflows and for steps that fail"""
+
+    def __init__(self, message: str, step_id: Optional[str] = None):
+        super().__init__(message)
+        self.step_id = step_id
+
+
+class Step:
+    """
+    One agent step of a workflow
+
+    ``fn`` receives the results of ``deps`` keyed by step id (plus
+    ``on_chunk`` when ``stream`` is set) and returns the step's text.
+    """
+
+    __slots__ = ("id", "agent", "fn", "deps", "stream")
+
+    def __init__(self, id: str, agent: str, fn: Callable[..., str], deps: Sequence[str] = (),
+                 stream: bool = False):
+        self.id = id
+        self.agent = agent
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.stream = stream
+
+
+class Workflow:
+    """A validated DAG of steps; the result of the last step is the workflow's result"""
+
+    def __init__(self, name: str, steps: List[Step]):
+        self.name = name
+        self.steps = {step.id: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise WorkflowError("Duplicate step ids")
+        for step in steps:
+            for dep in step.deps:
+                if dep not in self.steps:
+                    raise WorkflowError(f"Step '{step.id}' depends on unknown step '{dep}'", step.id)
+        self.order = self._topological_order()
+        self.output = steps[-1].id
+        self.width = self._width()
+
+    def _topological_order(self) -> List[str]:
+        order, state = [], {}
+
+        def visit(step_id):
+            if state.get(step_id) == "done":
+                return
+            if state.get(step_id) == "visiting":
+                raise WorkflowError(f"Cycle through step '{step_id}'", step_id)
+            state[step_id] = "visiting"
+            for dep in self.steps[step_id].deps:
+                visit(dep)
+            state[step_id] = "done"
+            order.append(step_id)
+
+        for step_id in self.steps:
+            visit(step_id)
+        return order
+
+    def _width(self) -> int:
+        """Steps in the widest level of the DAG, i.e. how many can be ready at once"""
+        level: Dict[str, int] = {}
+        for step_id in self.order:
+            level[step_id] = max((level[dep] + 1 for dep in self.steps[step_id].deps), default=0)
+        counts: Dict[int, int] = {}
+        for depth in level.values():
+            counts[depth] = counts.get(depth, 0) + 1
+        return max(counts.values(), default=1)
+
+    def critical_path(self, durations: Dict[str, float]) -> float:
+        """Length of the longest dependency chain given per-step durations"""
+        finish: Dict[str, float] = {}
+        for step_id in self.order:
+            deps = self.steps[step_id].deps
+            finish[step_id] = max((finish[dep] for dep in deps), default=0.0) + durations.get(step_id, 0.0)
+        return max(finish.values(), default=0.0)
+
+
+class WorkflowExecutor:
+    """
+    Run workflows with every step starting as soon as its inputs resolve
+
+    Each run gets a pool as wide as its DAG (capped at ``max_parallel`` when
+    set), so independent steps run side by side and a workflow takes about
+    as long as its critical path; how many generations actually run at once
+    is left to the backend pool. Steps are not memoized here: their LLM calls
+    already go through ``response_cache``.
+    """
+
+    def __init__(self, max_parallel: Optional[int] = None):
+        self.max_parallel = max_parallel or None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.steps_run = 0
+
+    def run(self, workflow: Workflow, on_chunk: Optional[Callable[[str], None]] = None,
+            on_step: Optional[Callable[[str, Step, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Execute ``workflow``
+
+        Steps run under a deadline of their own that ends with the caller's,
+        so a failing step can interrupt the ones still running.
+
+        Args:
+            workflow: The DAG to run
+            on_chunk: Streaming callback handed to steps marked ``stream``
+            on_step: Called with ``(event, step, timing)`` where event is
+                ``started``, ``completed`` or ``failed``
+
+        Returns:
+            ``{"result", "results", "timings", "elapsed", "critical_path", "total_step_time"}``
+
+        Raises:
+            WorkflowError: When a step fails (running steps are cancelled)
+            Interrupted: When the caller's deadline ended first
+        """
+        with self._lock:
+            self.runs += 1
+        started = time.time()
+        results: Dict[str, str] = {}
+        timings: Dict[str, Dict[str, Any]] = {}
+        waiting = {step_id: set(step.deps) for step_id, step in workflow.steps.items()}
+        running = {}
+        parent = current_deadline()
+        deadline = Deadline(parent.seconds, parent.expires_at) if parent is not None else Deadline()
+        workers = min(workflow.width, self.max_parallel or workflow.width)
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="workflow")
+
+        def launch_ready():
+            for step_id in [step_id for step_id, deps in waiting.items() if not deps]:
+                del waiting[step_id]
+                step = workflow.steps[step_id]
+                inputs = {dep: results[dep] for dep in step.deps}
+                running[pool.submit(self._run_step, deadline, step, inputs, on_chunk, on_step, started)] = step
+
+        try:
+            with parent.watch(deadline.cancel) if parent is not None else nullcontext():
+                launch_ready()
+                while running:
+                    finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        step = running.pop(future)
+                        try:
+                            results[step.id], timings[step.id] = future.result()
+                        except Exception as e:
+                            deadline.cancel()
+                            if parent is not None:
+                                parent.check()
+                            raise WorkflowError(f"Step '{step.id}' failed: {str(e)}", step.id)
+                        for deps in waiting.values():
+                            deps.discard(step.id)
+                    launch_ready()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        durations = {step_id: timing["duration"] for step_id, timing in timings.items()}
+        return {
+            "result": results[workflow.output],
+            "results": results,
+            "timings": timings,
+            "elapsed": round(time.time() - started, 3),
+            "critical_path": round(workflow.critical_path(durations), 3),
+            "total_step_time": round(sum(durations.values()), 3),
+        }
+
+    def _run_step(self, deadline: Deadline, step: Step, inputs: Dict[str, str], on_chunk, on_step,
+                  workflow_started: float):
+        timing = {"agent": step.agent, "deps": list(step.deps),
+                  "started_at": round(time.time() - workflow_started, 3)}
+        if on_step is not None:
+            on_step("started", step, timing)
+        start = time.time()
+        try:
+            with deadline_scope(deadline):
+                deadline.check()
+                if step.stream and on_chunk is not None:
+                    result = step.fn(inputs, on_chunk=on_chunk)
+                else:
+                    result = step.fn(inputs)
+        except Exception:
+            timing["duration"] = round(time.time() - start, 3)
+            if on_step is not None:
+                on_step("failed", step, timing)
+            raise
+        timing["duration"] = round(time.time() - start, 3)
+        with self._lock:
+            self.steps_run += 1
+        if on_step is not None:
+            on_step("completed", step, timing)
+        return result, timing
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_parallel": self.max_parallel,
+                "runs": self.runs,
+                "steps_run": self.steps_run,
+            }
+
+
+# Global instance; WORKFLOW_MAX_PARALLEL caps the steps one workflow runs at once (0: the DAG's width)
+workflow_executor = WorkflowExecutor(max_parallel=int(os.getenv("WORKFLOW_MAX_PARALLEL", "0")))
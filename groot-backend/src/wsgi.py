@@ -0,0 +1,8 @@
+# src/wsgi.py
+"""WSGI entry point for production servers (see gunicorn.conf.py)"""
+from main import create_app, preload
+
+# Runs once in the server's master process when the app is preloaded; gunicorn.conf.py
+# recovers tasks left over from the previous run in its on_starting hook
+app = create_app(warmup=False, recover=False)
+preload()
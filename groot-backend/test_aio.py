@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Tests for the async Ollama client (run with: python -m pytest test_aio.py)"""
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.aio import AsyncRuntime, OllamaClient
+from utils.metrics import metrics
+from utils.backends import BackendPool
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._send(200, b"Ollama is running")
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/embed":
+            embeddings = [[0.5, len(text)] for text in payload["input"]]
+            self._send(200, json.dumps({"model": payload["model"], "embeddings": embeddings}).encode())
+        elif payload["prompt"] == "fail":
+            self._send(500, b"boom")
+        elif payload["stream"]:
+            lines = [{"response": word, "done": False} for word in ("a", "b", "c")]
+            lines.append({"response": "", "done": True, "eval_count": 3, "eval_duration": 500000000})
+            self._send(200, b"".join(json.dumps(line).encode() + b"\n" for line in lines))
+        else:
+            self._send(200, json.dumps({"response": "abc", "done": True}).encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    runtime = AsyncRuntime()
+    yield OllamaClient(runtime, BackendPool([f"http://127.0.0.1:{server.server_address[1]}"], check_interval=0))
+    runtime.close()
+    server.shutdown()
+
+
+def test_generate_without_streaming(client):
+    assert client.generate_sync({"model": "m", "prompt": "hi"}, timeout=5) == "abc"
+
+
+def test_generate_streams_chunks(client):
+    chunks = []
+    assert client.generate_sync({"model": "m", "prompt": "hi"}, timeout=5, on_chunk=chunks.append) == "abc"
+    assert chunks == ["a", "b", "c"]
+
+
+def test_embed(client):
+    assert client.embed_sync("four", "nomic-embed-text") == [0.5, 4]
+    assert client.runtime.run(client.embed_many(["a", "bb"], "nomic-embed-text")) == [[0.5, 1], [0.5, 2]]
+
+
+def test_http_errors_and_ping(client):
+    with pytest.raises(Exception, match="API Error 500"):
+        client.generate_sync({"model": "m", "prompt": "fail"}, timeout=5)
+    assert client.ping_sync() == 200
+
+
+def test_connection_refused_is_reported():
+    runtime = AsyncRuntime()
+    try:
+        with pytest.raises(Exception, match="Cannot connect to Ollama server"):
+            OllamaClient(runtime, BackendPool(["http://127.0.0.1:9"], check_interval=0)).generate_sync({"model": "m", "prompt": "hi"}, timeout=5)
+    finally:
+        runtime.close()
+
+
+def test_generations_are_measured_per_model_and_backend(client):
+    backend = client.pool.backends[0].url
+    client.generate_sync({"model": "timed", "prompt": "hi"}, timeout=5, on_chunk=lambda chunk: None)
+    with pytest.raises(Exception):
+        client.generate_sync({"model": "timed", "prompt": "fail"}, timeout=5)
+    text = metrics.render()
+    assert f'groot_llm_time_to_first_token_seconds_count{{model="timed",backend="{backend}"}} 1' in text
+    assert f'groot_llm_tokens_per_second_sum{{model="timed",backend="{backend}"}} 6' in text
+    assert f'groot_llm_requests_total{{model="timed",backend="{backend}",outcome="unavailable"}} 1' in text
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Tests for the Ollama backend pool (run with: python -m pytest test_backends.py)"""
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.aio import AsyncRuntime, OllamaClient
+from utils.backends import BackendPool, NoHealthyBackendError
+
+
+def make_stub(name, loaded):
+    class StubOllama(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/api/ps":
+                self._send(200, json.dumps({"models": [{"name": model} for model in loaded]}).encode())
+            else:
+                self._send(200, b"Ollama is running")
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self._send(200, json.dumps({"response": name, "done": True}).encode())
+
+        def _send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def hosts():
+    servers = [make_stub("one", ["llama3:latest"]), make_stub("two", ["mistral:latest"])]
+    runtime = AsyncRuntime()
+    yield runtime, [url for _, url in servers]
+    runtime.close()
+    for server, _ in servers:
+        server.shutdown()
+
+
+def test_least_outstanding_routing():
+    pool = BackendPool(["http://a", "http://b"], check_interval=0)
+    with pool.track(pool.choose()):
+        second = pool.choose()
+        assert second.url == "http://b"
+        with pool.track(second), pool.track(pool.choose()):
+            assert pool.choose().url == "http://b"
+    assert [backend.outstanding for backend in pool.backends] == [0, 0]
+
+
+def test_passive_ejection_and_readmission():
+    pool = BackendPool(["http://a", "http://b"], max_failures=2, eject_seconds=60, check_interval=0)
+    a = pool.backends[0]
+    pool.record_failure(a)
+    assert a.available(0) and pool.stats()["backends"][0]["healthy"]
+    pool.record_failure(a)
+    assert [backend.url for backend in pool.backends if backend.available(a.ejected_until - 1)] == ["http://b"]
+    assert pool.choose().url == "http://b"
+    a.ejected_until = 1.0  # ejection expired
+    pool.record_success(a, 0.1)
+    assert pool.choose(exclude={"http://b"}).url == "http://a"
+
+
+def test_no_healthy_backend():
+    pool = BackendPool(["http://a"], max_failures=1, check_interval=0)
+    pool.record_failure(pool.backends[0])
+    with pytest.raises(NoHealthyBackendError):
+        pool.choose()
+
+
+def test_active_check_learns_model_affinity(hosts):
+    runtime, urls = hosts
+    pool = BackendPool(urls, check_interval=0)
+    client = OllamaClient(runtime, pool)
+
+    async def probe():
+        return [await pool.check(runtime.http, backend) for backend in pool.backends]
+
+    assert runtime.run(probe()) == [True, True]
+    assert client.generate_sync({"model": "mistral", "prompt": "hi"}, timeout=5) == "two"
+    assert client.generate_sync({"model": "llama3", "prompt": "hi"}, timeout=5) == "one"
+
+
+def test_dead_backend_is_skipped_and_ejected(hosts):
+    runtime, urls = hosts
+    pool = BackendPool(["http://127.0.0.1:9", urls[0]], max_failures=1, check_interval=0)
+    client = OllamaClient(runtime, pool)
+    assert client.generate_sync({"model": "m", "prompt": "hi"}, timeout=5) == "one"
+    dead = pool.stats()["backends"][0]
+    assert not dead["healthy"] and dead["failures"] == 1
+    assert pool.backends[1].models == {"m:latest"}
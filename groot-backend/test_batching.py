@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Tests for embedding batching (run with: python -m pytest test_batching.py)"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.aio import AsyncRuntime
+from utils.batching import EmbeddingBatcher, GenerationBatcher
+
+
+class FakeClient:
+    """Stands in for ``OllamaClient``; records every ``/api/embed`` request"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.requests = []
+
+    async def embed(self, text, model, timeout=10):
+        return (await self.embed_many([text], model, timeout))[0]
+
+    async def embed_many(self, texts, model, timeout=10):
+        self.requests.append((model, list(texts)))
+        await asyncio.sleep(0.05)
+        if "fail" in texts:
+            raise Exception("boom")
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def runtime():
+    runtime = AsyncRuntime()
+    yield runtime
+    runtime.close()
+
+
+def embed_many(runtime, batcher, texts, model="m"):
+    async def many():
+        calls = [batcher.embed(text, model) for text in texts]
+        return await asyncio.gather(*calls, return_exceptions=True)
+    return runtime.run(many())
+
+
+def test_requests_in_window_share_one_call(runtime):
+    client = FakeClient(runtime)
+    batcher = EmbeddingBatcher(client, window=0.02, max_batch=8)
+    assert embed_many(runtime, batcher, ["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+    assert client.requests == [("m", ["a", "bb", "ccc"])]
+    assert batcher.stats()["mean_batch_size"] == 3
+
+
+def test_batches_are_split_by_model_and_size(runtime):
+    client = FakeClient(runtime)
+    batcher = EmbeddingBatcher(client, window=10, max_batch=2)
+    assert embed_many(runtime, batcher, ["a", "b", "c", "d"]) == [[1.0]] * 4
+    assert client.requests == [("m", ["a", "b"]), ("m", ["c", "d"])]
+
+    client.requests = []
+    batcher = EmbeddingBatcher(client, window=0.02, max_batch=8)
+
+    async def two_models():
+        return await asyncio.gather(batcher.embed("a", "m1"), batcher.embed("b", "m2"))
+
+    runtime.run(two_models())
+    assert sorted(client.requests) == [("m1", ["a"]), ("m2", ["b"])]
+
+
+def test_a_failed_call_fails_its_whole_batch(runtime):
+    batcher = EmbeddingBatcher(FakeClient(runtime), window=0.02, max_batch=8)
+    results = embed_many(runtime, batcher, ["a", "fail"])
+    assert [str(result) for result in results] == ["boom", "boom"]
+
+
+def test_disabled_batcher_sends_each_request(runtime):
+    client = FakeClient(runtime)
+    batcher = EmbeddingBatcher(client, window=0)
+    assert embed_many(runtime, batcher, ["a", "b"]) == [[1.0], [1.0]]
+    assert len(client.requests) == 2 and batcher.stats()["batches"] == 0
+
+
+def test_cancelled_callers_drop_their_requests(runtime):
+    client = FakeClient(runtime)
+    batcher = EmbeddingBatcher(client, window=0.02, max_batch=8)
+
+    async def cancel_one():
+        queued = asyncio.ensure_future(batcher.embed("a", "m"))
+        kept = asyncio.ensure_future(batcher.embed("bb", "m"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        return await kept
+
+    assert runtime.run(cancel_one()) == [2.0]
+    assert client.requests == [("m", ["bb"])]
+
+
+class FakeGenerator:
+    """Stands in for ``OllamaClient.generate``; answers packed prompts in JSON unless told to ramble"""
+
+    def __init__(self, runtime, malformed=False):
+        self.runtime = runtime
+        self.malformed = malformed
+        self.payloads = []
+
+    async def generate(self, payload, timeout, on_chunk=None):
+        self.payloads.append(payload)
+        await asyncio.sleep(0.02)
+        if payload.get("format") != "json":
+            return f"answer to {payload['prompt']}"
+        if self.malformed:
+            return "Sure! Here are the answers."
+        prompts = [part.split(":\n", 1)[1] for part in payload["prompt"].split("\n\nRequest ")[1:]]
+        return json.dumps({"answers": [f"answer to {prompt}" for prompt in prompts]})
+
+
+def generate_many(runtime, batcher, prompts, **options):
+    async def many():
+        calls = [batcher.generate(dict(options, model="m", prompt=prompt), timeout=30) for prompt in prompts]
+        return await asyncio.gather(*calls, return_exceptions=True)
+    return runtime.run(many())
+
+
+def test_short_prompts_are_packed_into_one_generation(runtime):
+    client = FakeGenerator(runtime)
+    batcher = GenerationBatcher(client, window=0.02, max_batch=4)
+    answers = generate_many(runtime, batcher, ["a", "b", "c"], num_predict=100)
+    assert answers == ["answer to a", "answer to b", "answer to c"]
+    assert len(client.payloads) == 1
+    assert client.payloads[0]["format"] == "json" and client.payloads[0]["num_predict"] == 300
+    assert batcher.stats()["mean_batch_size"] == 3
+
+
+def test_malformed_packed_reply_falls_back_to_one_call_per_prompt(runtime):
+    client = FakeGenerator(runtime, malformed=True)
+    batcher = GenerationBatcher(client, window=0.02, max_batch=4)
+    assert generate_many(runtime, batcher, ["a", "b"]) == ["answer to a", "answer to b"]
+    assert len(client.payloads) == 3 and batcher.stats()["fallbacks"] == 1
+
+
+def test_generations_are_off_by_default(runtime):
+    client = FakeGenerator(runtime)
+    batcher = GenerationBatcher(client)
+    assert generate_many(runtime, batcher, ["a", "b"]) == ["answer to a", "answer to b"]
+    assert len(client.payloads) == 2 and batcher.stats()["batches"] == 0
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Tests for the benchmark harness and its stub servers (run with: python -m pytest test_benchmark.py)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from benchmark import (StubConfig, StubOllamaHandler, StubPuterHandler, compare, percentile,
+                       run_load, server_url, start_stub, summarize)
+from utils.aio import AsyncRuntime, OllamaClient
+from utils.backends import BackendPool
+
+
+@pytest.fixture
+def runtime():
+    runtime = AsyncRuntime()
+    yield runtime
+    runtime.close()
+
+
+def test_stub_ollama_streams_tokens_at_the_configured_rate(runtime):
+    server = start_stub(StubOllamaHandler, StubConfig(latency=0, token_rate=1000, tokens=5))
+    try:
+        client = OllamaClient(runtime, BackendPool([server_url(server)], check_interval=0))
+        chunks = []
+        assert client.generate_sync({"model": "mistral", "prompt": "hi"}, 5, chunks.append) == "tok " * 5
+        assert len(chunks) == 5
+        assert client.generate_sync({"model": "mistral", "prompt": "hi", "num_predict": 2}, 5) == "tok " * 2
+    finally:
+        server.shutdown()
+
+
+def test_stub_error_rate_and_load_summary():
+    server = start_stub(StubPuterHandler, StubConfig(latency=0, error_rate=0.5, seed=7))
+    url = server_url(server)
+    try:
+        def call(session, n):
+            response = session.post(f"{url}/v1/ai/analyze", json={"text": str(n)}, timeout=5)
+            return response.status_code, response.status_code == 200
+
+        samples, elapsed = run_load(call, total=40, concurrency=4)
+    finally:
+        server.shutdown()
+    stats = summarize(samples, elapsed)
+    assert stats["requests"] == 40
+    assert 0 < stats["ok"] < 40 and stats["errors"] == 40 - stats["ok"]
+    assert stats["p50"] <= stats["p95"] <= stats["p99"] <= stats["max"]
+
+
+def test_percentile_and_baseline_comparison():
+    values = [float(n) for n in range(1, 101)]
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50.0, 95.0, 99.0)
+    assert percentile([], 95) == 0.0
+
+    baseline = {"tasks": {"p95": 1.0, "throughput": 10.0}, "history": {"p95": 0.01, "throughput": 500.0}}
+    current = {"tasks": {"p95": 1.3, "throughput": 9.0}, "history": {"p95": 0.011, "throughput": 300.0},
+               "puter-fast": {"p95": 9.0, "throughput": 1.0}}
+    assert compare(current, baseline, tolerance=0.2) == [
+        "tasks: p95 1.3s vs baseline 1.0s",
+        "history: throughput 300.0/s vs baseline 500.0/s",
+    ]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Tests for the LLM response cache (run with: python -m pytest test_cache.py)"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.cache import ResponseCache
+
+
+def test_key_depends_on_every_generation_parameter():
+    base = ResponseCache.make_key("mistral", "hi", 0.7, 200, {"main_gpu": 0})
+    assert base == ResponseCache.make_key("mistral", "hi", 0.7, 200, {"main_gpu": 0})
+    assert base != ResponseCache.make_key("llama3", "hi", 0.7, 200, {"main_gpu": 0})
+    assert base != ResponseCache.make_key("mistral", "hi", 0.2, 200, {"main_gpu": 0})
+    assert base != ResponseCache.make_key("mistral", "hi", 0.7, 300, {"main_gpu": 0})
+    assert base != ResponseCache.make_key("mistral", "hi", 0.7, 200, {"main_gpu": 1})
+
+
+def test_lru_eviction_and_counters():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # "b" is now least recently used
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+
+def test_character_budget_bounds_memory():
+    cache = ResponseCache(max_entries=10, max_chars=10)
+    cache.set("a", "x" * 6)
+    cache.set("b", "y" * 6)
+    assert cache.get("a") is None
+    assert cache.stats()["chars"] == 6
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttl=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_sqlite_backing_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(db_path=path).set("a", "persisted")
+    restarted = ResponseCache(db_path=path)
+    assert restarted.get("a") == "persisted"
+    assert restarted.stats()["entries"] == 1
+
+
+def test_sqlite_backing_is_bounded_by_size(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_chars=1000, db_path=path, table="analysis_cache", max_db_chars=10)
+    for key in "abc":
+        cache.set(key, key * 4)
+        time.sleep(0.01)
+    restarted = ResponseCache(db_path=path, table="analysis_cache")
+    assert restarted.get("a") is None
+    assert restarted.get("b") == "bbbb"
+    assert restarted.get("c") == "cccc"
+
+
+def test_sqlite_backing_opens_on_first_use(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = ResponseCache(db_path=str(path))
+    assert not path.exists()
+    assert cache.get("a") is None
+    assert path.exists()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_child_reopens_the_sqlite_backing(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    cache.set("a", "1")
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        parent_db = cache._db
+        cache.after_fork()
+        cache._entries.clear()
+        ok = cache.get("a") == "1" and cache._db is not parent_db
+        os.write(write, b"1" if ok else b"0")
+        os._exit(0)
+    os.close(write)
+    assert os.read(read, 1) == b"1"
+    os.waitpid(pid, 0)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Tests for task deadlines and cancellation (run with: python -m pytest test_deadline.py)"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.aio import AsyncRuntime, OllamaClient
+from utils.backends import BackendPool
+from utils.deadline import (Deadline, DeadlineExceeded, TaskCancelled, TaskDeadlines, current_deadline,
+                            deadline_scope)
+from utils.singleflight import SingleFlight
+from utils.workflow import Step, Workflow, WorkflowExecutor
+
+
+class SlowOllama(BaseHTTPRequestHandler):
+    """Streams one token every 50 ms for 10 seconds, noting when the client hangs up"""
+
+    disconnected = threading.Event()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.end_headers()
+        try:
+            for _ in range(200):
+                self.wfile.write(json.dumps({"response": "token ", "done": False}).encode() + b"\n")
+                self.wfile.flush()
+                time.sleep(0.05)
+        except (BrokenPipeError, ConnectionResetError):
+            SlowOllama.disconnected.set()
+
+
+@pytest.fixture
+def slow_client():
+    SlowOllama.disconnected.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    runtime = AsyncRuntime()
+    yield OllamaClient(runtime, BackendPool([f"http://127.0.0.1:{server.server_address[1]}"], check_interval=0))
+    runtime.close()
+    server.shutdown()
+
+
+def test_deadline_expires_and_cancel_wakes_watchers():
+    woken = []
+    deadline = Deadline(0.05)
+    deadline.check()
+    assert deadline.timeout(30) <= 0.05
+    time.sleep(0.06)
+    with pytest.raises(DeadlineExceeded, match="0.05s"):
+        deadline.check()
+    assert not deadline.cancel()
+
+    deadline = Deadline()
+    assert deadline.timeout(30) == 30
+    with deadline.watch(lambda: woken.append(True)):
+        assert deadline.cancel()
+    assert woken == [True]
+    with pytest.raises(TaskCancelled):
+        deadline.check()
+
+
+def test_runtime_run_gives_up_at_the_deadline():
+    runtime = AsyncRuntime()
+    aborted = threading.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            aborted.set()
+            raise
+
+    try:
+        started = time.time()
+        with deadline_scope(Deadline(0.1)):
+            with pytest.raises(DeadlineExceeded):
+                runtime.run(slow())
+        assert time.time() - started < 1
+        assert aborted.wait(1)
+    finally:
+        runtime.close()
+
+
+def test_cancel_aborts_the_ollama_stream(slow_client):
+    deadline = Deadline(30)
+    chunks = []
+
+    def on_chunk(chunk):
+        chunks.append(chunk)
+        if len(chunks) == 2:
+            threading.Thread(target=deadline.cancel).start()
+
+    started = time.time()
+    with deadline_scope(deadline), pytest.raises(TaskCancelled):
+        slow_client.generate_sync({"model": "m", "prompt": "hi"}, timeout=60, on_chunk=on_chunk)
+
+    assert time.time() - started < 2
+    assert SlowOllama.disconnected.wait(2)
+    assert slow_client.pool.backends[0].outstanding == 0
+
+
+def test_pool_threads_inherit_the_deadline():
+    deadline = Deadline(30)
+    seen = []
+    workflow = Workflow("w", [
+        Step("a", "Agent", lambda inputs: seen.append(current_deadline()) or "a"),
+        Step("b", "Agent", lambda inputs: seen.append(current_deadline()) or "b", deps=("a",)),
+    ])
+    with deadline_scope(deadline):
+        WorkflowExecutor(max_parallel=2).run(workflow)
+
+    assert all(step_deadline.expires_at == deadline.expires_at for step_deadline in seen)
+    assert current_deadline() is None
+
+
+def test_cancelled_leader_returns_while_its_followers_keep_streaming():
+    flights = SingleFlight()
+    leader_deadline = Deadline(30)
+    started, resumed, leader_returned = threading.Event(), threading.Event(), threading.Event()
+    chunks = {"leader": [], "follower": []}
+    results = {}
+    calls = []
+
+    def generate(emit):
+        calls.append(current_deadline())
+        emit("a")
+        started.set()
+        resumed.wait(2)
+        current_deadline().check()
+        emit("b")
+        return "ab"
+
+    def leader():
+        with deadline_scope(leader_deadline):
+            try:
+                flights.do("key", generate, chunks["leader"].append)
+            except TaskCancelled as e:
+                results["leader"] = e
+        leader_returned.set()
+
+    def follower():
+        with deadline_scope(Deadline(30)):
+            results["follower"] = flights.do("key", generate, chunks["follower"].append)
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    assert started.wait(1)
+    threads.append(threading.Thread(target=follower))
+    threads[1].start()
+    while flights.stats()["coalesced"] == 0:
+        time.sleep(0.001)
+    leader_deadline.cancel()
+    # The leader's worker is free before the shared generation finishes
+    assert leader_returned.wait(1) and not resumed.is_set()
+    resumed.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert isinstance(results["leader"], TaskCancelled)
+    assert chunks["leader"] == ["a"]
+    assert results["follower"] == "ab"
+    assert chunks["follower"] == ["a", "b"]
+    assert len(calls) == 1 and calls[0] is not leader_deadline
+
+
+def test_generation_stops_once_every_caller_is_interrupted():
+    flights = SingleFlight()
+    deadlines = [Deadline(30), Deadline(30)]
+    started, stopped = threading.Event(), threading.Event()
+    errors = []
+
+    def generate(emit):
+        started.set()
+        while current_deadline().reason is None:
+            time.sleep(0.01)
+        stopped.set()
+        current_deadline().check()
+
+    def caller(deadline):
+        with deadline_scope(deadline):
+            try:
+                flights.do("key", generate, lambda chunk: None)
+            except TaskCancelled as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=caller, args=(deadline,)) for deadline in deadlines]
+    threads[0].start()
+    started.wait(1)
+    threads[1].start()
+    time.sleep(0.05)
+    deadlines[0].cancel()
+    time.sleep(0.05)
+    assert not stopped.is_set()
+    deadlines[1].cancel()
+    for thread in threads:
+        thread.join(2)
+
+    assert stopped.wait(1)
+    assert len(errors) == 2
+    time.sleep(0.05)
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_extended_deadline_keeps_runtime_waiting():
+    runtime = AsyncRuntime()
+    shared = Deadline(0.1)
+    try:
+        threading.Timer(0.05, shared.extend_to, (Deadline(30),)).start()
+        with deadline_scope(shared):
+            assert runtime.run(asyncio.sleep(0.2, "done")) == "done"
+    finally:
+        runtime.close()
+
+
+def test_task_deadlines_count_interrupted_tasks():
+    deadlines = TaskDeadlines(default_seconds=30)
+    deadlines.open("done")
+    deadlines.open("cancelled")
+    deadlines.open("expired", 0.01)
+
+    assert deadlines.cancel("cancelled")
+    assert not deadlines.cancel("unknown")
+    time.sleep(0.02)
+    with pytest.raises(DeadlineExceeded):
+        deadlines.get("expired").check()
+
+    assert [deadlines.close(task_id) for task_id in ("done", "cancelled", "expired")] == [None, "cancelled", "expired"]
+    assert deadlines.stats() == {"default_seconds": 30, "active": 0, "cancelled": 1, "expired": 1}
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Tests for the dashboard event stream (run with: python -m pytest test_events.py)"""
+import json
+import os
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.events import EventBus, EventRelay
+from utils.registry import AgentRegistry
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def frames(iterator, count):
+    out = []
+    for frame in iterator:
+        if frame.startswith(":"):
+            continue
+        fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+        out.append((fields["event"], int(fields["id"]), json.loads(fields["data"])))
+        if len(out) == count:
+            return out
+
+
+def test_snapshot_then_deltas():
+    bus = EventBus()
+    bus.publish("agent", {"id": "a", "status": "idle"}, key="a")
+    stream = bus.iter_events(snapshot=lambda: {"agents": ["a"]}, heartbeat=0.01)
+    assert frames(stream, 1) == [("snapshot", 1, {"agents": ["a"]})]
+
+    bus.publish("task", {"id": "t", "progress": 10}, key="t")
+    bus.publish("activity", {"action": "started"})
+    assert frames(stream, 2) == [
+        ("task", 2, {"id": "t", "progress": 10}),
+        ("activity", 3, {"action": "started"}),
+    ]
+    assert bus.stats()["clients"] == 1
+    stream.close()
+    assert bus.stats()["clients"] == 0
+
+
+def test_resume_skips_snapshot_and_replays_missed_events():
+    bus = EventBus()
+    for progress in (10, 20, 30):
+        bus.publish("task", {"progress": progress}, key="t")
+    stream = bus.iter_events(last_event_id=1, snapshot=lambda: {"never": True}, heartbeat=0.01)
+    assert [data["progress"] for _, _, data in frames(stream, 2)] == [20, 30]
+
+
+def test_reset_when_resuming_beyond_the_backlog():
+    bus = EventBus(backlog=2)
+    for progress in range(5):
+        bus.publish("task", {"progress": progress}, key="t")
+    stream = bus.iter_events(last_event_id=1, snapshot=lambda: {"state": "fresh"}, heartbeat=0.01)
+    assert frames(stream, 1) == [("snapshot", 5, {"state": "fresh"})]
+    assert bus.stats()["resets"] == 1
+
+
+def test_resume_reads_only_the_missed_events_after_the_ring_wraps():
+    bus = EventBus(backlog=3)
+    for progress in range(7):
+        bus.publish("task", {"progress": progress}, key="t")
+    stream = bus.iter_events(last_event_id=5, snapshot=lambda: {"never": True}, heartbeat=0.01)
+    assert frames(stream, 2) == [("task", 6, {"progress": 5}), ("task", 7, {"progress": 6})]
+    bus.publish("task", {"progress": 7}, key="t")
+    assert frames(stream, 1) == [("task", 8, {"progress": 7})]
+
+
+def test_lagging_client_gets_merged_latest_state_per_entity():
+    bus = EventBus(coalesce_after=2)
+    stream = bus.iter_events(snapshot=dict, heartbeat=0.01)
+    frames(stream, 1)
+    bus.publish("task", {"status": "processing", "progress": 0}, key="t")
+    bus.publish("activity", {"action": "working"})
+    for progress in (25, 50, 75):
+        bus.publish("task", {"progress": progress}, key="t")
+    received = frames(stream, 2)
+    assert received == [
+        ("activity", 2, {"action": "working"}),
+        ("task", 5, {"status": "processing", "progress": 75}),
+    ]
+    assert bus.stats()["coalesced"] == 3
+
+
+def test_channel_filter():
+    bus = EventBus()
+    stream = bus.iter_events(last_event_id=0, channels=["task"], heartbeat=0.01)
+    bus.publish("agent", {"id": "a"}, key="a")
+    bus.publish("task", {"id": "t"}, key="t")
+    assert frames(stream, 1) == [("task", 2, {"id": "t"})]
+
+
+def test_heartbeat_while_idle():
+    bus = EventBus()
+    stream = bus.iter_events(last_event_id=0, heartbeat=0.01)
+    assert next(stream) == ": keep-alive\n\n"
+
+
+def test_relay_carries_events_between_processes(tmp_path):
+    path = str(tmp_path / "events.db")
+    first = EventBus(relay=EventRelay(path, interval=0.01))
+    second = EventBus(relay=EventRelay(path, interval=0.01))
+    stream = second.iter_events(channels=["task"], snapshot=dict, heartbeat=0.05)
+    frames(stream, 1)
+    time.sleep(0.05)
+
+    first.publish("task", {"id": "t", "status": "completed"}, key="t")
+    assert frames(stream, 1) == [("task", 1, {"id": "t", "status": "completed"})]
+    assert second.stats()["relay"]["relayed"] == 1
+    wait_for(lambda: first.last_event_id == 1)
+    assert first.last_event_id == 1
+
+
+def test_reconnecting_to_another_worker_resumes_at_the_same_event(tmp_path):
+    path = str(tmp_path / "events.db")
+    first = EventBus(relay=EventRelay(path, interval=0.01))
+    second = EventBus(relay=EventRelay(path, interval=0.01))
+    stream = first.iter_events(snapshot=dict, heartbeat=0.05)
+    frames(stream, 1)
+    second.iter_events(snapshot=dict, heartbeat=0.05)
+    for progress in (10, 20, 30):
+        second.publish("task", {"progress": progress}, key="t")
+    seen = frames(stream, 1)
+    stream.close()
+    wait_for(lambda: second.last_event_id == first.last_event_id == 3)
+
+    # The browser reconnects to the other worker with the id of the last event it saw
+    resumed = second.iter_events(last_event_id=seen[-1][1], snapshot=lambda: {"never": True}, heartbeat=0.05)
+    assert [(event_id, data["progress"]) for _, event_id, data in frames(resumed, 2)] == [(2, 20), (3, 30)]
+    assert second.stats()["resets"] == 0
+
+
+def test_dashboard_stream_resumes_after_reconnect():
+    agents = pytest.importorskip("routes.agents")
+    app = Flask(__name__)
+    app.register_blueprint(agents.agents_bp, url_prefix="/api")
+    client = app.test_client()
+    agent = agents.agent_registry.list_agents()[0]["id"]
+
+    def read(last_event_id, count):
+        response = client.get("/api/events?channels=agent", headers={"Last-Event-ID": str(last_event_id)},
+                              buffered=False)
+        try:
+            return frames((chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in response.response),
+                          count)
+        finally:
+            response.close()
+
+    start = agents.event_bus.last_event_id
+    agents.agent_registry.set_status(agent, "busy")
+    agents.agent_registry.set_status(agent, "idle")
+    first, second = read(start, 2)
+    assert first[0] == second[0] == "agent" and second[2]["agent"]["status"] == "idle"
+
+    agents.agent_registry.set_status(agent, "error")
+    resumed = read(first[1], 2)
+    assert [data["agent"]["status"] for _, _, data in resumed] == ["idle", "error"]
+    assert resumed[0][1] == second[1]
+
+
+def test_agent_changes_reach_listeners():
+    seen = []
+    registry = AgentRegistry([{"id": "a1", "name": "A", "type": "research"}])
+    registry.add_listener(lambda event: seen.append((event["type"], event["agent"]["status"])))
+    registry.set_status("a1", "busy")
+    registry.set_status("a1", "busy")
+    assert seen == [("status_changed", "busy")]
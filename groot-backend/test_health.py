@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Tests for health monitoring and circuit breaking (run with: python -m pytest test_health.py)"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.aio import AsyncRuntime, OllamaClient
+from utils.backends import BackendPool
+from utils.circuit import CircuitBreaker, CircuitOpenError
+from utils.health import HealthMonitor
+
+
+@pytest.fixture
+def runtime():
+    runtime = AsyncRuntime()
+    yield runtime
+    runtime.close()
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_timeout():
+    breaker = CircuitBreaker("x", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.is_open
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert not breaker.is_open
+    assert breaker.allow()        # the single trial call
+    assert not breaker.allow()    # everyone else still fails fast
+    assert breaker.state == "half_open"
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.to_dict()["trips"] == 1
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker("x", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_monitor_caches_probe_results_and_feeds_the_breaker(runtime):
+    calls = []
+    healthy = [True]
+
+    async def check():
+        calls.append(1)
+        return healthy[0], "ok" if healthy[0] else "down"
+
+    breaker = CircuitBreaker("svc", failure_threshold=2, reset_timeout=60)
+    monitor = HealthMonitor(runtime, interval=0, ttl=60)
+    monitor.register("svc", check, breaker)
+    assert monitor.available("svc")             # unknown status does not block
+    assert monitor.status("svc")["healthy"] is None
+
+    runtime.run(monitor.probe("svc"))
+    assert monitor.available("svc") and monitor.status("svc")["detail"] == "ok"
+    healthy[0] = False
+    runtime.run(monitor.probe("svc"))
+    assert not monitor.available("svc")
+    runtime.run(monitor.probe("svc"))
+    assert monitor.status("svc")["circuit"]["state"] == "open"
+
+    for _ in range(10):
+        monitor.available("svc")
+    assert len(calls) == 3
+
+
+def test_probe_errors_and_timeouts_count_as_unreachable(runtime):
+    async def hang():
+        await asyncio.sleep(5)
+
+    monitor = HealthMonitor(runtime, interval=0, timeout=0.05)
+    monitor.register("slow", hang, CircuitBreaker("slow"))
+    runtime.run(monitor.probe("slow"))
+    status = monitor.status("slow")
+    assert status["healthy"] is False and status["detail"] == "unreachable"
+
+
+def test_ollama_client_fails_fast_while_open(runtime):
+    breaker = CircuitBreaker("ollama", failure_threshold=1, reset_timeout=60)
+    client = OllamaClient(runtime, BackendPool(["http://127.0.0.1:9"], check_interval=0), breaker)
+    with pytest.raises(Exception, match="Cannot connect to Ollama server"):
+        client.generate_sync({"model": "m", "prompt": "hi"}, timeout=5)
+    with pytest.raises(CircuitOpenError):
+        client.generate_sync({"model": "m", "prompt": "hi"}, timeout=5)
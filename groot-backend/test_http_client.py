@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Tests for the shared HTTP client (run with: python -m pytest test_http_client.py)"""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.aio import AsyncRuntime
+from utils.http_client import HostPolicy, HttpClient, RetryBudget, policy_from_env
+
+
+class FlakyServer(BaseHTTPRequestHandler):
+    """Answers 503 to the first request for ``/flaky`` and 200 to everything else"""
+
+    protocol_version = "HTTP/1.1"
+    calls = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        count = FlakyServer.calls[self.path] = FlakyServer.calls.get(self.path, 0) + 1
+        status = 503 if self.path == "/flaky" and count == 1 else 200
+        body = f"{self.path} {count}".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+
+@pytest.fixture
+def server_url():
+    FlakyServer.calls = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def make_runtime(max_retries=2, retry_ratio=0.2, retry_min_per_second=1.0):
+    http = HttpClient(
+        {"test": HostPolicy("test", max_retries=max_retries, retry_backoff=0.001)},
+        retry_ratio=retry_ratio, retry_min_per_second=retry_min_per_second
+    )
+    return AsyncRuntime(http)
+
+
+def fetch(runtime, method, url, **kwargs):
+    async def go():
+        async with runtime.http.request("test", method, url, **kwargs) as response:
+            return response.status, await response.text()
+    return runtime.run(go())
+
+
+def test_retry_budget_is_a_fraction_of_requests():
+    budget = RetryBudget(ratio=0.5, min_per_second=0)
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.record_request()
+
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+    assert budget.stats() == {"retries": 2, "denied": 2}
+
+
+def test_keep_alive_connections_are_reused(server_url):
+    runtime = make_runtime()
+    try:
+        for _ in range(3):
+            assert fetch(runtime, "GET", f"{server_url}/ok")[0] == 200
+        stats = runtime.http.stats()["test"]
+    finally:
+        runtime.close()
+
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 2
+    assert stats["reuse_ratio"] == 0.667
+
+
+def test_idempotent_requests_retry_on_unavailable(server_url):
+    runtime = make_runtime()
+    try:
+        assert fetch(runtime, "GET", f"{server_url}/flaky") == (200, "/flaky 2")
+        assert fetch(runtime, "POST", f"{server_url}/flaky")[0] == 200
+        assert runtime.http.stats()["test"]["retries"] == 1
+    finally:
+        runtime.close()
+
+
+def test_writes_are_not_retried_after_reaching_the_server(server_url):
+    runtime = make_runtime()
+    try:
+        FlakyServer.calls["/flaky"] = 0
+        assert fetch(runtime, "POST", f"{server_url}/flaky")[0] == 503
+        assert runtime.http.stats()["test"]["retries"] == 0
+    finally:
+        runtime.close()
+
+
+def test_refused_connections_stop_when_the_budget_is_spent():
+    runtime = make_runtime(max_retries=5, retry_ratio=0, retry_min_per_second=0.2)
+    try:
+        with pytest.raises(Exception):
+            fetch(runtime, "POST", "http://127.0.0.1:9/")
+        stats = runtime.http.stats()["test"]
+    finally:
+        runtime.close()
+
+    # 0.2 retries per second over the 10 second window
+    assert stats["retries"] == 2
+    assert stats["denied"] == 1
+
+
+def test_policy_from_env_prefers_upstream_settings(monkeypatch):
+    monkeypatch.setenv("HTTP_MAX_PER_HOST", "7")
+    monkeypatch.setenv("HTTP_PUTER_MAX_PER_HOST", "3")
+    monkeypatch.setenv("HTTP_PUTER_KEEPALIVE", "90")
+
+    puter = policy_from_env("puter", max_per_host=20, keepalive=30.0)
+    ollama = policy_from_env("ollama")
+
+    assert (puter.max_per_host, puter.keepalive) == (3, 90.0)
+    assert ollama.max_per_host == 7
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from importtime import SRC_DIR, package_totals, parse_importtime, total_us
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   _io
+import time:       300 |        300 |     aiohttp.helpers
+import time:       200 |        500 |   aiohttp
+import time:      1000 |       1600 | utils.aio
+import time:        50 |         50 | json
+"""
+
+
+def test_parse_importtime_reads_depth_and_timings():
+    records = parse_importtime(SAMPLE)
+
+    assert [record.module for record in records] == ["_io", "aiohttp.helpers", "aiohttp", "utils.aio", "json"]
+    assert [record.depth for record in records] == [1, 2, 1, 0, 0]
+    assert records[3].self_us == 1000 and records[3].cumulative_us == 1600
+
+
+def test_totals_count_top_level_imports_and_group_packages():
+    records = parse_importtime(SAMPLE)
+
+    assert total_us(records) == 1650
+    assert package_totals(records) == {"utils": 1000, "aiohttp": 500, "_io": 100, "json": 50}
+
+
+def test_heavy_clients_are_not_imported_at_startup():
+    code = (
+        "import sys\n"
+        "import utils.health, utils.batching, utils.mapreduce, utils.workflow, utils.puter\n"
+        "print(sorted(m for m in ('aiohttp', 'requests', 'tiktoken') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Tests for token counting helpers (run with: python -m pytest test_llm.py)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils import llm
+
+
+class FakeEncoding:
+    """One token per whitespace separated word"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text, disallowed_special=()):
+        self.calls += 1
+        return text.split()
+
+    def encode_batch(self, texts, disallowed_special=()):
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def encoding(monkeypatch):
+    fake = FakeEncoding()
+    monkeypatch.setattr(llm, "get_encoding", lambda model=llm.DEFAULT_TOKEN_MODEL: fake)
+    return fake
+
+
+def test_count_tokens_and_batch(encoding):
+    assert llm.count_tokens("a b c") == 3
+    assert llm.count_tokens_many(["a", "a b", ""]) == [1, 2, 0]
+
+
+def test_limit_check_skips_encoding_when_length_decides(encoding):
+    assert llm.check_token_limit("a " * 10, 100) == (True, None)
+    assert llm.check_token_limit("é" * 45, 100) == (True, None)
+    assert llm.check_token_limit("a" * 1201, 100) == (False, None)
+    assert encoding.calls == 0
+
+
+def test_limit_check_encodes_inconclusive_lengths(encoding):
+    assert llm.check_token_limit("ab " * 50, 100) == (True, 50)
+    assert llm.check_token_limit("ab " * 150, 100) == (False, 150)
+    # Inside the band: a single 1200 character word is still encoded
+    assert llm.check_token_limit("a" * 1200, 100) == (True, 1)
+    assert encoding.calls == 3
+
+
+def test_split_by_tokens_overlaps_on_token_boundaries(encoding):
+    words = " ".join(str(n) for n in range(10))
+    assert llm.split_by_tokens(words, 4, overlap=1) == ["0 1 2 3", "3 4 5 6", "6 7 8 9"]
+    assert llm.split_by_tokens(words, 20) == [words]
+    with pytest.raises(ValueError):
+        llm.split_by_tokens(words, 4, overlap=4)
+
+
+def test_fallback_estimate_without_encoding(monkeypatch):
+    monkeypatch.setattr(llm, "get_encoding", lambda model=llm.DEFAULT_TOKEN_MODEL: None)
+    assert llm.count_tokens("x" * 40) == 10
+    assert llm.count_tokens_many(["x" * 8, ""]) == [2, 0]
+    assert llm.split_by_tokens("x" * 20, 2, overlap=1) == ["x" * 8] * 4
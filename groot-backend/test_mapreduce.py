@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Tests for long-input map-reduce (run with: python -m pytest test_mapreduce.py)"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils import llm, mapreduce
+from utils.mapreduce import MapReduce
+
+
+class WordEncoding:
+    """One token per whitespace separated word"""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def words(monkeypatch):
+    encoding = WordEncoding()
+    monkeypatch.setattr(llm, "get_encoding", lambda model=llm.DEFAULT_TOKEN_MODEL: encoding)
+
+
+class FakeModel:
+    """Answers map prompts with a short note and tracks how many calls overlap"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, on_chunk=None):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        if prompt.startswith("A request was too long"):
+            if on_chunk is not None:
+                on_chunk("final")
+            return "final"
+        return f"note{len(self.prompts)}"
+
+
+def test_short_prompts_fit():
+    runner = MapReduce(max_prompt_tokens=100, chunk_tokens=50, overlap=0, head_tokens=10)
+    assert runner.fits("word " * 20)
+    assert not runner.fits("word " * 150)
+
+
+def test_chunks_run_concurrently_up_to_the_cap_and_reduce_streams():
+    runner = MapReduce(max_prompt_tokens=200, chunk_tokens=40, overlap=5, head_tokens=10, max_parallel=3)
+    model = FakeModel()
+    progress, streamed = [], []
+    prompt = " ".join(f"w{n}" for n in range(400))
+
+    result = runner.run(prompt, model, on_chunk=streamed.append,
+                        on_progress=lambda *event: progress.append(event))
+
+    assert result == "final" and streamed == ["final"]
+    maps = [p for p in model.prompts if p.startswith("The request below")]
+    assert len(maps) == 12                    # ceil((400 - 5) / 35)
+    assert model.peak == 3
+    assert progress[0] == ("map", 0, 12)
+    assert ("map", 12, 12) in progress
+    assert progress[-1] == ("reduce", 1, 1)
+    assert runner.stats()["chunks_processed"] == 12
+
+
+def test_long_partials_are_reduced_in_another_round():
+    runner = MapReduce(max_prompt_tokens=60, chunk_tokens=40, overlap=0, head_tokens=5, max_parallel=4)
+
+    def verbose(prompt, on_chunk=None):
+        if prompt.startswith("A request was too long"):
+            return "final"
+        return "lots of words " * 3
+
+    assert runner.run("a " * 200, verbose) == "final"
+
+
+def test_chunk_failures_propagate():
+    runner = MapReduce(max_prompt_tokens=100, chunk_tokens=40, overlap=0, head_tokens=5, max_parallel=2)
+
+    def failing(prompt, on_chunk=None):
+        raise Exception("LLM Error: boom")
+
+    with pytest.raises(Exception, match="boom"):
+        runner.run("a " * 200, failing)
+
+
+def test_global_instance_is_configured():
+    assert mapreduce.map_reduce.max_parallel >= 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Tests for the metrics registry (run with: python -m pytest test_metrics.py)"""
+import os
+import sys
+import threading
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.metrics import MetricsRegistry, SharedMetrics
+
+
+def sample_lines(registry):
+    return [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+
+def test_counter_sums_shards_of_every_thread():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs", "Jobs", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            counter.labels("a").inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.labels("b").inc(2.5)
+    assert sample_lines(registry) == ['jobs_total{kind="a"} 8000', 'jobs_total{kind="b"} 2.5']
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert sample_lines(registry) == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_callbacks_labels_and_escaping():
+    registry = MetricsRegistry()
+    registry.callback("depth", "Depth", lambda: {("x\"y",): 3, ("z",): True}, ("lane",))
+    registry.callback("hits", "Hits", lambda: 7, kind="counter")
+    registry.callback("broken", "Broken", lambda: 1 / 0)
+    assert sample_lines(registry) == ['depth{lane="x\\"y"} 3', 'depth{lane="z"} 1', "hits_total 7"]
+
+
+def test_registration_is_idempotent_but_checked():
+    registry = MetricsRegistry()
+    assert registry.counter("c", "C", ("a",)) is registry.counter("c", "C", ("a",))
+    with pytest.raises(ValueError):
+        registry.histogram("c", "C", ("a",))
+    with pytest.raises(ValueError):
+        registry.get("c").labels("1", "2")
+
+
+def test_shared_metrics_add_up_every_process(tmp_path):
+    registries = [MetricsRegistry(SharedMetrics(str(tmp_path / "metrics.db"))) for _ in range(2)]
+    for n, registry in enumerate(registries, start=1):
+        registry.counter("jobs", "Jobs").inc(n)
+        registry.callback("healthy", "Healthy", lambda: {("a",): 1}, ("host",), merge="max")
+        registry.callback("depth", "Depth", lambda n=n: n)
+    registries[0].render()
+
+    assert sample_lines(registries[1]) == ["jobs_total 3", 'healthy{host="a"} 1', "depth 3"]
+
+
+def test_flask_requests_are_timed_by_route_template():
+    registry = MetricsRegistry()
+    app = Flask(__name__)
+    registry.init_app(app)
+
+    @app.route("/items/<item_id>")
+    def item(item_id):
+        return item_id
+
+    client = app.test_client()
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+    lines = sample_lines(registry)
+    assert 'groot_http_request_duration_seconds_count{method="GET",route="/items/<item_id>",status="200"} 2' in lines
+    assert 'groot_http_request_duration_seconds_count{method="GET",route="unmatched",status="404"} 1' in lines
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Tests for listing pagination helpers (run with: python -m pytest test_pagination.py)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.pagination import (InvalidQueryError, decode_cursor, encode_cursor, make_etag,
+                              parse_fields, parse_filters, parse_limit, project, MAX_PAGE_SIZE)
+
+
+def test_cursor_round_trip():
+    position = ("2026-01-01T00:00:00Z", "abc")
+    assert decode_cursor(encode_cursor(position)) == position
+    assert decode_cursor(None) is None
+    with pytest.raises(InvalidQueryError):
+        decode_cursor("not-a-cursor")
+
+
+def test_limit_is_clamped():
+    assert parse_limit(None) == 50
+    assert parse_limit("0") == 1
+    assert parse_limit("100000") == MAX_PAGE_SIZE
+    with pytest.raises(InvalidQueryError):
+        parse_limit("ten")
+
+
+def test_projection_and_filters():
+    fields = parse_fields("id, task,,status")
+    assert fields == ["id", "task", "status"]
+    assert project({"id": 1, "task": "t", "result": "big"}, fields) == {"id": 1, "task": "t"}
+    assert project({"id": 1}, None) == {"id": 1}
+    assert parse_filters({"status": "failed", "agent": "", "other": "x"}, ("status", "agent")) == {"status": "failed"}
+
+
+def test_etag_changes_with_version_and_query():
+    assert make_etag(1, "/api/history?limit=2") == make_etag(1, "/api/history?limit=2")
+    assert make_etag(1, "/api/history?limit=2") != make_etag(2, "/api/history?limit=2")
+    assert make_etag(1, "/api/history?limit=2") != make_etag(1, "/api/history?limit=3")
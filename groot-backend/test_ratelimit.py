@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Tests for per-client rate limiting (run with: python -m pytest test_ratelimit.py)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.ratelimit import (MemoryBucketStore, RateLimit, RateLimiter, SQLiteBucketStore,
+                             client_id, parse_rate)
+
+
+def test_parse_rate():
+    assert parse_rate("30/minute") == RateLimit(30, 60.0)
+    assert parse_rate("5/10") == RateLimit(5, 10.0)
+    assert parse_rate("") is None and parse_rate("0") is None
+    with pytest.raises(ValueError):
+        parse_rate("ten/minute")
+
+
+def test_client_id_ignores_unauthenticated_identity_headers():
+    assert client_id("10.0.0.1") == "ip:10.0.0.1"
+    assert client_id(None) == "ip:unknown"
+
+
+def test_bucket_allows_a_burst_then_refills():
+    store, limit = MemoryBucketStore(), RateLimit(2, 10.0)
+
+    assert [store.take("k", limit, 100.0)[0] for _ in range(3)] == [True, True, False]
+    assert store.take("k", limit, 104.0)[0] is False
+    assert store.take("k", limit, 105.0)[0] is True
+    assert store.take("other", limit, 105.0)[0] is True
+
+
+def test_sqlite_buckets_are_shared_between_stores(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second, limit = SQLiteBucketStore(path), SQLiteBucketStore(path), RateLimit(3, 60.0)
+
+    assert first.take("k", limit, 100.0) == (True, 2.0)
+    assert second.take("k", limit, 100.0) == (True, 1.0)
+    assert first.take("k", limit, 100.0) == (True, 0.0)
+    assert second.take("k", limit, 100.0)[0] is False
+
+
+def test_limiter_reports_retry_after_per_route_and_client():
+    limiter = RateLimiter({"tasks": RateLimit(1, 30.0), "puter": None})
+
+    assert limiter.check("tasks", "alice").allowed
+    denied = limiter.check("tasks", "alice")
+    assert not denied.allowed and denied.remaining == 0 and 29 <= denied.retry_after <= 30
+    assert limiter.check("tasks", "bob").allowed
+    assert limiter.check("puter", "alice") is None
+    assert limiter.stats()["limited"] == 1
+
+
+def test_store_failures_let_requests_through():
+    class BrokenStore(MemoryBucketStore):
+        def take(self, key, limit, now):
+            raise RuntimeError("database is locked")
+
+    limiter = RateLimiter({"tasks": RateLimit(1, 30.0)}, BrokenStore())
+    assert limiter.check("tasks", "alice") is None
+    assert limiter.stats()["errors"] == 1
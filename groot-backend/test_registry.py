@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Tests for the agent registry (run with: python -m pytest test_registry.py)"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.registry import AgentRegistry, UnknownAgentError
+
+TEMPLATES = [
+    {"id": "research-001", "name": "Research Agent", "status": "idle", "type": "research",
+     "description": "Gathers information", "capabilities": ["Data Analysis"]},
+    {"id": "content-001", "name": "Content Agent", "status": "idle", "type": "content",
+     "description": "Writes", "capabilities": ["Writing"]},
+]
+
+
+def test_lookup_by_id_or_name_without_touching_templates():
+    registry = AgentRegistry(TEMPLATES)
+    registry.set_status("Research Agent", "active")
+    assert registry.get("research-001")["status"] == "active"
+    assert TEMPLATES[0]["status"] == "idle"
+    with pytest.raises(UnknownAgentError):
+        registry.get("nobody")
+    with pytest.raises(ValueError):
+        registry.set_status("research-001", "sleeping")
+
+
+def test_counts_follow_transitions():
+    registry = AgentRegistry(TEMPLATES)
+    assert (registry.count("idle"), registry.count("active"), len(registry)) == (2, 0, 2)
+    assert registry.set_status("content-001", "active") == "idle"
+    assert not registry.compare_and_set("content-001", "idle", "busy")
+    assert registry.compare_and_set("content-001", "active", "busy")
+    assert (registry.count("idle"), registry.count("busy")) == (1, 1)
+
+
+def test_acquire_release_is_atomic_under_contention():
+    registry = AgentRegistry(TEMPLATES)
+
+    def work():
+        for _ in range(200):
+            registry.acquire("Research Agent")
+            registry.release("Research Agent")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.get("Research Agent")["status"] == "idle"
+    assert registry.count("idle") == 2 and registry.count("active") == 0
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Tests for the task scheduler (run with: python -m pytest test_scheduler.py)"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.scheduler import QueueFullError, ShuttingDownError, TaskScheduler, _weights_from_env
+
+
+def wait_for(scheduler, completed, timeout=5):
+    deadline = time.time() + timeout
+    while scheduler.stats()["completed"] < completed and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_queue_full_is_rejected():
+    release = threading.Event()
+    scheduler = TaskScheduler(max_concurrency=1, max_queue=1)
+    scheduler.submit(release.wait)
+    time.sleep(0.05)
+    scheduler.submit(release.wait)
+    with pytest.raises(QueueFullError) as error:
+        scheduler.submit(release.wait)
+    release.set()
+
+    assert error.value.queue_depth == 1
+    assert error.value.retry_after >= 1
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_interactive_jobs_go_first_without_starving_batch():
+    order = []
+    release = threading.Event()
+    scheduler = TaskScheduler(max_concurrency=1, max_queue=16, batch_every=3)
+    scheduler.submit(release.wait)
+    time.sleep(0.05)
+    for n in range(2):
+        scheduler.submit(order.append, f"batch-{n}", priority="batch")
+    for n in range(4):
+        scheduler.submit(order.append, f"interactive-{n}")
+    with pytest.raises(ValueError):
+        scheduler.submit(order.append, "x", priority="urgent")
+    release.set()
+    wait_for(scheduler, 7)
+
+    assert order == ["interactive-0", "batch-0", "interactive-1", "interactive-2", "batch-1", "interactive-3"]
+
+
+def test_running_jobs_never_exceed_the_worker_count():
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def job():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    scheduler = TaskScheduler(max_concurrency=2, max_queue=16)
+    for _ in range(6):
+        scheduler.submit(job)
+    wait_for(scheduler, 6)
+
+    assert peak[0] == 2
+    assert scheduler.stats()["max_concurrency"] == 2
+
+
+def test_drain_finishes_queued_work_and_refuses_new_jobs():
+    done = []
+    scheduler = TaskScheduler(max_concurrency=1, max_queue=8)
+    for n in range(3):
+        scheduler.submit(lambda n=n: (time.sleep(0.02), done.append(n)))
+    assert scheduler.drain(timeout=5) == 0
+    assert done == [0, 1, 2]
+    with pytest.raises(ShuttingDownError):
+        scheduler.submit(done.append, 3)
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_drain_gives_up_after_timeout():
+    release = threading.Event()
+    scheduler = TaskScheduler(max_concurrency=1, max_queue=8)
+    scheduler.submit(release.wait)
+    scheduler.submit(release.wait)
+    assert scheduler.drain(timeout=0.05) == 2
+    release.set()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_child_starts_its_own_workers():
+    scheduler = TaskScheduler(max_concurrency=1)
+    scheduler.submit(lambda: None)
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        scheduler.after_fork()
+        ran = threading.Event()
+        scheduler.submit(ran.set)
+        os.write(write, b"1" if ran.wait(2) else b"0")
+        os._exit(0)
+    os.close(write)
+    assert os.read(read, 1) == b"1"
+    os.waitpid(pid, 0)
+
+
+def run_in_order(scheduler, jobs):
+    """Queue ``(owner, label)`` jobs behind a blocker and return the order they ran in"""
+    release, order = threading.Event(), []
+    scheduler.submit(release.wait, owner="blocker")
+    time.sleep(0.05)
+    for owner, label in jobs:
+        scheduler.submit(order.append, label, owner=owner)
+    release.set()
+    assert scheduler.drain(timeout=5) == 0
+    return order
+
+
+def test_owners_are_served_round_robin():
+    scheduler = TaskScheduler(max_concurrency=1, max_queue=16)
+    jobs = [("heavy", f"h{n}") for n in range(6)] + [("light", "l0"), ("light", "l1")]
+
+    assert run_in_order(scheduler, jobs) == ["h0", "l0", "h1", "l1", "h2", "h3", "h4", "h5"]
+
+
+def test_weights_give_owners_longer_turns():
+    scheduler = TaskScheduler(max_concurrency=1, max_queue=16, weights={"paid": 2})
+    jobs = [("free", f"f{n}") for n in range(3)] + [("paid", f"p{n}") for n in range(4)]
+
+    assert run_in_order(scheduler, jobs) == ["f0", "p0", "p1", "f1", "p2", "p3", "f2"]
+
+
+def test_malformed_weights_are_skipped(monkeypatch):
+    monkeypatch.setenv("SCHEDULER_WEIGHTS", "paid=3, broken=x,=2,zero=0,,solo")
+
+    assert _weights_from_env() == {"paid": 3}
+
+
+def test_one_owner_cannot_fill_the_queue():
+    release = threading.Event()
+    scheduler = TaskScheduler(max_concurrency=1, max_queue=8, max_queue_per_owner=2)
+    scheduler.submit(release.wait, owner="heavy")
+    time.sleep(0.05)
+    scheduler.submit(release.wait, owner="heavy")
+    scheduler.submit(release.wait, owner="heavy")
+    with pytest.raises(QueueFullError):
+        scheduler.submit(release.wait, owner="heavy")
+    assert scheduler.submit(release.wait, owner="light") == 3
+    release.set()
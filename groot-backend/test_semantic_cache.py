@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Tests for the semantic prompt cache (run with: python -m pytest test_semantic_cache.py)"""
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.semantic_cache import SemanticCache
+
+SYNONYMS = {"make": "create", "build": "create", "basic": "simple", "site": "website"}
+STOPWORDS = {"a", "an", "the", "by", "with", "using"}
+
+
+def bag_of_words(text, dim=64):
+    """Stands in for an embedding model: paraphrases map to the same words"""
+    vector = np.zeros(dim)
+    for word in text.lower().split():
+        if word not in STOPWORDS:
+            vector[zlib.crc32(SYNONYMS.get(word, word).encode()) % dim] += 1
+    return vector
+
+
+def make_cache(**kwargs):
+    return SemanticCache(bag_of_words, **dict(dict(threshold=0.9), **kwargs))
+
+
+def remember(cache, prompt, answer, namespace=""):
+    cache.set(cache.embed(prompt), prompt, answer, namespace)
+
+
+def test_paraphrases_share_an_answer():
+    cache = make_cache()
+    remember(cache, "create a simple website by html", "<html>...</html>")
+
+    hit = cache.get(cache.embed("make a basic HTML website"))
+
+    assert hit.value == "<html>...</html>"
+    assert hit.prompt == "create a simple website by html"
+    assert hit.score == pytest.approx(1.0)
+    assert cache.get(cache.embed("write a poem about the sea")) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_namespaces_and_expiry_are_respected():
+    cache = make_cache(ttl=0.05)
+    remember(cache, "simple website", "direct answer", namespace="direct:mistral")
+
+    assert cache.get(cache.embed("simple website"), "multi_agent:mistral") is None
+    assert cache.get(cache.embed("simple website"), "direct:mistral").value == "direct answer"
+    time.sleep(0.06)
+    assert cache.get(cache.embed("simple website"), "direct:mistral") is None
+
+
+def test_capacity_evicts_least_recently_used():
+    cache = make_cache(capacity=2)
+    remember(cache, "alpha", "a")
+    remember(cache, "beta", "b")
+    cache.get(cache.embed("alpha"))
+    remember(cache, "gamma", "c")
+
+    assert len(cache) == 2
+    assert cache.get(cache.embed("beta")) is None
+    assert cache.get(cache.embed("alpha")).value == "a"
+    assert cache.get(cache.embed("gamma")).value == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_embedding_failures_and_disabled_cache_skip_lookups():
+    def broken(text):
+        raise ConnectionError("no embedding model")
+
+    cache = SemanticCache(broken)
+    assert cache.embed("anything") is None
+    assert cache.get(None) is None
+    assert cache.stats()["embed_errors"] == 1
+
+    disabled = make_cache(enabled=False)
+    assert disabled.embed("anything") is None
+
+
+def test_large_index_lookup_stays_fast():
+    dim, entries = 384, 100_000
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((entries, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    cache = SemanticCache(lambda text: vectors[int(text)], capacity=entries)
+    for index in range(entries):
+        cache.set(vectors[index], str(index), f"answer {index}")
+
+    near = vectors[4242] + 0.02 * rng.standard_normal(dim).astype(np.float32)
+    cache.get(cache.embed("0"))
+    started = time.perf_counter()
+    hit = cache.get(near / np.linalg.norm(near))
+    elapsed = time.perf_counter() - started
+
+    assert hit.value == "answer 4242"
+    assert elapsed < 0.05
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Tests for single-flight request coalescing (run with: python -m pytest test_singleflight.py)"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution_and_its_chunks():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def generate(emit):
+        calls.append(1)
+        emit("a")
+        started.set()
+        release.wait(1)
+        emit("b")
+        return "ab"
+
+    results, follower_chunks = [], []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", generate)))
+    leader.start()
+    started.wait(1)
+
+    follower = threading.Thread(
+        target=lambda: results.append(flights.do("k", generate, follower_chunks.append))
+    )
+    follower.start()
+    while flights.stats()["coalesced"] == 0:
+        time.sleep(0.001)
+    release.set()
+    leader.join(1)
+    follower.join(1)
+
+    assert calls == [1]
+    assert results == ["ab", "ab"]
+    # The follower joined after "a" was emitted and still receives it
+    assert follower_chunks == ["a", "b"]
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 1}
+
+
+def test_errors_propagate_and_flight_is_released():
+    flights = SingleFlight()
+
+    def fail(emit):
+        raise RuntimeError("backend down")
+
+    with pytest.raises(RuntimeError, match="backend down"):
+        flights.do("k", fail)
+    assert flights.do("k", lambda emit: "ok") == "ok"
+    assert flights.stats()["leaders"] == 2
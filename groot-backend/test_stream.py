@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Tests for task output streaming (run with: python -m pytest test_stream.py)"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.stream import TaskStream, TaskStreamRegistry, consume_ollama_stream, format_sse
+
+
+class FakeResponse:
+    """Minimal stand-in for a streamed ``requests`` response"""
+
+    def __init__(self, messages):
+        self.lines = [m if isinstance(m, bytes) else json.dumps(m).encode() for m in messages]
+        self.closed = False
+
+    def iter_lines(self):
+        for line in self.lines:
+            if self.closed:
+                raise AssertionError("read after close")
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+def parse_events(frames):
+    events = []
+    for frame in frames:
+        if frame.startswith(":"):
+            events.append(("comment", None, None))
+            continue
+        fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+        events.append((fields.get("event"), int(fields["id"]), json.loads(fields["data"])))
+    return events
+
+
+def test_consume_stream_forwards_fragments_and_stops_at_done():
+    response = FakeResponse([
+        {"response": "Hel", "done": False},
+        b"",
+        {"response": "lo", "done": False},
+        {"response": "", "done": True},
+        {"response": "ignored", "done": False},
+    ])
+    chunks = []
+    result = consume_ollama_stream(response, chunks.append, 0.0)
+    assert result == "Hello"
+    assert chunks == ["Hel", "lo"]
+    assert response.closed
+
+
+def test_consume_stream_raises_on_ollama_error():
+    response = FakeResponse([
+        {"response": "partial", "done": False},
+        {"error": "model not found"},
+    ])
+    chunks = []
+    with pytest.raises(Exception, match="model not found"):
+        consume_ollama_stream(response, chunks.append, 0.0)
+    assert chunks == ["partial"]
+    assert response.closed
+
+
+def test_iter_events_replays_and_finishes():
+    stream = TaskStream("t1")
+    stream.append("abc")
+    stream.append("")
+    stream.append("de")
+    stream.close("completed")
+    events = parse_events(stream.iter_events())
+    assert events == [
+        ("chunk", 3, {"text": "abc"}),
+        ("chunk", 5, {"text": "de"}),
+        ("done", 5, {"status": "completed", "error": None}),
+    ]
+
+
+def test_iter_events_resumes_from_character_offset():
+    stream = TaskStream("t2")
+    for chunk in ("abc", "def", "gh"):
+        stream.append(chunk)
+    stream.close("completed")
+    events = parse_events(stream.iter_events(offset=4))
+    assert events[0] == ("chunk", 6, {"text": "ef"})
+    assert events[1] == ("chunk", 8, {"text": "gh"})
+    assert events[-1][0] == "done"
+
+
+def test_resume_into_rebuilt_stream_keeps_remaining_text():
+    # A pruned stream is rebuilt from the stored result as a single chunk
+    stream = TaskStream("t3")
+    stream.append("hello world")
+    stream.close("completed")
+    events = parse_events(stream.iter_events(offset=6))
+    assert events[0] == ("chunk", 11, {"text": "world"})
+    assert events[1][0] == "done"
+
+
+def test_iter_events_sends_heartbeat_while_idle():
+    stream = TaskStream("t4")
+    frames = stream.iter_events(heartbeat=0.01)
+    assert next(frames) == ": keep-alive\n\n"
+    stream.append("x")
+    assert parse_events([next(frames)]) == [("chunk", 1, {"text": "x"})]
+    stream.close("failed", "boom")
+    assert parse_events([next(frames)]) == [("done", 1, {"status": "failed", "error": "boom"})]
+
+
+def test_registry_prunes_oldest_closed_streams():
+    registry = TaskStreamRegistry(max_closed=2)
+    streams = [registry.open(f"t{i}") for i in range(4)]
+    for stream in streams[:3]:
+        stream.close()
+    registry.open("t4")
+    assert registry.get("t0") is None
+    assert registry.get("t1") is streams[1]
+    assert registry.get("t2") is streams[2]
+    # Still-running streams are never pruned
+    assert registry.get("t3") is streams[3]
+    assert registry.open("t1") is streams[1]
+
+
+def test_format_sse_frame():
+    assert format_sse({"a": 1}, event="chunk", event_id=2) == 'id: 2\nevent: chunk\ndata: {"a": 1}\n\n'
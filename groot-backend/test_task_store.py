@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Tests for the task repository (run with: python -m pytest test_task_store.py)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+task_store = pytest.importorskip("utils.task_store")
+
+
+def task(task_id, status="processing", model="mistral", created_at="2026-01-01T00:00:00Z"):
+    return {"id": task_id, "description": "d", "status": status, "model": model, "result": "",
+            "created_at": created_at}
+
+
+def test_version_follows_every_write_to_a_listed_task():
+    store = task_store.TaskRepository()
+    store.create(task("t"))
+    versions = [store.version]
+    store.append_result("t", "hello")
+    versions.append(store.version)
+    store.update("t", progress={"done": 1})
+    versions.append(store.version)
+    store.update("t", status="completed")
+    versions.append(store.version)
+    assert len(set(versions)) == 4
+
+
+def test_count_applies_every_filter():
+    store = task_store.TaskRepository()
+    store.create(task("a", "completed", "mistral", "2026-01-01T00:00:00Z"))
+    store.create(task("b", "completed", "llama", "2026-01-02T00:00:00Z"))
+    store.create(task("c", "failed", "llama", "2026-01-03T00:00:00Z"))
+    assert store.count_tasks({"status": "completed"}) == 2
+    assert store.count_tasks({"status": "completed", "model": "llama"}) == 1
+    assert store.count_tasks({"status": "completed", "since": "2026-01-02T00:00:00Z"}) == 1
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Tests for the streaming upload pipeline (run with: python -m pytest test_upload.py)"""
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.aio import AsyncRuntime
+from utils.cache import ResponseCache
+from utils.puter import PuterAI
+from utils.upload import Base64Encoder, StreamingUpload, UploadError
+
+BOUNDARY = "groot-test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def multipart(*parts):
+    """Build a multipart body from ``(name, value)`` fields and ``(name, filename, data)`` files"""
+    body = b""
+    for part in parts:
+        body += f"--{BOUNDARY}\r\n".encode()
+        if len(part) == 2:
+            name, value = part
+            body += f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode() + value.encode()
+        else:
+            name, filename, data = part
+            body += (f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f"Content-Type: application/octet-stream\r\n\r\n").encode() + data
+        body += b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+class StubPuter(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+    connections = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        StubPuter.connections += 1
+        body = b""
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if size == 0:
+                break
+        payload = json.loads(body)
+        StubPuter.requests.append(payload)
+        reply = json.dumps({"analysis": f"{payload['task']}: {payload['file']['size']} bytes"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+
+@pytest.fixture
+def puter():
+    StubPuter.requests = []
+    StubPuter.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPuter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    runtime = AsyncRuntime()
+    client = PuterAI(api_key="test", runtime=runtime, cache=ResponseCache())
+    client.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield client
+    runtime.close()
+    server.shutdown()
+
+
+def opened(*parts, max_bytes=1 << 20):
+    upload = StreamingUpload(io.BytesIO(multipart(*parts)), CONTENT_TYPE, max_bytes=max_bytes, chunk_size=1024)
+    upload.open()
+    return upload
+
+
+def test_base64_encoder_matches_one_shot_encoding_for_any_split():
+    data = bytes(range(256)) * 3
+    for step in (1, 2, 5, 64, 1000):
+        encoder = Base64Encoder()
+        out = b"".join(encoder.encode(data[i:i + step]) for i in range(0, len(data), step))
+        assert out + encoder.finish() == base64.b64encode(data)
+
+
+def test_json_body_streams_file_and_trailing_fields():
+    data = os.urandom(10_000)
+    body = multipart(("file", "notes.bin", data), ("task", "Summarize"))
+    upload = StreamingUpload(io.BytesIO(body), CONTENT_TYPE, max_bytes=1 << 20, chunk_size=512)
+    upload.open()
+    assert upload.filename == "notes.bin"
+
+    chunks = list(upload.json_chunks({"model": "puter-ai"}, {"name": "notes.bin"}))
+    assert len(chunks) > 3
+    payload = json.loads(b"".join(chunks))
+    assert base64.b64decode(payload["file"]["content"]) == data
+    assert payload["file"]["size"] == len(data) == upload.size
+    assert payload["file"]["name"] == "notes.bin"
+    assert payload["task"] == "Summarize"
+    assert payload["model"] == "puter-ai"
+
+
+def test_fields_before_the_file_are_collected_on_open():
+    body = multipart(("task", "Review"), ("file", "a.txt", b"hello"))
+    upload = StreamingUpload(io.BytesIO(body), CONTENT_TYPE, max_bytes=1024)
+    upload.open()
+    assert upload.fields == {"task": "Review"}
+    payload = json.loads(b"".join(upload.json_chunks({}, {})))
+    assert payload["task"] == "Review"
+    assert base64.b64decode(payload["file"]["content"]) == b"hello"
+
+
+def test_size_cap_is_enforced_while_streaming():
+    body = multipart(("file", "big.bin", b"x" * 5000))
+    upload = StreamingUpload(io.BytesIO(body), CONTENT_TYPE, max_bytes=4096, chunk_size=256)
+    upload.open()
+    with pytest.raises(UploadError) as excinfo:
+        for _ in upload.json_chunks({}, {}):
+            pass
+    assert excinfo.value.status == 413
+
+
+def test_rejects_missing_file_and_wrong_content_type():
+    with pytest.raises(UploadError):
+        StreamingUpload(io.BytesIO(b"{}"), "application/json", max_bytes=1024)
+
+    upload = StreamingUpload(io.BytesIO(multipart(("task", "x"))), CONTENT_TYPE, max_bytes=1024)
+    with pytest.raises(UploadError, match="No file provided"):
+        upload.open()
+
+    upload = StreamingUpload(io.BytesIO(multipart(("file", "", b""))), CONTENT_TYPE, max_bytes=1024)
+    with pytest.raises(UploadError, match="No file selected"):
+        upload.open()
+
+
+def test_upload_hashes_content_while_streaming():
+    upload = opened(("file", "a.txt", b"hello"), ("task", "Review"))
+    assert not upload.complete
+    b"".join(upload.json_chunks({}, {}))
+    assert upload.complete
+    assert upload.sha256 == hashlib.sha256(b"hello").hexdigest()
+    assert upload.task == "Review"
+
+
+def test_repeat_upload_is_served_from_the_analysis_cache(puter):
+    data = os.urandom(5000)
+    first = puter.process_upload(opened(("file", "a.txt", data), ("task", "Summarize")))
+    assert first["success"] and not first["cached"]
+    assert first["result"] == "Summarize: 5000 bytes"
+
+    again = puter.process_upload(opened(("file", "b.txt", data), ("task", "Summarize")))
+    assert again["cached"] and again["result"] == first["result"]
+    assert again["file_info"]["name"] == "b.txt"
+    other_task = puter.process_upload(opened(("file", "a.txt", data), ("task", "Translate")))
+    assert not other_task["cached"]
+    assert len(StubPuter.requests) == 2
+    assert puter.cache.stats()["hit_ratio"] == round(1 / 3, 3)
+
+
+def test_large_uploads_stream_through_without_the_cache(puter):
+    puter.lookahead_bytes = 1024
+    data = os.urandom(50_000)
+    for _ in range(2):
+        result = puter.process_upload(opened(("file", "big.bin", data)))
+        assert result["success"] and not result["cached"]
+    assert StubPuter.connections == len(StubPuter.requests) == 2
+    assert puter.cache.stats()["entries"] == 0
+
+
+def test_oversized_upload_fails_with_upload_error(puter):
+    puter.lookahead_bytes = 1024
+    with pytest.raises(UploadError) as excinfo:
+        puter.process_upload(opened(("file", "big.bin", b"x" * 50_000), max_bytes=20_000))
+    assert excinfo.value.status == 413
+    assert puter.breaker.failures == 0
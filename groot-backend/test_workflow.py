@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Tests for the multi-agent workflow executor (run with: python -m pytest test_workflow.py)"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.deadline import Deadline, TaskCancelled, current_deadline, deadline_scope
+from utils.workflow import Step, Workflow, WorkflowError, WorkflowExecutor
+
+
+def sleeper(text, delay=0.05, calls=None):
+    def fn(inputs, on_chunk=None):
+        if calls is not None:
+            calls.append(text)
+        time.sleep(delay)
+        out = text + "".join(f"<{inputs[key]}>" for key in sorted(inputs))
+        if on_chunk is not None:
+            on_chunk(out)
+        return out
+    return fn
+
+
+def diamond(calls=None):
+    return Workflow("diamond", [
+        Step("a", "Research Agent", sleeper("a", calls=calls)),
+        Step("b", "Research Agent", sleeper("b", calls=calls)),
+        Step("c", "Content Agent", sleeper("c", calls=calls), deps=("a", "b")),
+        Step("d", "Coordinator Agent", sleeper("d", calls=calls), deps=("c",), stream=True),
+    ])
+
+
+def test_invalid_workflows_are_rejected():
+    with pytest.raises(WorkflowError, match="unknown step"):
+        Workflow("w", [Step("a", "x", sleeper("a"), deps=("missing",))])
+    with pytest.raises(WorkflowError, match="Cycle"):
+        Workflow("w", [Step("a", "x", sleeper("a"), deps=("b",)), Step("b", "x", sleeper("b"), deps=("a",))])
+
+
+def test_independent_steps_run_in_parallel_and_take_the_critical_path():
+    executor = WorkflowExecutor(max_parallel=4)
+    streamed, events = [], []
+    outcome = executor.run(diamond(), on_chunk=streamed.append,
+                           on_step=lambda event, step, timing: events.append((event, step.id)))
+
+    assert outcome["result"] == "d<c<a><b>>"
+    assert streamed == [outcome["result"]]
+    # a and b overlap, so wall time is ~3 steps rather than 4
+    assert outcome["total_step_time"] >= 0.2
+    assert outcome["critical_path"] < 0.2
+    assert outcome["elapsed"] < 0.19
+    assert events.index(("completed", "c")) < events.index(("started", "d"))
+    assert outcome["timings"]["c"]["deps"] == ["a", "b"]
+
+
+def test_pool_is_as_wide_as_the_dag():
+    assert diamond().width == 2
+    outcome = WorkflowExecutor().run(diamond())
+    assert outcome["timings"]["a"]["started_at"] < 0.02 and outcome["timings"]["b"]["started_at"] < 0.02
+    assert WorkflowExecutor(max_parallel=1).run(diamond())["elapsed"] >= 0.2
+
+
+def test_failing_step_stops_the_workflow():
+    def boom(inputs):
+        raise Exception("LLM Error: boom")
+
+    executor = WorkflowExecutor(max_parallel=2)
+    workflow = Workflow("w", [
+        Step("a", "Research Agent", boom),
+        Step("b", "Coordinator Agent", sleeper("b"), deps=("a",)),
+    ])
+    with pytest.raises(WorkflowError, match="Step 'a' failed") as excinfo:
+        executor.run(workflow)
+    assert excinfo.value.step_id == "a"
+
+
+def test_failing_step_cancels_running_steps():
+    stopped = threading.Event()
+
+    def boom(inputs):
+        time.sleep(0.05)
+        raise Exception("LLM Error: boom")
+
+    def slow(inputs):
+        while current_deadline().reason is None:
+            time.sleep(0.01)
+        stopped.set()
+        current_deadline().check()
+
+    workflow = Workflow("w", [
+        Step("a", "Research Agent", boom),
+        Step("b", "Research Agent", slow),
+        Step("c", "Coordinator Agent", sleeper("c"), deps=("a", "b")),
+    ])
+    with pytest.raises(WorkflowError, match="Step 'a' failed"):
+        WorkflowExecutor().run(workflow)
+    assert stopped.wait(1)
+
+
+def test_interrupted_caller_is_reported_as_such():
+    deadline = Deadline(30)
+    threading.Timer(0.05, deadline.cancel).start()
+    workflow = Workflow("w", [Step("a", "Research Agent", lambda inputs: current_deadline().wait(Future()))])
+    with deadline_scope(deadline), pytest.raises(TaskCancelled):
+        WorkflowExecutor().run(workflow)